@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import deque
+
+import replay_source
+import terminal_display
+from bluetooth_handler import connect_to_sensor, handle_data, handle_packet, handle_batch
+from data_logger import WorkoutWriter, LOG_EXTENSIONS, logger
+from fake_bleak import FakeBackend, make_room
+from game_logic import GateScorer, generate_gate_sequence
+from metrics_bus import MetricsBus, Subscription, LATEST, LOSSLESS, DROP_OLDEST
+from metrics_calculator import calculate_metrics, MetricsEngine
+from terminal_display import terminal_display as display_loop
+
+BENCH_CONFIG = {
+    "wheel_circumference": 2.1,
+    "chainring": 50,
+    "cog": 15,
+    "terminal_width": 90,
+    "max_speed": 60,
+    "speed_interval": 3,
+}
+
+
+class StageStats:
+    """collects latency samples (seconds) per pipeline stage."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def timed(self, stage, func):
+        """wrap a sync or async function so each call is recorded under `stage`."""
+        if asyncio.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+        else:
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self):
+        """return {stage: (count, mean, p50, p95, max)} with times in seconds."""
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            count = len(ordered)
+            result[stage] = (
+                count,
+                sum(ordered) / count,
+                ordered[count // 2],
+                ordered[min(count - 1, int(count * 0.95))],
+                ordered[-1],
+            )
+        return result
+
+
+class TimedQueue(asyncio.Queue):
+    """asyncio.Queue that records how long each item waited and the peak depth."""
+
+    def __init__(self, name, stats, maxsize=0):
+        super().__init__(maxsize)
+        self.name = name
+        self.stats = stats
+        self.max_depth = 0
+        self.last_get_time = None
+
+    def _put(self, item):
+        super()._put((time.perf_counter(), item))
+        self.max_depth = max(self.max_depth, self.qsize())
+
+    def _get(self):
+        put_time, item = super()._get()
+        self.last_get_time = time.perf_counter()
+        self.stats.record(f"{self.name} wait", self.last_get_time - put_time)
+        return item
+
+
+class TimedSubscription(Subscription):
+    """bus subscription that records how long each update waited for its consumer."""
+
+    def __init__(self, name, stats, policy, maxsize):
+        super().__init__(name, policy, maxsize)
+        self.stage_stats = stats
+        self.put_times = deque()
+
+    def put_nowait(self, item):
+        if len(self._buffer) >= self.maxsize and self.policy != LOSSLESS:
+            self.put_times.popleft()
+        super().put_nowait(item)
+        self.put_times.append(time.perf_counter())
+
+    def get_nowait(self):
+        item = super().get_nowait()
+        self.stage_stats.record(f"{self.name} wait", time.perf_counter() - self.put_times.popleft())
+        return item
+
+
+class TimedBus(MetricsBus):
+    """metrics bus that also times calculate_metrics from packet dequeue to publish."""
+
+    def __init__(self, stats, source_queue):
+        super().__init__()
+        self.stage_stats = stats
+        self.source_queue = source_queue
+
+    def subscribe(self, name, policy=DROP_OLDEST, maxsize=100):
+        subscription = TimedSubscription(name, self.stage_stats, policy, maxsize)
+        self.subscribers[name] = subscription
+        return subscription
+
+    async def publish(self, metrics):
+        if self.source_queue.last_get_time is not None:
+            self.stage_stats.record("calculate_metrics", time.perf_counter() - self.source_queue.last_get_time)
+        await super().publish(metrics)
+
+    put = publish
+
+
+async def run_pipeline(source="steady", speed=0, duration=600, config=None):
+    """drive handle_packet -> calculate_metrics -> terminal_display/logger from a replay source.
+
+    Returns (packets, elapsed_seconds, stats, bluetooth_queue, metrics_bus).
+    """
+    config = config or BENCH_CONFIG
+    stats = StageStats()
+    bluetooth_queue = TimedQueue("bluetooth_queue", stats)
+    metrics_bus = TimedBus(stats, bluetooth_queue)
+    display_queue = metrics_bus.subscribe("display", policy=LATEST)
+    logger_queue = metrics_bus.subscribe("logger", policy=LOSSLESS, maxsize=config.get("logger_buffer", 1000))
+    shutdown_event = asyncio.Event()
+    packets = replay_source.load_packets(source, duration)
+
+    # time the per-packet and per-frame work without changing the modules under test
+    original_handle_packet = replay_source.handle_packet
+    original_build_frame = terminal_display.build_frame
+    original_render = terminal_display.FrameRenderer.render
+    replay_source.handle_packet = stats.timed("handle_packet", original_handle_packet)
+    terminal_display.build_frame = stats.timed("build_frame", original_build_frame)
+    terminal_display.FrameRenderer.render = stats.timed("render", original_render)
+
+    tasks = []
+    start = time.perf_counter()
+    try:
+        tasks = [
+            asyncio.create_task(calculate_metrics(bluetooth_queue, metrics_bus, shutdown_event, config)),
+            asyncio.create_task(display_loop(display_queue, config, shutdown_event)),
+            asyncio.create_task(logger(logger_queue, shutdown_event, config)),
+        ]
+        await replay_source.replay_sensor(bluetooth_queue, shutdown_event, {}, config,
+                                          source=source, speed=speed, duration=duration)
+        # the first packet only primes calculate_metrics, every later one yields a metrics update
+        while bluetooth_queue.qsize() or logger_queue.qsize() or metrics_bus.published < len(packets) - 1:
+            await asyncio.sleep(0.001)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutdown_event.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        replay_source.handle_packet = original_handle_packet
+        terminal_display.build_frame = original_build_frame
+        terminal_display.FrameRenderer.render = original_render
+
+    return len(packets), elapsed, stats, bluetooth_queue, metrics_bus
+
+
+def print_pipeline_report(packets, elapsed, stats, bluetooth_queue, metrics_bus):
+    print(f"Packets:     {packets}")
+    print(f"Elapsed:     {elapsed:.3f} s")
+    print(f"Throughput:  {packets / elapsed:,.0f} packets/s")
+    print(f"{'bluetooth_queue peak depth:':<30}{bluetooth_queue.max_depth}")
+    for name, sub in metrics_bus.stats()["subscribers"].items():
+        print(f"{name + ' peak depth:':<30}{sub['max_depth']} ({sub['dropped']} dropped)")
+    print()
+    print(f"{'stage':<24}{'count':>8}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'max us':>10}")
+    for stage, (count, mean, p50, p95, peak) in stats.summary().items():
+        print(f"{stage:<24}{count:>8}{mean * 1e6:>10.1f}{p50 * 1e6:>10.1f}{p95 * 1e6:>10.1f}{peak * 1e6:>10.1f}")
+
+
+def bench_pipeline(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)  # keep the logger's workouts/ out of the repo
+        try:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = asyncio.run(run_pipeline(args.source, args.speed, args.duration))
+        finally:
+            os.chdir(cwd)
+    print_pipeline_report(*result)
+
+
+async def legacy_handle_data(data, queue, state):
+    """handle_data as it was before the struct decoder, kept as the decode baseline."""
+    cumulative_crank_revolutions = int.from_bytes(data[1:3], byteorder="little")
+    last_crank_event_time = int.from_bytes(data[3:5], byteorder="little")
+
+    if "prev_crank_event_time" not in state:
+        state["prev_crank_event_time"] = None
+        state["prev_crank_revolutions"] = 0
+        state["last_cadence"] = 0
+        state["last_movement_time"] = time.time()
+
+    prev_crank_event_time = state["prev_crank_event_time"]
+    prev_crank_revolutions = state["prev_crank_revolutions"]
+    current_time = time.time()
+
+    if prev_crank_event_time is None:
+        state["prev_crank_event_time"] = last_crank_event_time
+        state["prev_crank_revolutions"] = cumulative_crank_revolutions
+        state["last_movement_time"] = current_time
+        await queue.put({"cadence": 0, "revolutions": cumulative_crank_revolutions})
+        return
+
+    if prev_crank_event_time == last_crank_event_time:
+        state["last_movement_time"] = current_time
+        await queue.put({"cadence": state["last_cadence"], "revolutions": cumulative_crank_revolutions})
+        return
+
+    crank_time_diff = (last_crank_event_time - prev_crank_event_time) / 1024
+    print(f"[DEBUG] Crank Time Diff: {crank_time_diff:.6f}, Prev Time: {prev_crank_event_time}, Last Time: {last_crank_event_time}")
+    if crank_time_diff < 0:
+        crank_time_diff += 65536 / 1024
+    if crank_time_diff > 0:
+        cadence = (cumulative_crank_revolutions - prev_crank_revolutions) / crank_time_diff * 60
+    else:
+        cadence = state["last_cadence"]
+
+    state["prev_crank_event_time"] = last_crank_event_time
+    state["prev_crank_revolutions"] = cumulative_crank_revolutions
+    state["last_cadence"] = cadence
+
+    if current_time - state["last_movement_time"] > 10:
+        state["last_cadence"] = 0
+
+    await queue.put({"cadence": cadence, "revolutions": cumulative_crank_revolutions})
+
+
+async def run_decode(packets, batch_size=32):
+    """packets/s for the legacy task-per-packet path, inline handle_packet and handle_batch."""
+    results = {}
+
+    queue, state = asyncio.Queue(), {}
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # what the old notification callback did: one task per packet
+        tasks = [asyncio.create_task(legacy_handle_data(packet, queue, state)) for packet in packets]
+        await asyncio.gather(*tasks)
+    results["legacy (task per packet)"] = len(packets) / (time.perf_counter() - start)
+
+    queue, state = asyncio.Queue(), {}
+    start = time.perf_counter()
+    for packet in packets:
+        handle_packet(packet, queue, state)
+    results["handle_packet (inline)"] = len(packets) / (time.perf_counter() - start)
+
+    queue, state = asyncio.Queue(), {}
+    start = time.perf_counter()
+    for i in range(0, len(packets), batch_size):
+        handle_batch(packets[i:i + batch_size], queue, state)
+    results[f"handle_batch ({batch_size})"] = len(packets) / (time.perf_counter() - start)
+    return results
+
+
+def bench_decode(args):
+    packets = [packet for _, packet in replay_source.load_packets(args.source, args.duration)]
+    results = asyncio.run(run_decode(packets, args.batch))
+    baseline = results["legacy (task per packet)"]
+    print(f"Packets: {len(packets)}")
+    for name, rate in results.items():
+        print(f"{name:<28}{rate:>14,.0f} packets/s{rate / baseline:>8.1f}x")
+
+
+def run_game(durations, updates_per_second=4):
+    """mean scoring cost per update (seconds) for gate sequences of each duration."""
+    results = {}
+    for duration in durations:
+        sequence = generate_gate_sequence(seed=1, config={"game_duration": duration})
+        scorer = GateScorer(sequence)
+        updates = int(duration * updates_per_second)
+        metrics = [{"live_speed": 20 + i % 25, "live_RPM": 70 + i % 40} for i in range(1000)]
+        start = time.perf_counter()
+        for i in range(updates):
+            scorer.update(metrics[i % 1000], i / updates_per_second)
+        results[duration] = ((time.perf_counter() - start) / updates, len(sequence))
+    return results
+
+
+def bench_game(args):
+    print(f"{'sequence':>10}{'gates':>8}{'ns/update':>12}")
+    for duration, (per_update, gates) in run_game(args.durations).items():
+        print(f"{duration / 60:>8.0f} m{gates:>8}{per_update * 1e9:>12.0f}")
+
+
+BASELINE_FILE = "benchmark_baseline.json"
+REGRESSION_THRESHOLD = 0.25  # fail when a hot path gets more than 25% slower than its baseline
+
+
+def measure(func, number, repeat=5):
+    """best-of-`repeat` seconds per call of func() over `number` calls (the least noisy estimate)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def measure_workout_writer(log_format, number, directory, repeat=5):
+    """best-of-`repeat` seconds per record from WorkoutWriter.write() until the thread has written it to disk."""
+    best = float("inf")
+    for attempt in range(repeat):
+        file_path = os.path.join(directory, f"workout_{attempt}{LOG_EXTENSIONS[log_format]}")
+        writer = WorkoutWriter(file_path, log_format).start()
+        start = time.perf_counter()
+        for i in range(number):
+            writer.write((1735725600 + i, 90, 30, i / 120, 30))
+        writer.close()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+async def measure_async(func, number, repeat=5):
+    """measure() for a coroutine function, awaited inside one running loop."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+class ListSink(list):
+    """a queue stand-in that just keeps what is put, so decode timings exclude asyncio.Queue."""
+
+    def put_nowait(self, item):
+        self.append(item)
+
+    async def put(self, item):
+        self.append(item)
+
+
+def ride_metrics(engine, seconds):
+    """run `seconds` of steady 90 RPM through a MetricsEngine and return the last metrics update."""
+    metrics = None
+    for second in range(seconds + 1):
+        engine.ingest({"cadence": 90, "revolutions": second * 1.5}, second)
+        metrics = engine.tick(second)
+    return metrics
+
+
+async def run_fake_sensor(packets, config):
+    """seconds per packet from connect_to_sensor over a fake bleak backend, connect included."""
+    backend = FakeBackend(make_room(1), speed=0)  # notifications as fast as the loop allows
+    config = {**config, "device_cache": os.path.join(tempfile.mkdtemp(), "last_sensor")}
+    queue, shutdown_event = asyncio.Queue(), asyncio.Event()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        task = asyncio.create_task(connect_to_sensor(queue, shutdown_event, {}, config, backend.scanner, backend.client))
+        while queue.qsize() < packets:
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+        shutdown_event.set()
+        await task
+    return elapsed / packets
+
+
+def run_regression_suite(scale=1.0):
+    """seconds per operation for each hot path; `scale` shrinks the iteration counts for quick runs."""
+    def count(n):
+        return max(1, int(n * scale))
+
+    config = {**BENCH_CONFIG, "history_size": 3600, "cadence_uuid": "00002a5b-0000-1000-8000-00805f9b34fb",
+              "scan_retry_duration": 1, "scan_interval": 0.01}
+    results = {}
+
+    packets = itertools.cycle(packet for _, packet in replay_source.load_packets("sprints", 3600))
+    state, sink = {}, ListSink()
+    results["decode.handle_packet"] = measure(lambda: handle_packet(next(packets), sink, state), count(20000))
+    state = {}
+    results["decode.handle_data"] = asyncio.run(
+        measure_async(lambda: handle_data(next(packets), sink, state), count(20000)))
+
+    engine = MetricsEngine(config)
+    ride_metrics(engine, 10)
+    revolutions = itertools.count(100)
+    clock = itertools.count(11)
+
+    def metrics_update():
+        engine.ingest({"cadence": 90, "revolutions": next(revolutions)}, next(clock))
+        engine.tick(next(clock))
+    results["metrics.update"] = measure(metrics_update, count(5000))
+
+    # display with a full hour of history, as at the end of a long session
+    metrics = ride_metrics(MetricsEngine(config), 3600)
+    results["display.build_frame"] = measure(lambda: terminal_display.build_frame(metrics, config), count(200))
+    speed_history = metrics["intervals"].column("avg_speed")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results["display.draw_plot"] = measure(
+            lambda: terminal_display.draw_plot(metrics["live_speeds"], speed_history, config), count(200))
+        results["display.draw_metrics"] = measure(lambda: terminal_display.draw_metrics(metrics), count(5000))
+
+    # the logger's path: write() on the event loop, then the writer thread formatting and writing
+    with tempfile.TemporaryDirectory() as directory:
+        writer = WorkoutWriter(os.path.join(directory, "workout.csv")).start()
+        record = (time.time(), 90, 30, 1.5, 30)
+        results["logger.write"] = measure(lambda: writer.write(record), count(20000))
+        writer.close()
+        for log_format in LOG_EXTENSIONS:
+            results[f"logger.writer_{log_format}"] = measure_workout_writer(log_format, count(20000), directory)
+
+    results["sensor.fake_bleak"] = asyncio.run(run_fake_sensor(count(5000), config))
+    return results
+
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """[(name, baseline, current, ratio, regressed)] for every benchmark present in both."""
+    rows = []
+    for name, current in results.items():
+        if name in baseline:
+            ratio = current / baseline[name]
+            rows.append((name, baseline[name], current, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def load_baseline(file_path):
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def save_baseline(file_path, results):
+    with open(file_path, "w") as file:
+        json.dump({"machine": platform.node(), "python": platform.python_version(), "results": results}, file, indent=2)
+
+
+def bench_regress(args):
+    """run the hot path suite; save it as the baseline or fail on regressions against it."""
+    results = run_regression_suite(0.1 if args.quick else 1.0)
+    if args.save or not os.path.exists(args.baseline):
+        save_baseline(args.baseline, results)
+        for name, seconds in results.items():
+            print(f"{name:<28}{seconds * 1e6:>12.2f} us")
+        print(f"[INFO] Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get("machine") != platform.node():
+        print(f"[INFO] Baseline was recorded on {baseline.get('machine')}; timings may not be comparable.")
+    rows = compare_results(results, baseline["results"], args.threshold)
+    print(f"{'benchmark':<28}{'baseline us':>12}{'now us':>12}{'change':>9}")
+    for name, before, now, ratio, regressed in rows:
+        print(f"{name:<28}{before * 1e6:>12.2f}{now * 1e6:>12.2f}{ratio - 1:>+9.0%}{'  REGRESSION' if regressed else ''}")
+    regressions = [row[0] for row in rows if row[4]]
+    if regressions:
+        print(f"[ERROR] {len(regressions)} benchmarks regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Performance benchmarks for the rollerbird pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pipeline = subparsers.add_parser("pipeline", help="sustained packets/s and per-stage latency of main.py's pipeline")
+    pipeline.add_argument("--source", default="steady",
+                          help=f"capture csv or synthetic profile ({', '.join(replay_source.PROFILES)})")
+    pipeline.add_argument("--speed", type=float, default=0, help="playback speed multiplier, 0 = as fast as possible")
+    pipeline.add_argument("--duration", type=float, default=600, help="synthetic ride length in seconds")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    decode = subparsers.add_parser("decode", help="CSC decode packets/s: legacy handle_data vs the struct decoder")
+    decode.add_argument("--source", default="sprints",
+                        help=f"capture csv or synthetic profile ({', '.join(replay_source.PROFILES)})")
+    decode.add_argument("--duration", type=float, default=100000, help="synthetic ride length in seconds")
+    decode.add_argument("--batch", type=int, default=32, help="packets per handle_batch call")
+    decode.set_defaults(func=bench_decode)
+
+    game = subparsers.add_parser("game", help="gate scoring cost per update versus sequence length")
+    game.add_argument("--durations", type=int, nargs="+", default=[60, 600, 3600, 14400],
+                      help="gate sequence lengths in seconds")
+    game.set_defaults(func=bench_game)
+
+    regress = subparsers.add_parser("regress", help="hot path timings against a saved baseline; exits 1 on regressions")
+    regress.add_argument("--baseline", default=BASELINE_FILE, help=f"baseline json (default: {BASELINE_FILE})")
+    regress.add_argument("--save", action="store_true", help="record this run as the new baseline")
+    regress.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                         help="allowed slowdown as a fraction (default: 0.25)")
+    regress.add_argument("--quick", action="store_true", help="a tenth of the iterations")
+    regress.set_defaults(func=bench_regress)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
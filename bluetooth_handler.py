@@ -2,10 +2,11 @@ import os
 import asyncio
 import time
 import csv
+import struct
 import yaml
 from math import ceil
 from datetime import datetime
-from bleak import BleakClient, BleakScanner
+from instrumentation import TRACER
 
 # # Load configuration
 # def load_config(config_file="config.yaml"):
@@ -27,9 +28,29 @@ prev_crank_event_time = None
 prev_crank_revolutions = 0
 
 # bluetooth handler
+# Cached sensor address
+def load_cached_address(cache_file):
+    """Return the last connected sensor address, or None if there is no cache."""
+    try:
+        with open(cache_file, "r") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def save_cached_address(cache_file, address):
+    """Persist the sensor address atomically so the next start can connect directly."""
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "w") as file:
+        file.write(address)
+    os.replace(tmp_file, cache_file)
+
+
 # Find Sensor
-async def find_sensor(config):
+async def find_sensor(config, scanner=None):
     """Scan for devices for up to 60 seconds, waiting for the sensor to turn on."""
+    if scanner is None:
+        from bleak import BleakScanner as scanner  # only live sensors need bleak; replay and tests don't
     print("[INFO] Scanning for devices...")
 
     retry_duration = config["scan_retry_duration"]  # Total retry duration in seconds
@@ -39,7 +60,7 @@ async def find_sensor(config):
     while time.time() - start_time < retry_duration:
         try:
             print(f"[INFO] Scanning for devices (up to {scan_interval} seconds)...")
-            devices = await BleakScanner.discover(timeout=scan_interval)
+            devices = await scanner.discover(timeout=scan_interval)
             for device in devices:
                 if "CAD" in (device.name or ""):  # Replace "CAD" with part of your sensor's name
                     print(f"[INFO] Sensor found: {device.name} ({device.address})")
@@ -48,99 +69,249 @@ async def find_sensor(config):
         except Exception as e:
             print(f"[ERROR] Exception during scanning: {e}")
 
-    print("[ERROR] Failed to find a matching sensor within 60 seconds.")
+    print(f"[ERROR] Failed to find a matching sensor within {retry_duration} seconds.")
     return None
 
 # Connect to BLE Sensor
-async def connect_to_sensor(queue, shutdown_event, state, config):
-    """Attempt to connect to the sensor and start tracking."""
-    print("[INFO] Attempting to find sensor...")
-    address = await find_sensor(config)
+async def connect_to_sensor(queue, shutdown_event, state, config, scanner=None, client_factory=None):
+    """Connect to the sensor and keep tracking until shutdown, reconnecting after dropouts.
 
-    if not address:
-        print("[ERROR] No sensor found. Please ensure the sensor is active and try again.")
-        return
+    The last known address (config["device_cache"]) is tried first with a
+    direct connect; a scan only runs when there is no cached address or the
+    direct attempt fails. Reconnects back off exponentially from
+    reconnect_delay to reconnect_max_delay seconds. `state` is the same dict
+    across reconnects, so the crank counters carry on where they left off.
+    `scanner` and `client_factory` default to bleak's.
+    """
+    if client_factory is None:
+        from bleak import BleakClient as client_factory
+    cache_file = config.get("device_cache", ".last_sensor")
+    delay = config.get("reconnect_delay", 1)
+    max_delay = config.get("reconnect_max_delay", 30)
+    address = load_cached_address(cache_file)
+    ever_connected = False
 
-    print(f"[INFO] Connecting to sensor at {address}...")
     try:
-        async with BleakClient(address) as client:
-            print("[INFO] Connected to sensor. Starting tracking...")
-            await client.start_notify(config["cadence_uuid"], lambda _, data: asyncio.create_task(handle_data(data, queue, state)))
-            print("[INFO] Notifications started. Listening for data...")
+        while not shutdown_event.is_set():
+            if address is None:
+                print("[INFO] Attempting to find sensor...")
+                address = await find_sensor(config, scanner)
+                if not address:
+                    if not ever_connected:
+                        print("[ERROR] No sensor found. Please ensure the sensor is active and try again.")
+                        return
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, max_delay)
+                    continue
+
+            print(f"[INFO] Connecting to sensor at {address}...")
+            disconnected = asyncio.Event()
+            try:
+                client = client_factory(address, disconnected_callback=lambda _: disconnected.set(),
+                                        timeout=config.get("connect_timeout", 10))
+                await client.connect()
+            except Exception as e:
+                print(f"[ERROR] Direct connect to {address} failed: {e}. Falling back to a scan.")
+                address = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+                continue
+
+            try:
+                print("[INFO] Connected to sensor. Starting tracking...")
+                if load_cached_address(cache_file) != address:
+                    save_cached_address(cache_file, address)
+                ever_connected = True
+                delay = config.get("reconnect_delay", 1)
+                # decode inline in the callback: no task per notification
+                await client.start_notify(config["cadence_uuid"], lambda _, data: handle_packet(data, queue, state))
+                print("[INFO] Notifications started. Listening for data...")
 
-            # Wait for shutdown signal
-            await shutdown_event.wait()
+                # Wait for shutdown signal or a dropped connection
+                shutdown_wait = asyncio.create_task(shutdown_event.wait())
+                disconnect_wait = asyncio.create_task(disconnected.wait())
+                try:
+                    await asyncio.wait([shutdown_wait, disconnect_wait], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    shutdown_wait.cancel()
+                    disconnect_wait.cancel()
+                if disconnected.is_set() and not shutdown_event.is_set():
+                    print("[INFO] Sensor disconnected. Reconnecting...")
+            except Exception as e:
+                print(f"[ERROR] Exception during BLE connection or data streaming: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+            finally:
+                if not disconnected.is_set():
+                    await client.disconnect()
     except asyncio.CancelledError:
         print("[INFO] Sensor connection task canceled.")
-    except Exception as e:
-        print(f"[ERROR] Exception during BLE connection or data streaming: {e}")
 
 
-# Handle incoming data
-# Handle incoming data
-async def handle_data(data, queue, state):
-    """Process the incoming BLE data and push results to a queue."""
-    # Parse data
-    cumulative_crank_revolutions = int.from_bytes(data[1:3], byteorder="little")
-    last_crank_event_time = int.from_bytes(data[3:5], byteorder="little")
+# CSC Measurement (0x2A5B) flags
+WHEEL_DATA_PRESENT = 0x01
+CRANK_DATA_PRESENT = 0x02
 
-    # Initialize state if not already present
-    if "prev_crank_event_time" not in state:
-        state["prev_crank_event_time"] = None
-        state["prev_crank_revolutions"] = 0
-        state["last_cadence"] = 0  # Store the last valid cadence
-        state["last_movement_time"] = time.time()
+# precompiled layouts per flags value (wheel and crank flags only); "x" skips the flags byte.
+# wheel: cumulative revolutions (uint32), last event time (uint16, 1/1024 s)
+# crank: cumulative revolutions (uint16), last event time (uint16, 1/1024 s)
+CSC_LAYOUTS = {
+    0: struct.Struct("<x"),
+    WHEEL_DATA_PRESENT: struct.Struct("<xIH"),
+    CRANK_DATA_PRESENT: struct.Struct("<xHH"),
+    WHEEL_DATA_PRESENT | CRANK_DATA_PRESENT: struct.Struct("<xIHHH"),
+}
 
-    prev_crank_event_time = state["prev_crank_event_time"]
-    prev_crank_revolutions = state["prev_crank_revolutions"]
+CADENCE_TIMEOUT = 10  # seconds without a new crank revolution before cadence drops to zero
+EVENT_TIME_WRAP = 65536 / 1024  # seconds: after a longer gap the 16-bit event time may have wrapped
 
-    current_time = time.time()
 
+def decode_csc(data):
+    """decode a CSC measurement into (wheel_revolutions, wheel_time, crank_revolutions, crank_time).
 
-    # Check for the first event (no previous data to compare with)
-    if prev_crank_event_time is None:
-        # Initialize the state and skip cadence calculation
-        state["prev_crank_event_time"] = last_crank_event_time
-        state["prev_crank_revolutions"] = cumulative_crank_revolutions
-        state["last_movement_time"] = current_time
-        await queue.put({"cadence": 0, "revolutions": cumulative_crank_revolutions})  # No cadence yet
-        return
+    Fields the sensor did not send are None.
+    """
+    flags = data[0] & (WHEEL_DATA_PRESENT | CRANK_DATA_PRESENT)
+    layout = CSC_LAYOUTS[flags]
+    values = layout.unpack_from(data)
+    if flags == WHEEL_DATA_PRESENT | CRANK_DATA_PRESENT:
+        return values
+    if flags == CRANK_DATA_PRESENT:
+        return (None, None) + values
+    if flags == WHEEL_DATA_PRESENT:
+        return values + (None, None)
+    return (None, None, None, None)
 
-    # Ignore duplicate events (no time difference)
-    if prev_crank_event_time == last_crank_event_time:
-        state["last_movement_time"] = current_time
-        await queue.put({"cadence": state["last_cadence"], "revolutions": cumulative_crank_revolutions})
-        return
 
-    # Calculate crank time difference
-    crank_time_diff = (last_crank_event_time - prev_crank_event_time) / 1024  # seconds
-    print(f"[DEBUG] Crank Time Diff: {crank_time_diff:.6f}, Prev Time: {prev_crank_event_time}, Last Time: {last_crank_event_time}")
+def decode_batch(packets):
+    """decode many buffered packets at once; returns a list of decode_csc tuples.
 
-    # Handle rollover
-    if crank_time_diff < 0:
-        crank_time_diff += 65536 / 1024
+    Runs of equal-length packets with the same flags are unpacked in a single
+    struct.iter_unpack pass.
+    """
+    if not packets:
+        return []
+    first = packets[0]
+    flags = first[0] & (WHEEL_DATA_PRESENT | CRANK_DATA_PRESENT)
+    layout = CSC_LAYOUTS[flags]
+    if flags & CRANK_DATA_PRESENT and all(len(p) == layout.size and p[0] == first[0] for p in packets):
+        values = layout.iter_unpack(b"".join(packets))
+        if flags & WHEEL_DATA_PRESENT:
+            return list(values)
+        return [(None, None) + crank for crank in values]
+    return [decode_csc(packet) for packet in packets]
 
-    # Calculate cadence if time difference is valid
-    if crank_time_diff > 0:
-        cadence = (cumulative_crank_revolutions - prev_crank_revolutions) / crank_time_diff * 60
+
+def _init_state(state, current_time):
+    state["prev_crank_event_time"] = None
+    state["prev_crank_revolutions"] = 0
+    state["total_crank_revolutions"] = 0  # unwrapped past the 16-bit counter
+    state["last_cadence"] = 0  # Store the last valid cadence
+    state["last_movement_time"] = current_time
+    state["prev_wheel_event_time"] = None
+    state["prev_wheel_revolutions"] = 0
+    state["total_wheel_revolutions"] = 0  # unwrapped past the 32-bit counter
+    state["last_wheel_rpm"] = 0
+    state["last_wheel_movement_time"] = current_time
+
+
+def process_measurement(decoded, state, current_time):
+    """turn one decoded measurement into a {"cadence", "revolutions", ...} update, tracking state.
+
+    Counters and event times are differenced modulo their field width, so the
+    16-bit crank and event-time fields and the 32-bit wheel counter roll over
+    cleanly. "revolutions" is the unwrapped cumulative crank count. After a
+    gap longer than the event-time wrap the packet only adds revolutions and
+    becomes the baseline for the next rate.
+    """
+    wheel_revolutions, wheel_time, crank_revolutions, crank_time = decoded
+    if "prev_crank_event_time" not in state:
+        _init_state(state, current_time)
+
+    result = {}
+    if wheel_revolutions is not None:
+        if state["prev_wheel_event_time"] is None:
+            state["total_wheel_revolutions"] = wheel_revolutions
+        else:
+            revolutions_diff = (wheel_revolutions - state["prev_wheel_revolutions"]) & 0xFFFFFFFF
+            time_diff = ((wheel_time - state["prev_wheel_event_time"]) & 0xFFFF) / 1024
+            state["total_wheel_revolutions"] += revolutions_diff
+            if current_time - state["last_wheel_movement_time"] > EVENT_TIME_WRAP:
+                # after a long gap (outage, resume) the event time delta is unknown: no rate from it
+                state["last_wheel_rpm"] = 0
+                state["last_wheel_movement_time"] = current_time
+            elif time_diff > 0:
+                state["last_wheel_rpm"] = revolutions_diff / time_diff * 60
+                state["last_wheel_movement_time"] = current_time
+            elif current_time - state["last_wheel_movement_time"] > CADENCE_TIMEOUT:
+                state["last_wheel_rpm"] = 0
+        state["prev_wheel_revolutions"] = wheel_revolutions
+        state["prev_wheel_event_time"] = wheel_time
+        result["wheel_revolutions"] = state["total_wheel_revolutions"]
+        result["wheel_rpm"] = state["last_wheel_rpm"]
+
+    if crank_revolutions is None:
+        result["cadence"] = state["last_cadence"]
+        result["revolutions"] = state["total_crank_revolutions"]
+        return result
+
+    prev_crank_event_time = state["prev_crank_event_time"]
+    if prev_crank_event_time is None:
+        # first event: nothing to compare with yet
+        state["total_crank_revolutions"] = crank_revolutions
+        cadence = 0
+    elif crank_time == prev_crank_event_time:
+        # no new crank event; hold the cadence until the rider has clearly stopped
+        cadence = state["last_cadence"]
+        if current_time - state["last_movement_time"] > CADENCE_TIMEOUT:
+            cadence = 0
     else:
-        cadence = state["last_cadence"]  # Retain previous cadence if invalid time difference
+        revolutions_diff = (crank_revolutions - state["prev_crank_revolutions"]) & 0xFFFF
+        if current_time - state["last_movement_time"] > EVENT_TIME_WRAP:
+            # after a long gap (outage, resume) the event time delta may have wrapped: keep the
+            # revolutions for distance, but start cadence afresh from this packet
+            cadence = 0
+        else:
+            crank_time_diff = ((crank_time - prev_crank_event_time) & 0xFFFF) / 1024  # seconds
+            cadence = revolutions_diff / crank_time_diff * 60
+        state["total_crank_revolutions"] += revolutions_diff
+        state["last_movement_time"] = current_time
 
-    # Update state
-    state["prev_crank_event_time"] = last_crank_event_time
-    state["prev_crank_revolutions"] = cumulative_crank_revolutions
+    state["prev_crank_event_time"] = crank_time
+    state["prev_crank_revolutions"] = crank_revolutions
     state["last_cadence"] = cadence
+    result["cadence"] = cadence
+    result["revolutions"] = state["total_crank_revolutions"]
+    return result
+
 
-    # Check if cadence should drop to zero
-    if current_time - state["last_movement_time"] > 10:  # 10-second threshold
-        print(f"[DEBUG] Cadence reset: {current_time - state['last_movement_time']:.2f}s since last movement")
-        state["last_cadence"] = 0
+def handle_packet(data, queue, state):
+    """Decode a BLE notification and enqueue the result; safe to call from the notification callback."""
+    if TRACER.enabled:
+        t_rx = TRACER.now()  # on arrival, so the decode stage and every later one include decoding
+        result = process_measurement(decode_csc(data), state, time.time())
+        result["t_rx"] = t_rx
+        queue.put_nowait(result)
+        TRACER.record("decode", t_rx)
+        return
+    queue.put_nowait(process_measurement(decode_csc(data), state, time.time()))
 
-    # Push the data into the queue
-    await queue.put({"cadence": cadence, "revolutions": cumulative_crank_revolutions})
 
-    # # Optional: Print data for debugging
-    # print(f"[DATA] Cadence: {cadence:.2f} RPM, Revolutions: {cumulative_crank_revolutions}")
+def handle_batch(packets, queue, state):
+    """Decode a batch of buffered notifications in order and enqueue every result."""
+    current_time = time.time()
+    t_rx = TRACER.now() if TRACER.enabled else None
+    for decoded in decode_batch(packets):
+        result = process_measurement(decoded, state, current_time)
+        if t_rx is not None:
+            result["t_rx"] = t_rx
+        queue.put_nowait(result)
+
+
+# Handle incoming data
+async def handle_data(data, queue, state):
+    """Process the incoming BLE data and push results to a queue."""
+    handle_packet(data, queue, state)
 
 
 async def print_queue_updates(queue):
@@ -0,0 +1,234 @@
+# local network broadcast of live metrics to companion apps and browser dashboards
+import asyncio
+import base64
+import hashlib
+import json
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+HISTORY_FIELDS = ("live_speeds", "intervals")  # RingView/RecordView entries sent as appended points
+SKIPPED_FIELDS = ("t_rx", "speed_history")  # local-only: a latency stamp and the whole-ride pyramid
+HANDSHAKE_TIMEOUT = 0.5  # seconds to wait for an HTTP upgrade before treating a client as plain TCP
+
+
+def websocket_accept(key):
+    """the Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key."""
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+def websocket_frame(payload):
+    """wrap bytes in a single unmasked websocket text frame."""
+    length = len(payload)
+    if length < 126:
+        header = bytes((0x81, length))
+    elif length < 1 << 16:
+        header = bytes((0x81, 126)) + length.to_bytes(2, "big")
+    else:
+        header = bytes((0x81, 127)) + length.to_bytes(8, "big")
+    return header + payload
+
+
+def dict_delta(previous, current):
+    """the entries of a (nested) dict that differ from `previous`, nested the same way; empty if none did."""
+    previous = previous if isinstance(previous, dict) else {}
+    delta = {}
+    for key, value in current.items():
+        if isinstance(value, dict):
+            changed = dict_delta(previous.get(key), value)
+            if changed:
+                delta[key] = changed
+        elif key not in previous or previous[key] != value:
+            delta[key] = value
+    return delta
+
+
+class DeltaEncoder:
+    """Turns successive metrics dicts into deltas against what one client last received.
+
+    Scalar fields are sent only when their value changed; dict fields (the
+    rollup windows) only with the entries that changed, for the client to
+    merge into what it has. History views
+    are sent as the points appended since the last version sent
+    (`{"append": [...]}`), or in full (`{"reset": [...]}`) on the first
+    message or when the client fell so far behind that the ring buffer
+    already overwrote the points it is missing.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.versions = {}
+        self.seq = 0
+
+    def encode(self, metrics):
+        """the delta message for `metrics`, or None if nothing changed."""
+        message = {}
+        changed = {}
+        for field, value in metrics.items():
+            if field in HISTORY_FIELDS or field in SKIPPED_FIELDS:
+                continue
+            if isinstance(value, dict):
+                delta = dict_delta(self.fields.get(field), value)
+                self.fields[field] = value
+                if delta:
+                    changed[field] = delta
+                continue
+            if field not in self.fields or self.fields[field] != value:
+                changed[field] = self.fields[field] = value
+        if changed:
+            message["fields"] = changed
+        for field in HISTORY_FIELDS:
+            view = metrics.get(field)
+            if view is None:
+                continue
+            if view.stale:
+                # the buffer wrapped past this view after it was published: send what it holds now
+                view = view.refresh()
+            if self.versions.get(field) == view.version:
+                continue
+            points = view.since(self.versions[field]) if field in self.versions else None
+            message[field] = {"append": points} if points is not None else {"reset": view[:]}
+            self.versions[field] = view.version
+        if not message:
+            return None
+        self.seq += 1
+        message["seq"] = self.seq
+        return message
+
+
+class BroadcastClient:
+    """one connected client: a latest-state slot and a writer that sends deltas at its own pace."""
+
+    def __init__(self, writer, websocket=False):
+        self.writer = writer
+        self.websocket = websocket
+        self.encoder = DeltaEncoder()
+        self.wake = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+
+    def frame(self, message):
+        payload = json.dumps(message, separators=(",", ":")).encode()
+        return websocket_frame(payload) if self.websocket else payload + b"\n"
+
+    def close(self):
+        self.closed = True
+        self.wake.set()
+
+
+class BroadcastServer:
+    """Serves live metrics over TCP (newline-delimited JSON) and WebSocket on one port.
+
+    `publish()` only stores the latest metrics and wakes the client
+    writers, so it never blocks the pipeline. Each writer sends the delta
+    between the newest metrics and what its client last received; while a
+    slow client is still draining, newer updates simply replace the
+    pending one and are coalesced into the next delta.
+    """
+
+    def __init__(self, host="0.0.0.0", port=8765):
+        self.host = host
+        self.port = port
+        self.latest = None
+        self.clients = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]  # the real port when started on port 0
+        print(f"[INFO] Broadcasting metrics on {self.host}:{self.port}")
+        return self
+
+    async def stop(self):
+        for client in list(self.clients):
+            client.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def publish(self, metrics):
+        self.latest = metrics
+        for client in self.clients:
+            client.wake.set()
+
+    async def _handshake(self, reader, writer):
+        """answer an HTTP websocket upgrade if the client starts with one; returns True for websockets."""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=HANDSHAKE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False  # a plain TCP client that just listens
+        if not request_line.startswith(b"GET"):
+            return False
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            raise ConnectionError("HTTP request without a websocket upgrade")
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + websocket_accept(key).encode() + b"\r\n\r\n"
+        )
+        return True
+
+    async def _watch_reader(self, reader, client):
+        """discard anything the client sends and close it on EOF (websocket close frames end with EOF too)."""
+        try:
+            while await reader.read(4096):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        client.close()
+
+    async def _handle_client(self, reader, writer):
+        watcher = None
+        client = None
+        try:
+            websocket = await self._handshake(reader, writer)
+            client = BroadcastClient(writer, websocket)
+            self.clients.add(client)
+            watcher = asyncio.create_task(self._watch_reader(reader, client))
+            if self.latest is not None:
+                client.wake.set()
+            while True:
+                await client.wake.wait()
+                client.wake.clear()
+                if client.closed:
+                    break
+                message = client.encoder.encode(self.latest)
+                if message is None:
+                    continue
+                writer.write(client.frame(message))
+                await writer.drain()  # updates published meanwhile are coalesced into the next delta
+                client.sent += 1
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if client is not None:
+                self.clients.discard(client)
+            if watcher is not None:
+                watcher.cancel()
+            writer.close()
+
+    async def run(self, metrics_queue, shutdown_event):
+        """forward metrics from a bus subscription to every client until shutdown."""
+        await self.start()
+        try:
+            while not shutdown_event.is_set():
+                try:
+                    self.publish(await asyncio.wait_for(metrics_queue.get(), timeout=1))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.stop()
+
+
+async def broadcast(metrics_queue, shutdown_event, config):
+    """serve live metrics on broadcast_host:broadcast_port until shutdown."""
+    server = BroadcastServer(config.get("broadcast_host", "0.0.0.0"), config.get("broadcast_port", 8765))
+    await server.run(metrics_queue, shutdown_event)
@@ -0,0 +1,152 @@
+# crash-safe session checkpoints: periodic atomic snapshots of the pipeline state for --resume
+import asyncio
+import os
+import pickle
+import time
+from array import array
+
+from bluetooth_handler import load_cached_address, save_cached_address
+from metrics_calculator import MetricsEngine
+
+CHECKPOINT_VERSION = 1
+
+
+def build_checkpoint(engine, crank_state, config):
+    """serialize the session state in one pickle, so shared buffers stay shared on restore.
+
+    Runs on the event loop, so the snapshot is consistent; it only copies
+    arrays and a few scalars, which takes well under a millisecond.
+    """
+    return pickle.dumps({
+        "version": CHECKPOINT_VERSION,
+        "time": time.time(),
+        "engine": engine.checkpoint(),
+        "crank_state": dict(crank_state),
+        "address": load_cached_address(config.get("device_cache", ".last_sensor")),
+        "log_file": config.get("log_file"),
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def write_checkpoint(file_path, payload, fsync=True):
+    """replace the checkpoint atomically: a crash mid-write leaves the previous one intact."""
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(payload)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+    os.replace(temp_path, file_path)
+
+
+def load_checkpoint(file_path):
+    """the saved checkpoint dict, or None if there is none or it can't be read."""
+    try:
+        with open(file_path, "rb") as file:
+            checkpoint = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"[ERROR] Could not read checkpoint {file_path}: {e}")
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        print(f"[ERROR] Checkpoint {file_path} has an unsupported version.")
+        return None
+    return checkpoint
+
+
+def history_file(checkpoint_file):
+    """the file holding the whole-ride speed samples that go with a checkpoint."""
+    return f"{checkpoint_file}.history"
+
+
+def append_history(file_path, samples, fsync=True, start=False):
+    """append new speed samples (start=True begins the file afresh); each write costs the new samples alone."""
+    with open(file_path, "wb" if start else "ab") as file:
+        samples.tofile(file)
+        if fsync:
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def load_history(file_path, length):
+    """the first `length` saved speed samples, or as many as could be read."""
+    samples = array("d")
+    try:
+        with open(file_path, "rb") as file:
+            samples.frombytes(file.read(length * samples.itemsize))
+    except OSError as e:
+        print(f"[ERROR] Could not read speed history {file_path}: {e}")
+    if len(samples) < length:
+        print(f"[ERROR] Speed history {file_path} has {len(samples)} of {length} samples; the plot starts there.")
+    return samples
+
+
+def save_checkpoint(file_path, payload, samples, fsync=True):
+    """append the new history samples, then replace the checkpoint that counts them."""
+    append_history(history_file(file_path), samples, fsync)
+    write_checkpoint(file_path, payload, fsync)
+
+
+def resume_session(checkpoint, crank_state, config):
+    """restore a checkpoint into a MetricsEngine and the crank state; returns the engine.
+
+    The whole-ride plot is rebuilt from the saved history samples. The
+    checkpointed sensor address becomes the cached address, so
+    connect_to_sensor reattaches to the same sensor directly, and the
+    logger keeps appending to the same workout log.
+    """
+    now = time.time()
+    engine = MetricsEngine(config)
+    saved = checkpoint["engine"]
+    history = load_history(history_file(config.get("checkpoint_file", "session.ckpt")), saved["history_length"])
+    engine.restore(saved, now, history)
+    crank_state.clear()
+    crank_state.update(checkpoint["crank_state"])
+    if crank_state:
+        # the movement times stay as saved: process_measurement takes the first packet after a gap
+        # longer than the event-time wrap as a new baseline instead of a cadence
+        crank_state.update(last_cadence=0, last_wheel_rpm=0)
+    cache_file = config.get("device_cache", ".last_sensor")
+    if checkpoint["address"] and load_cached_address(cache_file) != checkpoint["address"]:
+        save_cached_address(cache_file, checkpoint["address"])
+    if checkpoint["log_file"]:
+        config["log_file"] = checkpoint["log_file"]
+    return engine
+
+
+def remove_checkpoint(file_path):
+    """forget the checkpoint after a session ended normally: there is nothing to resume."""
+    for path in (file_path, history_file(file_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def checkpointer(engine, crank_state, shutdown_event, config):
+    """write a checkpoint every checkpoint_interval seconds, off the event loop.
+
+    Each write appends only the speed samples added since the last one to
+    the history file, so checkpoints stay the same size however long the ride.
+    """
+    file_path = config.get("checkpoint_file", "session.ckpt")
+    interval = config.get("checkpoint_interval", 10)
+    fsync = config.get("checkpoint_fsync", True)
+    loop = asyncio.get_running_loop()
+    pending = None
+    # the history file starts with the samples so far: none, or a resumed session's
+    written = len(engine.state["speed_pyramid"])
+    await loop.run_in_executor(
+        None, append_history, history_file(file_path), engine.state["speed_pyramid"].values[:written], fsync, True
+    )
+    try:
+        while not shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                samples = engine.state["speed_pyramid"].values[written:]
+                payload = build_checkpoint(engine, crank_state, config)
+                written += len(samples)
+                pending = loop.run_in_executor(None, save_checkpoint, file_path, payload, samples, fsync)
+                await asyncio.shield(pending)
+    finally:
+        if pending is not None and not pending.done():
+            await asyncio.wait([pending])  # a cancelled task must not leave a write racing remove_checkpoint
@@ -2,60 +2,195 @@ import os
 from datetime import datetime
 import csv
 import asyncio
+import mmap
+import queue
+import struct
+import threading
+import time
 
-def generate_csv_file_name():
+from instrumentation import TRACER
+from score_store import index_workout
+
+CSV_FIELDNAMES = ["time", "cadence", "speed", "distance", "average_speed"]
+
+# binary log: 8-byte magic header, then fixed-width little-endian records of
+# (unix time, cadence, speed, distance, average_speed) as float64
+BINARY_MAGIC = b"RBLOG\x00\x01\x00"
+BINARY_RECORD = struct.Struct("<5d")
+
+LOG_EXTENSIONS = {"csv": ".csv", "binary": ".rbl"}
+
+
+def generate_log_file_name(extension=".csv"):
     """generate a unique file name for logging workouts."""
     directory = "workouts"
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    base_name = f"workout_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+    base_name = f"workout_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{extension}"
     file_path = os.path.join(directory, base_name)
     return file_path
 
 
-def batch_write_to_csv(file_path, data, fieldnames):
-    """write a batch of data to the csv file."""
-    if not data:
-        return  # no new data to write
+def format_csv_row(record):
+    """turn a (unix time, cadence, speed, distance, average_speed) record into a csv row."""
+    timestamp, cadence, speed, distance, average_speed = record
+    return [datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S"), cadence, speed, distance, average_speed]
+
 
-    with open(file_path, mode="a", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if os.stat(file_path).st_size == 0:  # write header if file is empty
-            writer.writeheader()
-        writer.writerows(data)
+class WorkoutWriter:
+    """Streams workout records to an open log file from a background thread.
 
-    print(f"[INFO] Batch written to {file_path}")
+    `write()` only enqueues, so it never blocks the event loop. The thread
+    flushes at least every `flush_interval` seconds (and fsyncs if `fsync`
+    is set), bounding what a crash can lose to that interval.
+    """
 
+    def __init__(self, file_path, log_format="csv", flush_interval=5, fsync=False):
+        if log_format not in LOG_EXTENSIONS:
+            raise ValueError(f"Unknown log format: {log_format}")
+        self.file_path = file_path
+        self.log_format = log_format
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.records_written = 0
+        self.error = None  # what stopped the writer thread, if anything did
+        self._file = None
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="workout-writer", daemon=True)
 
-async def logger(metrics_queue, shutdown_event):
-    """consume data from metrics_queue and write to a csv file."""
-    csv_file_path = generate_csv_file_name()
-    fieldnames = ["time", "cadence", "speed", "distance", "average_speed"]
-    log_batch = []  # temporary buffer for storing data
-    batch_interval = 30  # write every 30 seconds
-    last_written_time = datetime.now()
+    def start(self):
+        """open the log (so a bad path fails here, in the caller) and start the writer thread."""
+        binary = self.log_format == "binary"
+        self._file = open(self.file_path, mode="ab" if binary else "a", newline=None if binary else "")
+        self._thread.start()
+        return self
 
-    while not shutdown_event.is_set():
+    def write(self, record):
+        """queue a (unix time, cadence, speed, distance, average_speed) record."""
+        if self.error is not None:
+            raise self.error  # the thread is gone: don't queue records nobody will write
+        self._queue.put(record)
+
+    def close(self):
+        """flush everything queued so far and stop the thread (blocking)."""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
         try:
-            # get the latest data from the queue
-            metrics = await asyncio.wait_for(metrics_queue.get(), timeout=1)
-
-            # add timestamped metrics to the log batch
-            log_batch.append({
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "cadence": metrics["live_RPM"],
-                "speed": metrics["live_speed"],
-                "distance": metrics["total_distance"],
-                "average_speed": metrics["average_speed"],
-            })
-
-            # check if the batch interval has elapsed
-            now = datetime.now()
-            if (now - last_written_time).total_seconds() >= batch_interval:
-                batch_write_to_csv(csv_file_path, log_batch, fieldnames)
-                log_batch = []  # reset the batch
-                last_written_time = now
-
-        except asyncio.TimeoutError:
-            pass
\ No newline at end of file
+            self._write_records()
+        except Exception as e:
+            self.error = e
+            print(f"[ERROR] Workout log {self.file_path} stopped: {e}")
+
+    def _write_records(self):
+        binary = self.log_format == "binary"
+        with self._file as logfile:
+            if binary and logfile.tell() > len(BINARY_MAGIC):
+                # resuming a log: drop a record torn by a crash so appended records stay aligned
+                logfile.truncate(logfile.tell() - (logfile.tell() - len(BINARY_MAGIC)) % BINARY_RECORD.size)
+            if logfile.tell() == 0:  # write the header if the file is new
+                if binary:
+                    logfile.write(BINARY_MAGIC)
+                else:
+                    csv.writer(logfile).writerow(CSV_FIELDNAMES)
+            writer = None if binary else csv.writer(logfile)
+            last_flush = time.monotonic()
+            closing = False
+
+            while not closing:
+                # wait for the next record, then drain whatever else is queued before touching the disk
+                batch = []
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                    while True:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    pass
+
+                for record in batch:
+                    if record is None:  # close() was called
+                        closing = True
+                        break
+                    if binary:
+                        logfile.write(BINARY_RECORD.pack(*record))
+                    else:
+                        writer.writerow(format_csv_row(record))
+                    self.records_written += 1
+
+                if closing or time.monotonic() - last_flush >= self.flush_interval:
+                    logfile.flush()
+                    if self.fsync:
+                        os.fsync(logfile.fileno())
+                    last_flush = time.monotonic()
+
+
+def read_binary_log(file_path):
+    """return the records of a binary workout log as a list of tuples."""
+    with open(file_path, "rb") as logfile:
+        if logfile.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"Not a binary workout log: {file_path}")
+        size = os.fstat(logfile.fileno()).st_size
+        if size == len(BINARY_MAGIC):
+            return []
+        with mmap.mmap(logfile.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # ignore a torn record at the end of a log from a crashed session
+            end = len(BINARY_MAGIC) + (size - len(BINARY_MAGIC)) // BINARY_RECORD.size * BINARY_RECORD.size
+            return list(BINARY_RECORD.iter_unpack(mapped[len(BINARY_MAGIC):end]))
+
+
+def export_binary_to_csv(binary_path, csv_path=None):
+    """convert a binary workout log to the csv format; returns the csv path."""
+    csv_path = csv_path or os.path.splitext(binary_path)[0] + ".csv"
+    with open(csv_path, mode="w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(CSV_FIELDNAMES)
+        writer.writerows(format_csv_row(record) for record in read_binary_log(binary_path))
+    return csv_path
+
+
+async def logger(metrics_queue, shutdown_event, config=None):
+    """consume data from metrics_queue and stream it to a workout log."""
+    config = config or {}
+    log_format = config.get("log_format", "csv")
+    writer = WorkoutWriter(
+        # a resumed session keeps appending to its log
+        config.get("log_file") or generate_log_file_name(LOG_EXTENSIONS.get(log_format, ".csv")),
+        log_format,
+        flush_interval=config.get("log_flush_interval", 5),
+        fsync=config.get("log_fsync", False),
+    ).start()
+
+    try:
+        while not shutdown_event.is_set():
+            try:
+                # get the latest data from the queue
+                metrics = await asyncio.wait_for(metrics_queue.get(), timeout=1)
+
+                # hand the timestamped metrics to the writer thread
+                record = (
+                    time.time(),
+                    metrics["live_RPM"],
+                    metrics["live_speed"],
+                    metrics["total_distance"],
+                    metrics["average_speed"],
+                )
+                writer.write(record)
+                if TRACER.enabled and "t_rx" in metrics:
+                    TRACER.record("logger", metrics["t_rx"])
+
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        # flush and close the file without blocking the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, writer.close)
+        print(f"[INFO] Workout log written to {writer.file_path}")
+        if config.get("score_db") and writer.records_written:
+            # summarize the closed log into the session index, so startup never has to parse it
+            await loop.run_in_executor(
+                None, index_workout, config["score_db"], writer.file_path, config.get("rider_name", "rider")
+            )
@@ -0,0 +1,147 @@
+# in-process stand-ins for bleak's scanner and client, for tests and load tests
+import asyncio
+from functools import lru_cache
+
+from replay_source import synthetic_packets
+from session_manager import CSC_SERVICE_UUID, HEART_RATE_SERVICE_UUID
+
+
+@lru_cache(maxsize=None)
+def _profile_packets(profile):
+    """ten minutes of one-per-second packets, shared by every device on the profile."""
+    return tuple(packet for _, packet in synthetic_packets(profile, duration=600))
+
+
+class FakeDevice:
+    """a simulated BLE sensor; mimics the attributes of bleak's BLEDevice.
+
+    Packets carry one second of riding each; `interval` is the wall-clock
+    time between notifications, so interval=0.01 replays a ride 100x faster.
+    """
+
+    def __init__(self, address, name, kind="csc", profile="steady", interval=1.0, heart_rate=140):
+        self.address = address
+        self.name = name
+        self.kind = kind
+        self.profile = profile
+        self.interval = interval
+        self.heart_rate = heart_rate
+        self.service_uuids = [HEART_RATE_SERVICE_UUID if kind == "heart_rate" else CSC_SERVICE_UUID]
+        self._stream = None
+
+    def packets(self):
+        """the device's notification stream; it carries on across reconnects, like a real sensor."""
+        if self._stream is None:
+            self._stream = self._generate()
+        return self._stream
+
+    def _generate(self):
+        if self.kind == "heart_rate":
+            while True:
+                yield bytes([0x00, self.heart_rate])  # flags 0: uint8 heart rate
+        else:
+            while True:
+                yield from _profile_packets(self.profile)
+
+
+class FakeAdvertisement:
+    def __init__(self, device):
+        self.local_name = device.name
+        self.service_uuids = device.service_uuids
+
+
+class FakeScanner:
+    """replacement for BleakScanner exposing the same discover() coroutine."""
+
+    def __init__(self, devices, scan_delay=0):
+        self.devices = devices
+        self.scan_delay = scan_delay
+        self.scans = 0
+
+    async def discover(self, timeout=5.0, return_adv=False, **kwargs):
+        self.scans += 1
+        await asyncio.sleep(self.scan_delay)
+        if return_adv:
+            return {device.address: (device, FakeAdvertisement(device)) for device in self.devices}
+        return list(self.devices)
+
+
+class FakeClient:
+    """replacement for BleakClient that streams a FakeDevice's packets to start_notify callbacks."""
+
+    def __init__(self, device, speed=1.0, connect_delay=0, disconnected_callback=None):
+        self.device = device
+        self.address = device.address
+        self.speed = speed
+        self.connect_delay = connect_delay
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+        self.packets_sent = 0
+        self._tasks = []
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_delay)
+        self.is_connected = True
+
+    async def disconnect(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.is_connected = False
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    async def start_notify(self, uuid, callback):
+        self._tasks.append(asyncio.create_task(self._notify(uuid, callback)))
+
+    async def _notify(self, uuid, callback):
+        delay = self.device.interval / self.speed if self.speed > 0 else 0
+        for packet in self.device.packets():
+            await asyncio.sleep(delay)
+            callback(uuid, bytearray(packet))
+            self.packets_sent += 1
+
+    def drop(self):
+        """simulate the sensor going out of range."""
+        for task in self._tasks:
+            task.cancel()
+        self.is_connected = False
+        if self.disconnected_callback:
+            self.disconnected_callback(self)
+
+
+class FakeBackend:
+    """a room of simulated sensors: pass `scanner` and `client` where bleak's are expected."""
+
+    def __init__(self, devices, speed=1.0, connect_delay=0, scan_delay=0):
+        self.devices = {device.address: device for device in devices}
+        self.speed = speed
+        self.connect_delay = connect_delay
+        self.scanner = FakeScanner(devices, scan_delay)
+        self.clients = []
+
+    def client(self, address, disconnected_callback=None, **kwargs):
+        if address not in self.devices:
+            raise ValueError(f"Unknown fake device: {address}")
+        client = FakeClient(self.devices[address], self.speed, self.connect_delay, disconnected_callback)
+        self.clients.append(client)
+        return client
+
+
+def make_room(csc_count, heart_rate_count=0, profile="steady", interval=1.0):
+    """simulated devices for a room of rollers: CSC sensors plus optional heart rate straps."""
+    devices = [
+        FakeDevice(f"00:00:00:00:{i // 256:02X}:{i % 256:02X}", f"CAD-{i}", "csc", profile, interval)
+        for i in range(csc_count)
+    ]
+    devices += [
+        FakeDevice(f"00:00:00:01:{i // 256:02X}:{i % 256:02X}", f"HRM-{i}", "heart_rate", interval=interval)
+        for i in range(heart_rate_count)
+    ]
+    return devices
@@ -1,4 +1,178 @@
 # gamification module (already drafted)
+import asyncio
+import csv
+import os
+import random
+import time
+from array import array
 from datetime import datetime
 
+from score_store import record_score
+
 # parameters, gate generation, scoring logic, etc.
+SCORE_FIELDNAMES = ["date", "rider", "mode", "seed", "score", "gates_hit", "gates_total", "duration"]
+GATE_HIT_THRESHOLD = 0.5  # a gate counts as hit if the rider held its window for half of it
+
+DEFAULT_GAME_CONFIG = {
+    "game_seed": 1,
+    "game_duration": 1800,          # seconds
+    "game_gate_min_length": 20,     # seconds
+    "game_gate_max_length": 60,
+    "game_speed_range": [20, 45],   # km/h, centre of the target speed window
+    "game_speed_window": 4,         # km/h either side of the centre
+    "game_cadence_range": [70, 110],
+    "game_cadence_window": 10,      # RPM either side of the centre
+}
+
+
+class GateSequence:
+    """A seeded sequence of gates stored column-wise in arrays.
+
+    Gate i runs from starts[i] for lengths[i] seconds and asks for a speed
+    in [speed_min[i], speed_max[i]] and a cadence in [cadence_min[i],
+    cadence_max[i]]. `second_index` maps every whole second of the
+    sequence to its gate, so finding the active gate is one array lookup.
+    """
+
+    def __init__(self, seed, gates):
+        self.seed = seed
+        self.starts = array("d")
+        self.lengths = array("d")
+        self.speed_min = array("d")
+        self.speed_max = array("d")
+        self.cadence_min = array("d")
+        self.cadence_max = array("d")
+        self.second_index = array("I")
+        for start, length, speed, cadence in gates:
+            self.starts.append(start)
+            self.lengths.append(length)
+            self.speed_min.append(speed[0])
+            self.speed_max.append(speed[1])
+            self.cadence_min.append(cadence[0])
+            self.cadence_max.append(cadence[1])
+            self.second_index.extend([len(self.starts) - 1] * int(length))
+        self.duration = int(sum(self.lengths))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def gate_at(self, elapsed):
+        """index of the gate active `elapsed` seconds in, or None once the sequence is over."""
+        second = int(elapsed)
+        if 0 <= second < self.duration:
+            return self.second_index[second]
+        return None
+
+
+def generate_gate_sequence(seed, config=None):
+    """generate the same gate sequence for the same seed and config, up front."""
+    config = {**DEFAULT_GAME_CONFIG, **(config or {})}
+    rng = random.Random(seed)
+    gates = []
+    start = 0
+    while start < config["game_duration"]:
+        length = min(rng.randint(config["game_gate_min_length"], config["game_gate_max_length"]),
+                     config["game_duration"] - start)
+        speed = rng.uniform(*config["game_speed_range"])
+        cadence = rng.uniform(*config["game_cadence_range"])
+        gates.append((
+            start,
+            length,
+            (speed - config["game_speed_window"], speed + config["game_speed_window"]),
+            (cadence - config["game_cadence_window"], cadence + config["game_cadence_window"]),
+        ))
+        start += length
+    return GateSequence(seed, gates)
+
+
+class GateScorer:
+    """Scores a stream of metrics updates against a GateSequence in O(1) per update.
+
+    Each update credits the time since the previous update to the gate that
+    was active, if speed and cadence were inside its window. A gate's score
+    is the fraction of it spent inside the window; the total is out of 100
+    points per gate.
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+        self.time_in_window = array("d", [0.0]) * len(sequence)
+        self.last_elapsed = None
+        self.last_in_window = False
+        self.last_gate = None
+
+    def update(self, metrics, elapsed):
+        """score one metrics update taken `elapsed` seconds into the game; returns the active gate index."""
+        sequence = self.sequence
+        gate = sequence.gate_at(elapsed)
+        if self.last_gate is not None and self.last_in_window:
+            # credit the previous interval to the gate it started in, up to that gate's end
+            gate_end = sequence.starts[self.last_gate] + sequence.lengths[self.last_gate]
+            self.time_in_window[self.last_gate] += min(elapsed, gate_end) - self.last_elapsed
+        if gate is not None:
+            speed = metrics["live_speed"]
+            cadence = metrics["live_RPM"]
+            self.last_in_window = (sequence.speed_min[gate] <= speed <= sequence.speed_max[gate]
+                                   and sequence.cadence_min[gate] <= cadence <= sequence.cadence_max[gate])
+        self.last_gate = gate
+        self.last_elapsed = elapsed
+        return gate
+
+    @property
+    def finished(self):
+        return self.last_elapsed is not None and self.last_gate is None
+
+    def gate_scores(self):
+        return [held / length for held, length in zip(self.time_in_window, self.sequence.lengths)]
+
+    def result(self):
+        scores = self.gate_scores()
+        return {
+            "score": round(100 * sum(scores)),
+            "gates_hit": sum(1 for score in scores if score >= GATE_HIT_THRESHOLD),
+            "gates_total": len(scores),
+        }
+
+
+def write_score(file_path, row):
+    """append one game result to the scores csv, writing the header if the file is empty."""
+    with open(file_path, mode="a", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=SCORE_FIELDNAMES)
+        if os.stat(file_path).st_size == 0:  # write header if file is empty
+            writer.writeheader()
+        writer.writerow(row)
+
+
+async def game(metrics_queue, shutdown_event, config):
+    """score live metrics against a seeded gate sequence and record the result in scores.csv."""
+    seed = config.get("game_seed", DEFAULT_GAME_CONFIG["game_seed"])
+    sequence = generate_gate_sequence(seed, config)
+    scorer = GateScorer(sequence)
+    start_time = None
+    print(f"[INFO] Game started: {len(sequence)} gates over {sequence.duration} s (seed {seed}).")
+
+    try:
+        while not shutdown_event.is_set() and not scorer.finished:
+            try:
+                metrics = await asyncio.wait_for(metrics_queue.get(), timeout=1)
+                now = time.monotonic()
+                if start_time is None:
+                    start_time = now  # the game clock starts with the first update
+                scorer.update(metrics, now - start_time)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if start_time is not None:
+            row = {
+                "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "rider": config.get("rider_name", "rider"),
+                "mode": "gates",
+                "seed": seed,
+                "duration": round(min(scorer.last_elapsed, sequence.duration)),
+                **scorer.result(),
+            }
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, write_score, config.get("scores_file", "scores.csv"), row)
+            if config.get("score_db"):
+                await loop.run_in_executor(None, record_score, config["score_db"], row)
+            print(f"[INFO] Game over: {row['score']} points, {row['gates_hit']}/{row['gates_total']} gates.")
@@ -0,0 +1,133 @@
+from array import array
+
+
+class HistoryPyramid:
+    """Full-session history of numbers with min/max/mean downsampling levels.
+
+    Level 0 holds every sample; each level above holds buckets of `factor`
+    times as many samples (min, max and sum), updated in place as samples
+    arrive, so appending costs O(levels) = O(log n). `columns()` reads any
+    range at any width from the coarsest level that still has enough
+    buckets, in time proportional to the width rather than the ride length.
+    """
+
+    def __init__(self, factor=2):
+        if factor < 2:
+            raise ValueError("HistoryPyramid factor must be at least 2")
+        self.factor = factor
+        self.values = array("d")
+        self.levels = []  # levels[k - 1] = (mins, maxs, sums) with buckets of factor ** k samples
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        values = self.values
+        values.append(value)
+        position = len(values) - 1
+        size = 1
+        for mins, maxs, sums in self.levels:
+            size *= self.factor
+            if position % size == 0:  # first sample of a new bucket
+                mins.append(value)
+                maxs.append(value)
+                sums.append(value)
+            else:
+                if value < mins[-1]:
+                    mins[-1] = value
+                if value > maxs[-1]:
+                    maxs[-1] = value
+                sums[-1] += value
+        top = self.levels[-1][0] if self.levels else values
+        if len(top) > self.factor:
+            self._add_level()
+
+    def _add_level(self):
+        """build the next level up from the current top level (once, in O(factor) buckets)."""
+        mins, maxs, sums, _ = self._level(len(self.levels))
+        factor = self.factor
+        level = (array("d"), array("d"), array("d"))
+        for first in range(0, len(mins), factor):
+            level[0].append(min(mins[first:first + factor]))
+            level[1].append(max(maxs[first:first + factor]))
+            level[2].append(sum(sums[first:first + factor]))
+        self.levels.append(level)
+
+    def _level(self, k):
+        """(mins, maxs, sums, samples per bucket) of level k."""
+        if k == 0:
+            return self.values, self.values, self.values, 1
+        mins, maxs, sums = self.levels[k - 1]
+        return mins, maxs, sums, self.factor ** k
+
+    def _aggregate(self, first, stop):
+        """exact (min, max, sum) of samples first..stop-1 from the largest aligned buckets, O(factor * levels)."""
+        low, high, total = float("inf"), float("-inf"), 0.0
+        while first < stop:
+            k, size = 0, 1
+            while k < len(self.levels) and first % (size * self.factor) == 0 and first + size * self.factor <= stop:
+                k += 1
+                size *= self.factor
+            mins, maxs, sums, _ = self._level(k)
+            bucket = first // size
+            low = min(low, mins[bucket])
+            high = max(high, maxs[bucket])
+            total += sums[bucket]
+            first += size
+        return low, high, total
+
+    def view(self):
+        """the history as it is now; later samples are left out of its columns."""
+        return PyramidView(self, len(self.values))
+
+    def columns(self, width, start=0, end=None):
+        """(lows, highs, means) for samples start..end-1 in at most `width` columns.
+
+        Ranges shorter than `width` come back one column per sample.
+        """
+        total = len(self.values)
+        end = total if end is None else min(end, total)
+        start = max(0, start)
+        span = end - start
+        if span <= 0 or width <= 0:
+            return [], [], []
+
+        # the coarsest level that still has at least `width` buckets over the range
+        k, size = 0, 1
+        while k < len(self.levels) and size * self.factor * width <= span:
+            k += 1
+            size *= self.factor
+        mins, maxs, sums, size = self._level(k)
+        first, last = start // size, -(-end // size)
+        buckets = last - first
+
+        lows, highs, means = [], [], []
+        for column in range(min(width, buckets)):
+            b0 = first + column * buckets // width if buckets > width else first + column
+            b1 = first + (column + 1) * buckets // width if buckets > width else b0 + 1
+            lo, hi = max(start, b0 * size), min(end, b1 * size)
+            if lo == b0 * size and hi == b1 * size:
+                low, high, column_sum = min(mins[b0:b1]), max(maxs[b0:b1]), sum(sums[b0:b1])
+            else:  # an edge column: its buckets reach outside the range
+                low, high, column_sum = self._aggregate(lo, hi)
+            lows.append(low)
+            highs.append(high)
+            means.append(column_sum / (hi - lo))
+        return lows, highs, means
+
+
+class PyramidView:
+    """a HistoryPyramid as of `length` samples, as RingView is for RingBuffer."""
+
+    __slots__ = ("pyramid", "length")
+
+    def __init__(self, pyramid, length):
+        self.pyramid = pyramid
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def columns(self, width, start=0, end=None):
+        end = self.length if end is None else min(end, self.length)
+        return self.pyramid.columns(width, start, end)
@@ -0,0 +1,152 @@
+# optional end-to-end latency tracing for the sensor -> metrics -> display/logger pipeline
+import asyncio
+import json
+import os
+import time
+
+# histogram buckets: SUB_BUCKETS per power of two of the latency in microseconds,
+# which keeps percentiles within ~20% at any scale with a fixed, small array
+SUB_BUCKETS = 4
+MAX_EXPONENT = 40
+
+
+class LatencyHistogram:
+    """fixed-size log-bucketed histogram of latencies (seconds in, microsecond buckets)."""
+
+    def __init__(self):
+        self.counts = [0] * (MAX_EXPONENT * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(microseconds):
+        if microseconds < 1:
+            return 0
+        exponent = int(microseconds).bit_length() - 1
+        fraction = microseconds / (1 << exponent) - 1  # 0 <= fraction < 1
+        return min(exponent * SUB_BUCKETS + int(fraction * SUB_BUCKETS), MAX_EXPONENT * SUB_BUCKETS - 1)
+
+    @staticmethod
+    def _upper_bound(bucket):
+        exponent, sub = divmod(bucket, SUB_BUCKETS)
+        return (1 << exponent) * (1 + (sub + 1) / SUB_BUCKETS)
+
+    def record(self, seconds):
+        microseconds = seconds * 1e6
+        self.counts[self._bucket(microseconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """upper bound (seconds) of the bucket holding the p-th percentile."""
+        if not self.count:
+            return 0.0
+        target = p / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return min(self._upper_bound(bucket) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p95_ms": self.percentile(95) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class Tracer:
+    """Per-stage latency histograms and queue-depth gauges.
+
+    Samples are stamped with `now()` when the notification arrives
+    ("t_rx"); each later stage calls `record(stage, t_rx)`. Hot paths
+    check `TRACER.enabled` first, so a disabled tracer costs one
+    attribute lookup per stage.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.role = "main"  # which process wrote a report, when several share one trace file
+        self.histograms = {}
+        self.gauges = {}
+        self.gauge_max = {}
+
+    now = staticmethod(time.perf_counter)
+
+    def configure(self, config, role="main"):
+        self.enabled = bool(config.get("trace_enabled", False))
+        self.role = role
+        return self
+
+    def record(self, stage, start):
+        """record the latency from `start` (a now() stamp) to now under `stage`."""
+        elapsed = time.perf_counter() - start
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LatencyHistogram()
+        histogram.record(elapsed)
+
+    def gauge(self, name, read):
+        """register a callable returning a current depth, sampled by sample_gauges()."""
+        self.gauges[name] = read
+        self.gauge_max.setdefault(name, 0)
+
+    def sample_gauges(self):
+        values = {}
+        for name, read in self.gauges.items():
+            values[name] = read()
+            self.gauge_max[name] = max(self.gauge_max[name], values[name])
+        return values
+
+    def report(self):
+        return {
+            "time": time.time(),
+            "role": self.role,
+            "pid": os.getpid(),
+            "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+            "gauges": {name: {"depth": depth, "max": self.gauge_max[name]}
+                       for name, depth in self.sample_gauges().items()},
+        }
+
+    def dump(self, file_path):
+        """append the current report to a json-lines file."""
+        with open(file_path, "a") as file:
+            file.write(json.dumps(self.report()) + "\n")
+
+    def reset(self):
+        self.histograms = {}
+        self.gauge_max = {name: 0 for name in self.gauges}
+
+
+# the process-wide tracer used by the pipeline stages
+TRACER = Tracer()
+
+
+async def trace_reporter(shutdown_event, config, tracer=TRACER):
+    """sample gauges every second and dump the report every trace_interval seconds and at shutdown."""
+    if not tracer.enabled:
+        return
+    trace_file = config.get("trace_file", "trace.jsonl")
+    interval = config.get("trace_interval", 60)
+    loop = asyncio.get_running_loop()
+    last_dump = loop.time()
+    try:
+        while not shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+            tracer.sample_gauges()
+            if loop.time() - last_dump >= interval:
+                await loop.run_in_executor(None, tracer.dump, trace_file)
+                last_dump = loop.time()
+    finally:
+        tracer.dump(trace_file)
+        print(f"[INFO] Latency trace written to {trace_file}")
@@ -5,10 +5,20 @@
 # from terminal_display import plot_data
 # from game_logic import generate_gate_sequence
 
+import argparse
 import asyncio, yaml
+import multiprocessing
 from bluetooth_handler import connect_to_sensor, print_queue_updates
-from metrics_calculator import calculate_metrics
+from metrics_calculator import calculate_metrics, MetricsEngine
 from terminal_display import terminal_display
+from data_logger import logger, generate_log_file_name, LOG_EXTENSIONS
+from metrics_bus import MetricsBus, LATEST, LOSSLESS, DROP_OLDEST
+from game_logic import game
+from instrumentation import TRACER, trace_reporter
+from broadcast_server import broadcast
+from shared_ring import SharedRingWriter, reader_process
+from checkpoint import checkpointer, load_checkpoint, remove_checkpoint, resume_session
+from score_store import startup_summary
 
 # Load configuration
 def load_config(config_file="config.yaml"):
@@ -39,33 +49,137 @@ async def display_metrics(metrics_queue, shutdown_event):
 
 
 
-async def main():
+def start_session(config, state, resume=False):
+    """a fresh MetricsEngine, or one restored from the last checkpoint when resuming.
+
+    Also fixes the workout log path up front, so checkpoints can record it.
+    """
+    engine = None
+    if resume:
+        checkpoint = load_checkpoint(config.get("checkpoint_file", "session.ckpt"))
+        if checkpoint:
+            engine = resume_session(checkpoint, state, config)
+            print(f"[INFO] Resumed session: {engine.state['total_distance']:.2f} km, "
+                  f"logging to {config['log_file']}")
+        else:
+            print("[INFO] No checkpoint to resume. Starting a new session.")
+    if not config.get("log_file"):
+        config["log_file"] = generate_log_file_name(LOG_EXTENSIONS.get(config.get("log_format", "csv"), ".csv"))
+    return engine or MetricsEngine(config)
+
+
+async def isolated_main(config, resume=False):
+    """Run the sensor and metrics core in this process, display and logging in reader processes.
+
+    The core writes every metrics update into a shared memory ring and never
+    waits for the readers, so terminal or disk stalls can't delay packet
+    handling. On shutdown the ring is closed and the readers drain it and exit.
+    The game and broadcast have no reader process yet and are not run.
+    """
+    ignored = [option for option in ("game_enabled", "broadcast_enabled") if config.get(option)]
+    if ignored:
+        print(f"[ERROR] {', '.join(ignored)} not supported with process_isolation yet; "
+              "the game and broadcast will not run.")
+    bluetooth_queue = asyncio.Queue()
+    ring = SharedRingWriter(config.get("shared_ring_slots", 4096))
+    shutdown_event = asyncio.Event()
+    state = {}
+    engine = start_session(config, state, resume)
+    context = multiprocessing.get_context("spawn")
+    readers = [
+        context.Process(target=reader_process, args=(role, ring.name, ring.capacity, config), name=f"rollerbird-{role}")
+        for role in ("display", "logger")
+    ]
+    for reader in readers:
+        reader.start()
+
+    TRACER.configure(config, "core")  # the readers report as "display" and "logger"
+    TRACER.gauge("bluetooth_queue", bluetooth_queue.qsize)
+    tasks = [
+        asyncio.create_task(connect_to_sensor(bluetooth_queue, shutdown_event, state, config)),
+        asyncio.create_task(calculate_metrics(bluetooth_queue, ring, shutdown_event, config, engine)),
+        asyncio.create_task(trace_reporter(shutdown_event, config)),
+        asyncio.create_task(checkpointer(engine, state, shutdown_event, config)),
+    ]
+    crashed = False
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        crashed = True  # keep the checkpoint for --resume
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not crashed:
+            remove_checkpoint(config.get("checkpoint_file", "session.ckpt"))
+        ring.close()
+        for reader in readers:
+            reader.join(timeout=10)
+            if reader.is_alive():
+                print(f"[ERROR] {reader.name} did not exit; terminating it.")
+                reader.terminate()
+        ring.unlink()
+
+
+async def main(resume=False):
     config = load_config()
+    startup_summary(config)  # lifetime totals and bests from the session index
+    if config.get("process_isolation"):
+        return await isolated_main(config, resume)
     bluetooth_queue = asyncio.Queue()
-    metrics_queue = asyncio.Queue()
+    metrics_bus = MetricsBus()
+    display_queue = metrics_bus.subscribe("display", policy=LATEST)
+    logger_queue = metrics_bus.subscribe("logger", policy=LOSSLESS, maxsize=config.get("logger_buffer", 1000),
+                                         rate=config.get("log_rate"))
+    game_queue = metrics_bus.subscribe("game", policy=DROP_OLDEST) if config.get("game_enabled") else None
+    broadcast_queue = metrics_bus.subscribe("broadcast", policy=LATEST) if config.get("broadcast_enabled") else None
     shutdown_event = asyncio.Event()
     state = {}
+    engine = start_session(config, state, resume)
+
+    # Optional latency tracing: per-stage histograms plus queue-depth gauges
+    TRACER.configure(config)
+    TRACER.gauge("bluetooth_queue", bluetooth_queue.qsize)
+    for name, subscription in metrics_bus.subscribers.items():
+        TRACER.gauge(name, subscription.qsize)
 
     # Start the sensor connection and data printer
     sensor_task = asyncio.create_task(connect_to_sensor(bluetooth_queue, shutdown_event, state, config))
-    metrics_task = asyncio.create_task(calculate_metrics(bluetooth_queue, metrics_queue, shutdown_event, config))
-    display_task = asyncio.create_task(terminal_display(metrics_queue, config, shutdown_event))
-    logging_task = asyncio.create_task(logger(metrics_queue, shutdown_event))
+    metrics_task = asyncio.create_task(calculate_metrics(bluetooth_queue, metrics_bus, shutdown_event, config, engine))
+    display_task = asyncio.create_task(terminal_display(display_queue, config, shutdown_event))
+    logging_task = asyncio.create_task(logger(logger_queue, shutdown_event, config))
+    tasks = [sensor_task, metrics_task, display_task, logging_task]
+    tasks.append(asyncio.create_task(trace_reporter(shutdown_event, config)))
+    tasks.append(asyncio.create_task(checkpointer(engine, state, shutdown_event, config)))
+    if game_queue:
+        tasks.append(asyncio.create_task(game(game_queue, shutdown_event, config)))
+    if broadcast_queue:
+        tasks.append(asyncio.create_task(broadcast(broadcast_queue, shutdown_event, config)))
     # display_task = asyncio.create_task(display_metrics(metrics_queue, shutdown_event))
     # printer_task = asyncio.create_task(print_queue_updates(bluetooth_queue))
 
+    crashed = False
     try:
-        await asyncio.gather(sensor_task, metrics_task, display_task)
+        await asyncio.gather(*tasks)
     except KeyboardInterrupt:
         print("[INFO] Shutting down...")
         shutdown_event.set()
+    except Exception:
+        crashed = True  # keep the checkpoint for --resume
+        raise
     finally:
-        sensor_task.cancel()
-        metrics_task.cancel()
-        display_task.cancel()
-        logging_task.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if not crashed:
+            remove_checkpoint(config.get("checkpoint_file", "session.ckpt"))
         # printer_task.cancel()
+        for name, stats in metrics_bus.stats()["subscribers"].items():
+            print(f"[INFO] Metrics bus {name}: {stats['dropped']} dropped, peak depth {stats['max_depth']}")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Rollerbird: live cycling metrics from a BLE cadence sensor.")
+    parser.add_argument("--resume", action="store_true", help="continue the session saved in the last checkpoint")
+    asyncio.run(main(parser.parse_args().resume))
 
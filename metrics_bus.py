@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+
+# subscriber buffer policies
+LATEST = "latest"            # keep only the newest update (display)
+LOSSLESS = "lossless"        # never drop, publisher waits when the buffer is full (logger)
+DROP_OLDEST = "drop_oldest"  # keep the newest `maxsize` updates (best-effort consumers)
+
+POLICIES = (LATEST, LOSSLESS, DROP_OLDEST)
+
+
+class RateGate:
+    """lets scheduled updates (ones with "tick_time") through at most `rate` times per second."""
+
+    def __init__(self, rate=None):
+        self.interval = 1 / rate if rate else None
+        self.next_due = 0
+
+    def due(self, metrics):
+        tick_time = metrics.get("tick_time")
+        if self.interval is None or tick_time is None:
+            return True
+        if tick_time + 1e-9 < self.next_due:  # tolerance for ticks scheduled at inexact float multiples
+            return False
+        self.next_due = tick_time + self.interval
+        return True
+
+
+class Subscription:
+    """one subscriber's bounded buffer on a MetricsBus.
+
+    Exposes the same `get()` coroutine as asyncio.Queue so existing consumers
+    (terminal_display, logger) can take a subscription in place of a queue.
+    """
+
+    def __init__(self, name, policy=DROP_OLDEST, maxsize=100, rate=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown subscription policy: {policy}")
+        self.name = name
+        self.policy = policy
+        self.maxsize = 1 if policy == LATEST else maxsize
+        self.gate = RateGate(rate)
+        self._buffer = deque()
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def qsize(self):
+        return len(self._buffer)
+
+    def due(self, metrics):
+        """whether a scheduled update (one with "tick_time") is due under this subscriber's rate."""
+        return self.gate.due(metrics)
+
+    def empty(self):
+        return not self._buffer
+
+    async def put(self, item):
+        """add an update, waiting for space only under the lossless policy."""
+        while self.policy == LOSSLESS and len(self._buffer) >= self.maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.put_nowait(item)
+
+    def put_nowait(self, item):
+        if len(self._buffer) >= self.maxsize:
+            if self.policy == LOSSLESS:
+                raise asyncio.QueueFull
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(item)
+        self.received += 1
+        self.max_depth = max(self.max_depth, len(self._buffer))
+        self._not_empty.set()
+
+    def get_nowait(self):
+        if not self._buffer:
+            raise asyncio.QueueEmpty
+        item = self._buffer.popleft()
+        if not self._buffer:
+            self._not_empty.clear()
+        self._not_full.set()
+        return item
+
+    async def get(self):
+        """wait for and return the next buffered update."""
+        while not self._buffer:
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def stats(self):
+        return {
+            "policy": self.policy,
+            "received": self.received,
+            "dropped": self.dropped,
+            "depth": len(self._buffer),
+            "max_depth": self.max_depth,
+        }
+
+
+class MetricsBus:
+    """publish/subscribe fan-out for metrics updates: every subscriber sees every update."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.published = 0
+
+    def subscribe(self, name, policy=DROP_OLDEST, maxsize=100, rate=None):
+        """register a subscriber and return its Subscription.
+
+        `rate` caps a subscriber at that many scheduled updates per second,
+        taking every n-th tick from a fixed-rate calculate_metrics.
+        """
+        if name in self.subscribers:
+            raise ValueError(f"Subscriber already registered: {name}")
+        subscription = Subscription(name, policy, maxsize, rate)
+        self.subscribers[name] = subscription
+        return subscription
+
+    def unsubscribe(self, name):
+        self.subscribers.pop(name, None)
+
+    async def publish(self, metrics):
+        """deliver an update to every subscriber according to its policy."""
+        self.published += 1
+        for subscription in list(self.subscribers.values()):
+            if not subscription.due(metrics):
+                continue
+            if subscription.policy == LOSSLESS:
+                await subscription.put(metrics)
+            else:
+                subscription.put_nowait(metrics)
+
+    # calculate_metrics publishes with `await metrics_queue.put(...)`
+    put = publish
+
+    def stats(self):
+        """published count plus per-subscriber drop and depth counters."""
+        return {
+            "published": self.published,
+            "subscribers": {name: sub.stats() for name, sub in self.subscribers.items()},
+        }
@@ -1,99 +1,188 @@
 import asyncio
 import time
-from collections import deque
 import yaml
-
-async def calculate_metrics(cadence_queue, metrics_queue, shutdown_event, config):
-    """Calculate speed, distance, and averages."""
-    # Config values
-    WHEEL_CIRCUMFERENCE = config["wheel_circumference"]  # in meters
-    GEAR_RATIO = config["chainring"] / config["cog"]  # adjust based on your gear setup
-
-    # Metrics state
-    state = {
-        "live_speed": 0,
-        "live_RPM": 0,
-        "total_distance": 0,
-        "average_speed": 0,
-        # "last_speeds": deque(maxlen=30),  # Store the last 30 seconds of speeds
-        "live_speeds": deque(maxlen=config["terminal_width"]),
-        "last_revolutions" : None,
-        "last_time": None,
-        "active_time": 0,
-        "intervals": deque(maxlen=config["terminal_width"])
-    }
-
-    interval_start_time = None
-    interval_distance = 0
-
+from bluetooth_handler import CADENCE_TIMEOUT
+from instrumentation import TRACER
+from history_pyramid import HistoryPyramid
+from ring_buffer import RingBuffer
+from rollup import RollupEngine
+
+
+class MetricsEngine:
+    """Speed, distance and averages, split into packet ingestion and metrics output.
+
+    `ingest()` takes every crank update as it arrives and only accumulates
+    distance and the latest cadence. `tick()` advances the clock and builds
+    one metrics update, so the output rate is set by whoever calls tick().
+    Between packets the last cadence is held; once no packet has arrived
+    for `idle_timeout` seconds the rider counts as stopped and cadence and
+    speed drop to zero.
+    """
+
+    def __init__(self, config):
+        # Config values
+        self.wheel_circumference = config["wheel_circumference"]  # in meters
+        self.gear_ratio = config["chainring"] / config["cog"]  # adjust based on your gear setup
+        self.idle_timeout = config.get("idle_timeout", CADENCE_TIMEOUT)
+        history_size = config.get("history_size", config["terminal_width"])  # samples kept for the plot
+
+        # rolling and tumbling averages at every configured resolution
+        self.rollups = RollupEngine.from_config(config, history_size)
+        self.interval_speed_window = config.get("interval_speed_window", "30s")
+        self.lap_distance = config.get("lap_distance")  # km per automatic lap, closing the open-ended windows
+
+        # Metrics state
+        self.state = {
+            "live_speed": 0,
+            "live_RPM": 0,
+            "total_distance": 0,
+            "average_speed": 0,
+            "live_speeds": RingBuffer(history_size),
+            "speed_pyramid": HistoryPyramid(config.get("plot_pyramid_factor", 2)),  # the whole ride, for the plot
+            "last_revolutions": None,
+            "last_packet_time": None,
+            "last_time": None,
+            "tick_distance": 0,  # km ingested since the last tick
+            "lap_start_distance": 0,  # total_distance where the current lap began
+            "active_time": 0,
+            "intervals": self.rollups[config.get("interval_window", "interval")].history,
+            "t_rx": None,
+        }
+
+    def checkpoint(self):
+        """the state worth keeping across a crash: totals, histories and rollup windows.
+
+        The whole-ride pyramid grows with the ride, so it is left out; only its
+        length is kept, and its samples are saved separately as they arrive.
+        """
+        pyramid = self.state["speed_pyramid"]
+        state = {key: value for key, value in self.state.items() if key != "speed_pyramid"}
+        return {"state": state, "rollups": self.rollups, "history_length": len(pyramid)}
+
+    def restore(self, saved, current_time, history=()):
+        """continue from a checkpoint() taken earlier; the time in between does not count as riding.
+
+        `history` holds the pyramid samples saved alongside it, from which the
+        whole-ride plot is rebuilt.
+        """
+        pyramid = HistoryPyramid(self.state["speed_pyramid"].factor)
+        for value in history:
+            pyramid.append(value)
+        self.state = {**saved["state"], "speed_pyramid": pyramid}
+        self.rollups = saved["rollups"]
+        self.state.update(live_RPM=0, live_speed=0, last_time=current_time, last_packet_time=current_time,
+                          tick_distance=0, t_rx=None)
+
+    def ingest(self, data, current_time):
+        """fold one crank update into the state; returns False for the first update, which only sets the baseline."""
+        state = self.state
+        revolutions = data["revolutions"]
+        state["live_RPM"] = data["cadence"]
+        state["last_packet_time"] = current_time
+        if TRACER.enabled and "t_rx" in data and state["t_rx"] is None:
+            state["t_rx"] = data["t_rx"]  # the oldest packet not yet reported
+        if state["last_revolutions"] is None:
+            state["last_revolutions"] = revolutions
+            state["last_time"] = current_time
+            return False
+        distance_increment = (revolutions - state["last_revolutions"]) * self.gear_ratio * self.wheel_circumference / 1000  # km
+        state["total_distance"] += distance_increment
+        state["tick_distance"] += distance_increment
+        state["last_revolutions"] = revolutions
+        return True
+
+    def tick(self, current_time):
+        """advance to `current_time` and return a metrics update, or None before the first packet."""
+        state = self.state
+        if state["last_time"] is None:
+            return None
+        time_diff = max(0, current_time - state["last_time"])
+        state["last_time"] = current_time
+
+        if current_time - state["last_packet_time"] > self.idle_timeout:
+            state["live_RPM"] = 0  # no packets: the rider has stopped (or the sensor is gone)
+        cadence = state["live_RPM"]
+        state["live_speed"] = (cadence / 60) * self.gear_ratio * self.wheel_circumference * 3.6  # km/h
+
+        if cadence > 0:
+            state["active_time"] += time_diff
+
+        state["live_speeds"].append(state["live_speed"] if cadence > 0 else 0)
+        state["speed_pyramid"].append(state["live_speed"] if cadence > 0 else 0)
+
+        state["average_speed"] = state["total_distance"] / (state["active_time"] / 3600) if state["active_time"] > 0 else 0
+
+        self.rollups.update(current_time, time_diff, state["tick_distance"], cadence)
+        state["tick_distance"] = 0
+        if self.lap_distance and state["total_distance"] - state["lap_start_distance"] >= self.lap_distance:
+            self.rollups.lap()
+            state["lap_start_distance"] += self.lap_distance
+        averages = self.rollups.snapshot()
+
+        metrics = {
+            "live_RPM": cadence,
+            "live_speed": state["live_speed"],
+            "interval_speed": averages[self.interval_speed_window]["avg_speed"],
+            "average_speed": state["average_speed"],
+            "total_distance": state["total_distance"],
+            # O(1) read-only views; consumers slice or check .version
+            "intervals": state["intervals"].view(),
+            "live_speeds": state["live_speeds"].view(),
+            "speed_history": state["speed_pyramid"].view(),
+            "active_time": state["active_time"],
+            "rollups": averages,
+        }
+        if state["t_rx"] is not None:
+            metrics["t_rx"] = state["t_rx"]
+            TRACER.record("metrics", state["t_rx"])
+            state["t_rx"] = None
+        return metrics
+
+
+async def calculate_metrics(cadence_queue, metrics_queue, shutdown_event, config, engine=None):
+    """Calculate speed, distance, and averages.
+
+    With metrics_rate set, packets are ingested as they arrive but metrics
+    are published on a fixed clock of metrics_rate updates per second:
+    bursts are coalesced into one update and idle periods still produce
+    updates. Each update carries "tick_time", its scheduled time in seconds
+    since the first tick. Without metrics_rate, every packet is published.
+    Pass `engine` to continue a restored session.
+    """
+    engine = engine or MetricsEngine(config)
+    rate = config.get("metrics_rate")
+    if not rate:
+        while not shutdown_event.is_set():
+            try:
+                data = await asyncio.wait_for(cadence_queue.get(), timeout=1)
+                current_time = time.time()
+                if engine.ingest(data, current_time):
+                    # push metrics to the metrics_queue
+                    await metrics_queue.put(engine.tick(current_time))
+            except asyncio.TimeoutError:
+                # no cadence data received in the last second
+                pass
+        return
+
+    period = 1 / rate
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    tick = 0
     while not shutdown_event.is_set():
-        try:
-            data = await asyncio.wait_for(cadence_queue.get(), timeout=1)
-            cadence = data["cadence"]
-            revolutions = data["revolutions"]
-            current_time = time.time()
-
-            if state["last_time"] is None:
-                state["last_time"] = current_time
-                interval_start_time = current_time
-                state["last_revolutions"] = revolutions
+        timeout = start + tick * period - loop.time()
+        if timeout > 0:
+            try:
+                data = await asyncio.wait_for(cadence_queue.get(), timeout=timeout)
+                engine.ingest(data, time.time())
                 continue
-
-            time_diff = current_time - state["last_time"]
-            revolutions_diff = revolutions - state["last_revolutions"]
-            distance_increment = revolutions_diff * GEAR_RATIO * WHEEL_CIRCUMFERENCE / 1000  # km
-            state["total_distance"] += distance_increment
-            interval_distance += distance_increment
-
-            state["live_speed"] = (cadence / 60) * GEAR_RATIO * WHEEL_CIRCUMFERENCE * 3.6  # km/h
-
-            if cadence > 0:
-                state["active_time"] += time_diff
-
-            state["live_speeds"].append(state["live_speed"] if cadence > 0 else 0)
-
-
-            state["average_speed"] = state["total_distance"] / (state["active_time"] / 3600) if state["active_time"] > 0 else 0
-
-            # interval_speed = (
-            #     sum(list(state["live_speeds"])[-30:]) / min(30, len(state["live_speeds"]))
-            # ) if state["live_speeds"] else 0
-            # 
-            interval_speed = 0
-
-            interval_time = current_time - interval_start_time
-            if interval_time >= 30:  # every 30 seconds
-                interval_speed = (interval_distance / (interval_time / 3600)) if interval_time > 0 else 0
-                state["intervals"].append({
-                    "avg_speed": interval_speed,
-                    "distance": interval_distance,
-                })
-                interval_start_time = current_time
-                interval_distance = 0
-
-            if current_time - interval_start_time >= 30:  # every 30 seconds
-                state["intervals"].append({
-                    "avg_speed": interval_speed,
-                    "distance": interval_distance
-                })
-                interval_start_time = current_time
-                interval_distance = 0
-
-            state["last_time"] = current_time
-            state["last_revolutions"] = revolutions
-
-            # push metrics to the metrics_queue
-            await metrics_queue.put({
-                "live_RPM": cadence,
-                "live_speed": state["live_speed"],
-                "interval_speed": interval_speed,
-                "average_speed": state["average_speed"],
-                "total_distance": state["total_distance"],
-                "intervals": list(state["intervals"]),
-                "live_speeds": list(state["live_speeds"]),
-                "active_time": state["active_time"]
-            })
-
-        except asyncio.TimeoutError:
-            # no cadence data received in the last second
-            pass
+            except asyncio.TimeoutError:
+                pass
+        while not cadence_queue.empty():  # a burst that arrived with the tick
+            engine.ingest(cadence_queue.get_nowait(), time.time())
+
+        metrics = engine.tick(time.time())
+        if metrics is not None:
+            metrics["tick_time"] = tick * period
+            await metrics_queue.put(metrics)
+        # after a stall, skip the missed ticks rather than publishing them back to back
+        tick = max(tick + 1, int((loop.time() - start) / period))
@@ -0,0 +1,115 @@
+import asyncio
+import csv
+import time
+
+from bluetooth_handler import handle_packet
+
+# CSC measurement flags: bit 1 = crank revolution data present
+CRANK_DATA_PRESENT = 0x02
+
+PROFILES = ("steady", "sprints", "coasting", "rollover")
+
+
+def build_crank_packet(revolutions, event_time):
+    """build a CSC measurement packet carrying crank data only."""
+    return bytes([CRANK_DATA_PRESENT]) + (revolutions & 0xFFFF).to_bytes(2, "little") + \
+        (event_time & 0xFFFF).to_bytes(2, "little")
+
+
+def _profile_cadence(profile, t):
+    """target cadence (RPM) of a synthetic profile at t seconds into the ride."""
+    if profile == "steady" or profile == "rollover":
+        return 90
+    if profile == "sprints":
+        return 130 if t % 60 < 15 else 70  # 15 s sprint every minute
+    if profile == "coasting":
+        return 85 if t % 40 < 25 else 0  # pedal 25 s, coast 15 s
+    raise ValueError(f"Unknown cadence profile: {profile}")
+
+
+def synthetic_packets(profile="steady", duration=60, interval=1.0):
+    """generate (time_offset, packet) pairs for a synthetic cadence profile.
+
+    Packets are emitted every `interval` seconds like a real sensor, with the
+    crank event time in 1/1024 s units. The "rollover" profile starts the
+    revolution counter and event time just below 65536 so both wrap early on.
+    """
+    if profile == "rollover":
+        revolutions, event_ticks = 65530, 65536 - 3 * 1024
+    else:
+        revolutions, event_ticks = 0, 0
+
+    packets = []
+    t = 0.0
+    last_event = 0.0  # time of the last crank event
+    event_ticks_now = event_ticks
+    coasting = False
+    while t <= duration:
+        cadence = _profile_cadence(profile, t)
+        if cadence > 0:
+            if coasting:
+                last_event, coasting = t, False  # first revolution after coasting starts now
+            period = 60 / cadence
+            # every whole crank revolution completed since the last event
+            while last_event + period <= t:
+                last_event += period
+                revolutions += 1
+                event_ticks_now = event_ticks + int(last_event * 1024)
+        else:
+            coasting = True  # counters and event time freeze, as on a real sensor
+        packets.append((round(t, 6), build_crank_packet(revolutions, event_ticks_now)))
+        t += interval
+    return packets
+
+
+def load_capture(file_path):
+    """load (time_offset, packet) pairs from a capture csv with time,data columns."""
+    packets = []
+    with open(file_path, newline="") as csvfile:
+        for row in csv.DictReader(csvfile):
+            packets.append((float(row["time"]), bytes.fromhex(row["data"])))
+    return packets
+
+
+def save_capture(file_path, packets):
+    """write (time_offset, packet) pairs to a capture csv."""
+    with open(file_path, mode="w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["time", "data"])
+        for offset, packet in packets:
+            writer.writerow([f"{offset:.6f}", packet.hex()])
+
+
+def load_packets(source, duration=60):
+    """resolve a profile name or capture file path into (time_offset, packet) pairs."""
+    if source in PROFILES:
+        return synthetic_packets(source, duration=duration)
+    return load_capture(source)
+
+
+async def replay_sensor(queue, shutdown_event, state, config, source="steady", speed=1.0, duration=60):
+    """Drop-in replacement for connect_to_sensor that replays recorded or synthetic packets.
+
+    `speed` scales playback (2.0 = twice real time); 0 replays as fast as the
+    pipeline accepts packets.
+    """
+    packets = load_packets(source, duration)
+    print(f"[INFO] Replaying {len(packets)} packets from {source} at {speed or 'max'}x speed...")
+
+    start_time = time.monotonic()
+    try:
+        for offset, packet in packets:
+            if shutdown_event.is_set():
+                break
+            if speed > 0:
+                delay = offset / speed - (time.monotonic() - start_time)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)  # let downstream stages run between packets
+            handle_packet(packet, queue, state)
+    except asyncio.CancelledError:
+        print("[INFO] Replay task canceled.")
+        return
+
+    print("[INFO] Replay finished.")
@@ -0,0 +1,163 @@
+from array import array
+
+
+class RingBuffer:
+    """fixed-capacity history of numbers kept in a preallocated array.
+
+    `version` counts every append since creation, so consumers can tell
+    whether anything changed (and what was appended) without copying.
+    """
+
+    def __init__(self, capacity, typecode="d"):
+        if capacity <= 0:
+            raise ValueError("RingBuffer capacity must be positive")
+        self.capacity = capacity
+        self._data = array(typecode, [0]) * capacity
+        self.version = 0
+
+    def __len__(self):
+        return min(self.version, self.capacity)
+
+    def append(self, value):
+        self._data[self.version % self.capacity] = value
+        self.version += 1
+
+    def clear(self):
+        self.version = 0
+
+    def view(self):
+        """read-only snapshot of the current contents, created in O(1)."""
+        return RingView(self, self.version)
+
+    def _read(self, first, stop):
+        """values at absolute positions first..stop-1, as a list."""
+        capacity = self.capacity
+        if stop - first <= 0:
+            return []
+        start, end = first % capacity, stop % capacity or capacity
+        if start < end:
+            return self._data[start:end].tolist()
+        return self._data[start:].tolist() + self._data[:end].tolist()
+
+
+class RingView:
+    """read-only window onto a RingBuffer as it was at `version`.
+
+    The view does not copy: it stays valid until the buffer has overwritten
+    its oldest item, after which reads raise ValueError.
+    """
+
+    __slots__ = ("buffer", "version", "_first")
+
+    def __init__(self, buffer, version):
+        self.buffer = buffer
+        self.version = version
+        self._first = version - min(version, buffer.capacity)
+
+    def __len__(self):
+        return self.version - self._first
+
+    @property
+    def stale(self):
+        return self._first < self.buffer.version - self.buffer.capacity
+
+    def refresh(self):
+        """a view of the buffer as it is now, for a reader whose view went stale."""
+        return self.buffer.view()
+
+    def _check(self):
+        if self.stale:
+            raise ValueError("RingView was overwritten; take a new view")
+
+    def __getitem__(self, index):
+        length = len(self)
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            self._check()
+            if step == 1:
+                return self.buffer._read(self._first + start, self._first + max(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("RingView index out of range")
+        self._check()
+        return self.buffer._data[(self._first + index) % self.buffer.capacity]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def since(self, version):
+        """values appended after `version`, or None if they were already overwritten."""
+        if version < self._first or self.stale:
+            return None
+        return self.buffer._read(version, self.version)
+
+    def tolist(self):
+        return self[:]
+
+
+class RecordRing:
+    """parallel RingBuffers holding one record (e.g. an interval) per position."""
+
+    def __init__(self, capacity, fields, typecode="d"):
+        self.fields = tuple(fields)
+        self.columns = {field: RingBuffer(capacity, typecode) for field in self.fields}
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.columns[self.fields[0]])
+
+    @property
+    def version(self):
+        return self.columns[self.fields[0]].version
+
+    def append(self, record):
+        for field in self.fields:
+            self.columns[field].append(record[field])
+
+    def view(self):
+        return RecordView({field: column.view() for field, column in self.columns.items()})
+
+
+class RecordView:
+    """read-only snapshot of a RecordRing; rows read back as dicts, columns as RingViews."""
+
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns):
+        self._columns = columns
+
+    def column(self, field):
+        return self._columns[field]
+
+    @property
+    def version(self):
+        return next(iter(self._columns.values())).version
+
+    def __len__(self):
+        return len(next(iter(self._columns.values())))
+
+    @property
+    def stale(self):
+        return any(view.stale for view in self._columns.values())
+
+    def refresh(self):
+        """a view of the record ring as it is now, for a reader whose view went stale."""
+        return RecordView({field: view.refresh() for field, view in self._columns.items()})
+
+    def since(self, version):
+        """records appended after `version` as dicts, or None if they were already overwritten."""
+        columns = {field: view.since(version) for field, view in self._columns.items()}
+        if any(values is None for values in columns.values()):
+            return None
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            columns = {field: view[index] for field, view in self._columns.items()}
+            return [dict(zip(columns, values)) for values in zip(*columns.values())]
+        return {field: view[index] for field, view in self._columns.items()}
+
+    def __iter__(self):
+        return iter(self[:])
@@ -0,0 +1,150 @@
+# incremental multi-resolution averages (rolling and tumbling windows) over the metrics stream
+from array import array
+
+from ring_buffer import RecordRing
+
+# per-window averages: speed in km/h, cadence in RPM, distance in km
+ROLLUP_FIELDS = ("avg_speed", "avg_cadence", "distance", "duration")
+
+DEFAULT_ROLLUP_WINDOWS = {
+    "1s": {"seconds": 1},
+    "10s": {"seconds": 10},
+    "30s": {"seconds": 30},
+    "5min": {"seconds": 300},
+    "interval": {"seconds": 30, "tumbling": True},
+    "lap": {"tumbling": True},  # closed by RollupEngine.lap(), every lap_distance km in MetricsEngine
+}
+MAX_SAMPLE_RATE = 20  # samples per second a rolling window is sized for
+
+
+def averages(duration, distance, cadence_time):
+    """time-weighted averages from a window's running sums."""
+    if duration <= 0:
+        return {"avg_speed": 0.0, "avg_cadence": 0.0, "distance": distance, "duration": 0.0}
+    return {
+        "avg_speed": distance / (duration / 3600),
+        "avg_cadence": cadence_time / duration,
+        "distance": distance,
+        "duration": duration,
+    }
+
+
+class RollingWindow:
+    """Averages over the last `seconds` of samples, in O(1) amortized per sample.
+
+    Each sample (its duration, distance and cadence x duration) goes into
+    preallocated ring arrays and is added to running sums; samples older
+    than the window are subtracted back out as they expire. If samples
+    arrive faster than `max_rate` per second the oldest are evicted early,
+    so the window then covers slightly less than `seconds`.
+    """
+
+    def __init__(self, name, seconds, max_rate=MAX_SAMPLE_RATE):
+        self.name = name
+        self.seconds = seconds
+        self.capacity = max(16, int(seconds * max_rate) + 1)
+        self._times = array("d", [0.0]) * self.capacity
+        self._durations = array("d", [0.0]) * self.capacity
+        self._distances = array("d", [0.0]) * self.capacity
+        self._cadence_times = array("d", [0.0]) * self.capacity
+        self._first = 0  # absolute positions of the oldest sample and one past the newest
+        self._next = 0
+        self.duration = self.distance = self.cadence_time = 0.0
+
+    def __len__(self):
+        return self._next - self._first
+
+    def _evict(self):
+        slot = self._first % self.capacity
+        self.duration -= self._durations[slot]
+        self.distance -= self._distances[slot]
+        self.cadence_time -= self._cadence_times[slot]
+        self._first += 1
+        if self._first == self._next:  # empty: drop any floating point drift
+            self.duration = self.distance = self.cadence_time = 0.0
+
+    def update(self, now, duration, distance, cadence):
+        if len(self) == self.capacity:
+            self._evict()
+        slot = self._next % self.capacity
+        self._times[slot] = now
+        self._durations[slot] = duration
+        self._distances[slot] = distance
+        self._cadence_times[slot] = cadence * duration
+        self._next += 1
+        self.duration += duration
+        self.distance += distance
+        self.cadence_time += cadence * duration
+        cutoff = now - self.seconds
+        while self._first < self._next and self._times[self._first % self.capacity] <= cutoff:
+            self._evict()
+
+    def averages(self):
+        return averages(self.duration, self.distance, self.cadence_time)
+
+
+class TumblingWindow:
+    """Averages over back-to-back bins of `seconds`, or laps closed by `close()` when seconds is None.
+
+    Completed bins are appended to `history`, a RecordRing of ROLLUP_FIELDS;
+    `averages()` reports the bin in progress.
+    """
+
+    def __init__(self, name, seconds=None, history_size=3600):
+        self.name = name
+        self.seconds = seconds
+        self.history = RecordRing(history_size, ROLLUP_FIELDS)
+        self.duration = self.distance = self.cadence_time = 0.0
+
+    def update(self, now, duration, distance, cadence):
+        self.duration += duration
+        self.distance += distance
+        self.cadence_time += cadence * duration
+        if self.seconds is not None and self.duration >= self.seconds:
+            self.close()
+
+    def close(self):
+        """end the current bin and record it; returns its averages."""
+        record = self.averages()
+        self.history.append(record)
+        self.duration = self.distance = self.cadence_time = 0.0
+        return record
+
+    def averages(self):
+        return averages(self.duration, self.distance, self.cadence_time)
+
+
+class RollupEngine:
+    """A set of named rolling and tumbling windows updated together, one sample at a time."""
+
+    def __init__(self, windows):
+        self.windows = {window.name: window for window in windows}
+
+    @classmethod
+    def from_config(cls, config, history_size=3600):
+        """build the windows in config["rollup_windows"]: name -> {seconds, tumbling}."""
+        windows = []
+        for name, spec in (config.get("rollup_windows") or DEFAULT_ROLLUP_WINDOWS).items():
+            spec = spec or {}
+            if spec.get("tumbling"):
+                windows.append(TumblingWindow(name, spec.get("seconds"), history_size))
+            else:
+                windows.append(RollingWindow(name, spec["seconds"]))
+        return cls(windows)
+
+    def __getitem__(self, name):
+        return self.windows[name]
+
+    def update(self, now, duration, distance, cadence):
+        """add one sample covering `duration` seconds up to `now`."""
+        for window in self.windows.values():
+            window.update(now, duration, distance, cadence)
+
+    def lap(self):
+        """close every open-ended (lap) window."""
+        return {name: window.close() for name, window in self.windows.items()
+                if isinstance(window, TumblingWindow) and window.seconds is None}
+
+    def snapshot(self):
+        """current averages of every window, keyed by window name."""
+        return {name: window.averages() for name, window in self.windows.items()}
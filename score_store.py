@@ -0,0 +1,350 @@
+# indexed score and session store for leaderboards (stdlib sqlite3)
+import argparse
+import csv
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    rider TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    seed INTEGER,
+    score INTEGER NOT NULL,
+    gates_hit INTEGER,
+    gates_total INTEGER,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS scores_mode_score ON scores (mode, score DESC);
+CREATE INDEX IF NOT EXISTS scores_rider_mode_score ON scores (rider, mode, score DESC);
+CREATE INDEX IF NOT EXISTS scores_date ON scores (date);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    date TEXT NOT NULL,
+    rider TEXT NOT NULL,
+    duration REAL,
+    distance REAL,
+    average_speed REAL,
+    max_speed REAL,
+    moving_time REAL,
+    average_cadence REAL,
+    best_5s REAL,
+    best_1min REAL,
+    best_5min REAL,
+    best_20min REAL,
+    mtime REAL,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS sessions_rider_date ON sessions (rider, date);
+CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date);
+"""
+
+SCORE_COLUMNS = ("date", "rider", "mode", "seed", "score", "gates_hit", "gates_total", "duration")
+SESSION_COLUMNS = (
+    "path", "date", "rider", "duration", "distance", "average_speed", "max_speed",
+    "moving_time", "average_cadence", "best_5s", "best_1min", "best_5min", "best_20min",
+    "mtime", "size",  # of the log file when it was indexed, to spot logs that changed since
+)
+# columns added to the sessions table after its first release, added in place to older databases
+SESSION_MIGRATIONS = {
+    "moving_time": "REAL", "average_cadence": "REAL",
+    "best_5s": "REAL", "best_1min": "REAL", "best_5min": "REAL", "best_20min": "REAL",
+    "mtime": "REAL", "size": "INTEGER",
+}
+BEST_EFFORT_COLUMNS = {5: "best_5s", 60: "best_1min", 300: "best_5min", 1200: "best_20min"}  # seconds: column
+WORKOUT_EXTENSIONS = (".csv", ".rbl")
+
+
+class ScoreStore:
+    """Scores and workout sessions in a WAL-mode SQLite database.
+
+    Dates are stored as "YYYY-MM-DD HH:MM:SS" text, so date ranges compare
+    as strings and use the date indexes.
+    """
+
+    def __init__(self, db_path="scores.db"):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        existing = {row["name"] for row in self.connection.execute("PRAGMA table_info(sessions)")}
+        with self.connection:
+            for column, kind in SESSION_MIGRATIONS.items():
+                if column not in existing:
+                    self.connection.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_scores(self, rows):
+        """insert many score dicts in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO scores ({', '.join(SCORE_COLUMNS)}) VALUES ({', '.join('?' * len(SCORE_COLUMNS))})",
+                ([row.get(column) for column in SCORE_COLUMNS] for row in rows),
+            )
+
+    def add_sessions(self, rows):
+        """insert or refresh many session dicts (keyed by path) in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(SESSION_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(SESSION_COLUMNS))})",
+                ([row.get(column) for column in SESSION_COLUMNS] for row in rows),
+            )
+
+    def top_scores(self, n=10, mode="gates", start=None, end=None):
+        """the n best scores for a game mode, optionally within a date range."""
+        query = "SELECT * FROM scores WHERE mode = ?"
+        params = [mode]
+        if start:
+            query += " AND date >= ?"
+            params.append(start)
+        if end:
+            query += " AND date < ?"
+            params.append(end)
+        query += " ORDER BY score DESC LIMIT ?"
+        return [dict(row) for row in self.connection.execute(query, params + [n])]
+
+    def personal_best(self, rider, mode="gates"):
+        """a rider's best score in a game mode, or None."""
+        row = self.connection.execute(
+            "SELECT * FROM scores WHERE rider = ? AND mode = ? ORDER BY score DESC LIMIT 1", (rider, mode)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def scores_between(self, start, end, rider=None):
+        """scores with start <= date < end, oldest first."""
+        query = "SELECT * FROM scores WHERE date >= ? AND date < ?"
+        params = [start, end]
+        if rider:
+            query += " AND rider = ?"
+            params.append(rider)
+        return [dict(row) for row in self.connection.execute(query + " ORDER BY date", params)]
+
+    def sessions_between(self, start, end, rider=None):
+        """workout sessions with start <= date < end, oldest first."""
+        query = "SELECT * FROM sessions WHERE date >= ? AND date < ?"
+        params = [start, end]
+        if rider:
+            query += " AND rider = ?"
+            params.append(rider)
+        return [dict(row) for row in self.connection.execute(query + " ORDER BY date", params)]
+
+    def import_scores_csv(self, file_path="scores.csv"):
+        """one-time import of an existing scores csv; returns the number of rows imported."""
+        if not os.path.exists(file_path) or os.stat(file_path).st_size == 0:
+            return 0
+        with open(file_path, newline="") as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        self.add_scores(rows)
+        return len(rows)
+
+    def import_workouts(self, directory="workouts", rider="rider"):
+        """one-time import of workout logs as session rows; returns the number imported."""
+        from workout_analysis import find_sessions
+
+        files = find_sessions([directory]) if os.path.isdir(directory) else []
+        self.index_sessions(files, rider)
+        return len(files)
+
+    def index_sessions(self, files, rider="rider"):
+        """summarize workout logs (totals, bests, file mtime and size) into session rows."""
+        if not files:
+            return
+        from workout_analysis import SessionSet, load_session
+
+        loaded = []
+        for path in files:
+            try:
+                stat = os.stat(path)  # before loading: a log that grows meanwhile is reindexed later
+                loaded.append((path, stat, load_session(path)))
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Could not index workout {path}: {e}")
+        if not loaded:
+            return
+        paths, stats, sessions = zip(*loaded)
+        summaries = SessionSet(sessions, names=paths).summaries()
+        self.add_sessions(
+            {
+                "path": summary["session"],
+                "date": session_date(summary["session"], session),
+                "rider": rider,
+                **{column: _number(summary[column]) for column in (
+                    "duration", "distance", "average_speed", "max_speed", "moving_time", "average_cadence")},
+                **{column: _number(summary["best_efforts"][duration])
+                   for duration, column in BEST_EFFORT_COLUMNS.items()},
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+            }
+            for summary, session, stat in zip(summaries, sessions, stats)
+        )
+
+    def sync_workouts(self, directory="workouts", rider="rider"):
+        """bring the session index up to date with a workouts directory; returns (indexed, removed).
+
+        Only logs that are new or whose mtime or size changed since they were
+        indexed are loaded again, and rows of deleted logs are dropped, so an
+        unchanged directory costs one stat per file.
+        """
+        indexed = {
+            row["path"]: (row["mtime"], row["size"])
+            for row in self.connection.execute("SELECT path, mtime, size FROM sessions")
+            if os.path.dirname(row["path"]) == directory
+        }
+        on_disk = {}
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(WORKOUT_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        on_disk[entry.path] = (stat.st_mtime, stat.st_size)
+        changed = sorted(path for path, key in on_disk.items() if indexed.get(path) != key)
+        removed = [path for path in indexed if path not in on_disk]
+        self.index_sessions(changed, rider)
+        if removed:
+            with self.connection:
+                self.connection.executemany("DELETE FROM sessions WHERE path = ?", ([path] for path in removed))
+        return len(changed), len(removed)
+
+    def summary(self, rider=None, days=7, now=None):
+        """lifetime totals and bests, and the volume of the last `days` days, from the index alone."""
+        totals = (
+            "COUNT(*) AS sessions, COALESCE(SUM(distance), 0) AS distance, "
+            "COALESCE(SUM(duration), 0) AS duration, COALESCE(SUM(moving_time), 0) AS moving_time"
+        )
+        bests = ", ".join(f"MAX({column}) AS {column}" for column in ("max_speed", *BEST_EFFORT_COLUMNS.values()))
+        where, params = ("WHERE rider = ?", [rider]) if rider else ("WHERE 1", [])
+        lifetime = self.connection.execute(f"SELECT {totals}, {bests} FROM sessions {where}", params).fetchone()
+        since = datetime.fromtimestamp((now or datetime.now().timestamp()) - days * 86400)
+        recent = self.connection.execute(
+            f"SELECT {totals} FROM sessions {where} AND date >= ?", params + [since.strftime("%Y-%m-%d %H:%M:%S")]
+        ).fetchone()
+        return {"lifetime": dict(lifetime), "recent": dict(recent), "days": days}
+
+def session_date(file_path, session):
+    """session start as "YYYY-MM-DD HH:MM:SS" local time, from the first record or the file's mtime."""
+    if not len(session):
+        return datetime.fromtimestamp(os.path.getmtime(file_path)).strftime("%Y-%m-%d %H:%M:%S")
+    start = float(session["time"][0])
+    if file_path.endswith(".csv"):
+        # csv logs hold naive local times, which load_session counts as seconds from the epoch
+        return datetime.fromtimestamp(start, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.fromtimestamp(start).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _number(value):
+    """a summary float for sqlite: None instead of nan (e.g. no best effort in a short session)."""
+    return None if value != value else value
+
+
+def format_summary(summary):
+    """the startup summary screen as lines of text."""
+    lifetime, recent = summary["lifetime"], summary["recent"]
+    if not lifetime["sessions"]:
+        return ["No workouts yet."]
+    lines = [
+        f"Lifetime: {lifetime['sessions']} sessions, {lifetime['distance']:.1f} km, "
+        f"{lifetime['duration'] / 3600:.1f} h ({lifetime['moving_time'] / 3600:.1f} h moving)",
+        f"Last {summary['days']} days: {recent['sessions']} sessions, {recent['distance']:.1f} km, "
+        f"{recent['duration'] / 3600:.1f} h",
+    ]
+    bests = [
+        f"{label} {lifetime[column]:.1f}"
+        for label, column in (("max", "max_speed"), ("5 s", "best_5s"), ("1 min", "best_1min"),
+                              ("5 min", "best_5min"), ("20 min", "best_20min"))
+        if lifetime[column] is not None
+    ]
+    if bests:
+        lines.append("Bests (km/h): " + ", ".join(bests))
+    return lines
+
+
+def startup_summary(config):
+    """sync the session index with workouts/ and print lifetime and recent stats; takes milliseconds."""
+    if not config.get("score_db"):
+        return
+    rider = config.get("rider_name", "rider")
+    try:
+        with ScoreStore(config["score_db"]) as store:
+            store.sync_workouts("workouts", rider)
+            summary = store.summary(rider)
+    except sqlite3.Error as e:
+        print(f"[ERROR] Could not read workout history: {e}")
+        return
+    for line in format_summary(summary):
+        print(f"[INFO] {line}")
+
+
+def record_score(db_path, row):
+    """insert one game result; opens its own connection so it can run in an executor thread."""
+    with ScoreStore(db_path) as store:
+        store.add_scores([row])
+
+
+def index_workout(db_path, file_path, rider="rider"):
+    """index one closed workout log from its own connection, so the next startup needn't load it."""
+    with ScoreStore(db_path) as store:
+        store.index_sessions([file_path], rider)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score and session store: import and leaderboard queries.")
+    parser.add_argument("--db", default="scores.db", help="database file (default: scores.db)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    importer = subparsers.add_parser("import", help="import scores.csv and workouts/ into the database")
+    importer.add_argument("--scores", default="scores.csv")
+    importer.add_argument("--workouts", default="workouts")
+    importer.add_argument("--rider", default="rider", help="rider name for imported workouts")
+
+    top = subparsers.add_parser("top", help="leaderboard for a game mode")
+    top.add_argument("-n", type=int, default=10)
+    top.add_argument("--mode", default="gates")
+    top.add_argument("--start", help="only scores on or after this date (YYYY-MM-DD)")
+    top.add_argument("--end", help="only scores before this date (YYYY-MM-DD)")
+
+    summary = subparsers.add_parser("summary", help="update the session index from workouts/ and show totals and bests")
+    summary.add_argument("--workouts", default="workouts")
+    summary.add_argument("--rider", default="rider")
+
+    best = subparsers.add_parser("best", help="a rider's personal best")
+    best.add_argument("rider")
+    best.add_argument("--mode", default="gates")
+
+    args = parser.parse_args(argv)
+    with ScoreStore(args.db) as store:
+        if args.command == "import":
+            scores = store.import_scores_csv(args.scores)
+            sessions = store.import_workouts(args.workouts, args.rider)
+            print(f"[INFO] Imported {scores} scores and {sessions} sessions into {args.db}")
+        elif args.command == "top":
+            for rank, row in enumerate(store.top_scores(args.n, args.mode, args.start, args.end), start=1):
+                print(f"{rank:>3}. {row['rider']:<20}{row['score']:>8}  {row['date']}")
+        elif args.command == "summary":
+            indexed, removed = store.sync_workouts(args.workouts, args.rider)
+            print(f"[INFO] Indexed {indexed} changed sessions, dropped {removed} deleted ones")
+            for line in format_summary(store.summary(args.rider)):
+                print(line)
+        elif args.command == "best":
+            row = store.personal_best(args.rider, args.mode)
+            print(f"{row['rider']}: {row['score']} on {row['date']}" if row else f"No scores for {args.rider}")
+
+
+if __name__ == "__main__":
+    main()
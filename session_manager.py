@@ -0,0 +1,239 @@
+# multi-sensor, multi-rider sessions sharing one event loop
+import argparse
+import asyncio
+import time
+
+from bluetooth_handler import handle_packet
+from metrics_bus import MetricsBus
+from metrics_calculator import calculate_metrics
+
+CSC_SERVICE_UUID = "00001816-0000-1000-8000-00805f9b34fb"
+HEART_RATE_SERVICE_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+CSC_MEASUREMENT_UUID = "00002a5b-0000-1000-8000-00805f9b34fb"
+HEART_RATE_MEASUREMENT_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+
+MEASUREMENT_UUIDS = {"csc": CSC_MEASUREMENT_UUID, "heart_rate": HEART_RATE_MEASUREMENT_UUID}
+
+
+def classify_device(name, service_uuids=()):
+    """return "csc", "heart_rate" or None for an advertised device."""
+    service_uuids = {uuid.lower() for uuid in service_uuids or ()}
+    name = name or ""
+    if CSC_SERVICE_UUID in service_uuids or "CAD" in name or "SPD" in name:
+        return "csc"
+    if HEART_RATE_SERVICE_UUID in service_uuids or "HR" in name:
+        return "heart_rate"
+    return None
+
+
+def parse_heart_rate(data):
+    """parse a Heart Rate Measurement: flags bit 0 selects a uint8 or uint16 value."""
+    if data[0] & 0x01:
+        return int.from_bytes(data[1:3], byteorder="little")
+    return data[1]
+
+
+class Sensor:
+    """one BLE device and its own parser state."""
+
+    def __init__(self, address, name, kind):
+        self.address = address
+        self.name = name
+        self.kind = kind
+        self.state = {}  # handle_packet's crank state, never shared between devices
+        self.packets = 0
+        self.connected = False
+        self.reconnects = 0
+
+
+class Rider:
+    """one rider's metrics pipeline: sensor packets -> calculate_metrics -> a MetricsBus.
+
+    The rider is the metrics sink handed to calculate_metrics, so it can add
+    the latest heart rate before publishing. Only one CSC sensor feeds the
+    pipeline: counters from different sensors can't be differenced.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.sensors = []
+        self.crank_sensor = None  # the CSC sensor whose counters feed calculate_metrics
+        self.bluetooth_queue = asyncio.Queue()
+        self.bus = MetricsBus()
+        self.heart_rate = None
+        self.latest = None
+
+    def add_sensor(self, sensor):
+        """add a sensor; returns False for a second CSC sensor, which the rider can't use."""
+        if sensor.kind == "csc":
+            if self.crank_sensor is not None:
+                return False
+            self.crank_sensor = sensor
+        self.sensors.append(sensor)
+        return True
+
+    async def put(self, metrics):
+        metrics["rider"] = self.name
+        metrics["heart_rate"] = self.heart_rate
+        self.latest = metrics
+        await self.bus.publish(metrics)
+
+
+class SessionManager:
+    """Connects to many sensors at once and runs one metrics pipeline per rider.
+
+    `scanner` and `client_factory` default to bleak's and can be swapped for
+    fake_bleak's backend. `config["riders"]` maps rider names to sensor
+    addresses, the first CSC sensor listed being the one used for cadence
+    and distance; every unassigned CSC sensor becomes its own rider.
+    """
+
+    def __init__(self, config, scanner=None, client_factory=None):
+        if scanner is None:
+            from bleak import BleakScanner as scanner
+        if client_factory is None:
+            from bleak import BleakClient as client_factory
+        self.config = config
+        self.scanner = scanner
+        self.client_factory = client_factory
+        self.sensors = {}
+        self.riders = {}
+        self._connect_slots = asyncio.Semaphore(config.get("max_concurrent_connects", 5))
+
+    async def discover(self):
+        """scan once and register every CSC or heart rate sensor found."""
+        print(f"[INFO] Scanning for sensors (up to {self.config['scan_interval']} seconds)...")
+        found = await self.scanner.discover(timeout=self.config["scan_interval"], return_adv=True)
+        for address, (device, advertisement) in found.items():
+            kind = classify_device(device.name, getattr(advertisement, "service_uuids", ()))
+            if kind and address not in self.sensors:
+                self.sensors[address] = Sensor(address, device.name, kind)
+        print(f"[INFO] Found {len(self.sensors)} sensors.")
+        return list(self.sensors.values())
+
+    def assign_riders(self):
+        """group sensors into riders from config["riders"], one rider per leftover CSC sensor."""
+        assigned = set()
+        for rider_name, addresses in (self.config.get("riders") or {}).items():
+            rider = self.riders.setdefault(rider_name, Rider(rider_name))
+            for address in addresses:
+                if address in self.sensors:
+                    sensor = self.sensors[address]
+                    if not rider.add_sensor(sensor):
+                        print(f"[INFO] {rider_name} already uses {rider.crank_sensor.name} for cadence; "
+                              f"ignoring {sensor.name} ({address})")
+                    assigned.add(address)
+        for sensor in self.sensors.values():
+            if sensor.address not in assigned and sensor.kind == "csc":
+                rider = self.riders.setdefault(sensor.name or sensor.address, Rider(sensor.name or sensor.address))
+                rider.add_sensor(sensor)
+        return list(self.riders.values())
+
+    def _notification_handler(self, sensor, rider):
+        if sensor.kind == "heart_rate":
+            def on_notify(_, data):
+                sensor.packets += 1
+                rider.heart_rate = parse_heart_rate(data)
+        else:
+            def on_notify(_, data):
+                sensor.packets += 1
+                handle_packet(data, rider.bluetooth_queue, sensor.state)
+        return on_notify
+
+    async def _sensor_session(self, sensor, rider, shutdown_event):
+        """keep one sensor connected and streaming until shutdown, reconnecting when the link drops."""
+        while not shutdown_event.is_set():
+            disconnected = asyncio.Event()
+            try:
+                async with self._connect_slots:  # don't flood the adapter with connection attempts
+                    client = self.client_factory(sensor.address, disconnected_callback=lambda _: disconnected.set())
+                    await client.connect()
+                try:
+                    sensor.connected = True
+                    await client.start_notify(MEASUREMENT_UUIDS[sensor.kind], self._notification_handler(sensor, rider))
+                    # Wait for shutdown signal or a dropped connection
+                    shutdown_wait = asyncio.create_task(shutdown_event.wait())
+                    disconnect_wait = asyncio.create_task(disconnected.wait())
+                    try:
+                        await asyncio.wait([shutdown_wait, disconnect_wait], return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        shutdown_wait.cancel()
+                        disconnect_wait.cancel()
+                    if disconnected.is_set() and not shutdown_event.is_set():
+                        sensor.reconnects += 1
+                        print(f"[INFO] {sensor.name} ({sensor.address}) disconnected. Reconnecting...")
+                finally:
+                    sensor.connected = False
+                    if not disconnected.is_set():
+                        await client.disconnect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[ERROR] {sensor.name} ({sensor.address}): {e}. Retrying...")
+                await asyncio.sleep(1)
+
+    async def run(self, shutdown_event):
+        """discover sensors, then stream every rider's metrics until shutdown_event is set."""
+        if not self.sensors:
+            await self.discover()
+        if not self.riders:
+            self.assign_riders()
+
+        tasks = []
+        for rider in self.riders.values():
+            tasks.append(asyncio.create_task(
+                calculate_metrics(rider.bluetooth_queue, rider, shutdown_event, self.config)))
+            for sensor in rider.sensors:
+                tasks.append(asyncio.create_task(self._sensor_session(sensor, rider, shutdown_event)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def load_test(sensor_count, heart_rate_count, duration, speed, config):
+    """run the session manager against simulated sensors and report throughput."""
+    from fake_bleak import FakeBackend, make_room
+
+    backend = FakeBackend(make_room(sensor_count, heart_rate_count), speed=speed)
+    manager = SessionManager(config, scanner=backend.scanner, client_factory=backend.client)
+    subscriptions = {}
+    shutdown_event = asyncio.Event()
+
+    await manager.discover()
+    for rider in manager.assign_riders():  # a best-effort consumer per rider, as a display would be
+        subscriptions[rider.name] = rider.bus.subscribe("load_test")
+
+    start = time.perf_counter()
+    run_task = asyncio.create_task(manager.run(shutdown_event))
+    await asyncio.sleep(duration)
+    shutdown_event.set()
+    await run_task
+    elapsed = time.perf_counter() - start
+
+    packets = sum(sensor.packets for sensor in manager.sensors.values())
+    updates = sum(rider.bus.published for rider in manager.riders.values())
+    print(f"Sensors: {len(manager.sensors)}, riders: {len(manager.riders)}")
+    print(f"Packets: {packets} ({packets / elapsed:,.0f}/s), metrics updates: {updates} ({updates / elapsed:,.0f}/s)")
+    return manager
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the session manager with simulated sensors.")
+    parser.add_argument("--sensors", type=int, default=50, help="number of simulated CSC sensors")
+    parser.add_argument("--heart-rate", type=int, default=0, help="number of simulated heart rate straps")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--speed", type=float, default=10, help="notification rate multiplier (1 = one per second)")
+    args = parser.parse_args(argv)
+
+    config = {
+        "wheel_circumference": 2.1, "chainring": 50, "cog": 15,
+        "terminal_width": 90, "scan_interval": 5, "max_concurrent_connects": 5,
+    }
+    asyncio.run(load_test(args.sensors, args.heart_rate, args.duration, args.speed, config))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# metrics ring buffer in shared memory, so display and logging can run in their own processes
+import asyncio
+import math
+import signal
+import struct
+from multiprocessing import shared_memory
+
+from history_pyramid import HistoryPyramid
+from metrics_bus import RateGate
+from ring_buffer import RingBuffer, RecordRing
+
+# header: number of records written so far, then a closed flag set by the writer on shutdown
+HEADER = struct.Struct("<QQ")
+RECORD_FIELDS = (
+    "live_RPM", "live_speed", "interval_speed", "average_speed", "total_distance", "active_time",
+    "history_speed",       # the value appended to live_speeds with this update
+    "interval_avg_speed",  # the newest interval record...
+    "interval_distance",
+    "t_rx",                # perf_counter stamp (system-wide monotonic clock), 0 when not traced
+    "tick_time",           # scheduled time of a fixed-rate update, nan for per-packet updates
+)
+# record: sequence number, the fields above, the intervals version, and the sequence number again;
+# a reader only accepts a slot whose two sequence numbers match the one it expects
+RECORD = struct.Struct("<Q" + "d" * len(RECORD_FIELDS) + "QQ")
+POLL_INTERVAL = 0.01  # seconds between checks for new records when a reader is idle
+
+
+class SharedRingWriter:
+    """Single writer of metrics records into a shared memory ring of `capacity` slots.
+
+    Writing never waits for readers: a reader that falls more than
+    `capacity` records behind skips ahead and counts what it missed.
+    Doubles as the metrics sink for calculate_metrics (`await put()`).
+    """
+
+    def __init__(self, capacity=4096, name=None):
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + capacity * RECORD.size)
+        self.name = self.shm.name
+        self.written = 0
+        HEADER.pack_into(self.shm.buf, 0, 0, 0)
+
+    def publish(self, metrics):
+        history = metrics["live_speeds"]
+        intervals = metrics["intervals"]
+        if len(intervals):
+            interval = intervals[-1]
+            interval_avg_speed, interval_distance = interval["avg_speed"], interval["distance"]
+        else:
+            interval_avg_speed = interval_distance = 0.0
+        seq = self.written + 1
+        RECORD.pack_into(
+            self.shm.buf, HEADER.size + self.written % self.capacity * RECORD.size,
+            seq,
+            metrics["live_RPM"], metrics["live_speed"], metrics["interval_speed"], metrics["average_speed"],
+            metrics["total_distance"], metrics["active_time"],
+            history[-1] if len(history) else 0.0, interval_avg_speed, interval_distance,
+            metrics.get("t_rx", 0.0),
+            metrics.get("tick_time", math.nan),
+            intervals.version,
+            seq,
+        )
+        self.written = seq
+        HEADER.pack_into(self.shm.buf, 0, self.written, 0)  # publish the record only once it is complete
+
+    async def put(self, metrics):
+        self.publish(metrics)
+
+    def close(self):
+        """mark the ring closed; readers drain what is left and stop."""
+        HEADER.pack_into(self.shm.buf, 0, self.written, 1)
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SharedRingReader:
+    """Reads records from a SharedRingWriter's ring and rebuilds metrics dicts.
+
+    Behaves like a metrics bus subscription (`get`, `get_nowait`, `empty`),
+    so terminal_display and logger run unchanged in a reader process. The
+    reader keeps its own history buffers for the plot. With a `rate`, it
+    still reads every record into them but only returns the scheduled
+    updates due at that rate, as a MetricsBus subscription would.
+    """
+
+    def __init__(self, name, capacity, history_size=3600, rate=None):
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.capacity = capacity
+        self.cursor = 0  # records read (or skipped) so far
+        self.dropped = 0
+        self.live_speeds = RingBuffer(history_size)
+        self.speed_pyramid = HistoryPyramid()
+        self.intervals = RecordRing(history_size, ("avg_speed", "distance"))
+        self.intervals_version = 0
+        self.gate = RateGate(rate)
+
+    @property
+    def closed(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[1] == 1
+
+    def _written(self):
+        return HEADER.unpack_from(self.shm.buf, 0)[0]
+
+    def empty(self):
+        return self.cursor >= self._written()
+
+    def qsize(self):
+        return self._written() - self.cursor
+
+    def get_nowait(self):
+        while True:
+            written = self._written()
+            if self.cursor >= written:
+                raise asyncio.QueueEmpty
+            if written - self.cursor > self.capacity:  # lapped by the writer
+                self.dropped += written - self.capacity - self.cursor
+                self.cursor = written - self.capacity
+            values = RECORD.unpack_from(self.shm.buf, HEADER.size + self.cursor % self.capacity * RECORD.size)
+            expected = self.cursor + 1
+            if values[0] == values[-1] == expected:
+                self.cursor = expected
+                metrics = self._metrics(values)
+                if self.gate.due(metrics):
+                    return metrics
+                continue
+            # the writer overwrote the slot while it was being read: that record is lost
+            self.cursor = expected
+            self.dropped += 1
+
+    def _metrics(self, values):
+        record = dict(zip(RECORD_FIELDS, values[1:-2]))
+        intervals_version = values[-2]
+        self.live_speeds.append(record["history_speed"])
+        self.speed_pyramid.append(record["history_speed"])
+        if intervals_version != self.intervals_version:
+            self.intervals.append({"avg_speed": record["interval_avg_speed"], "distance": record["interval_distance"]})
+            self.intervals_version = intervals_version
+        metrics = {
+            "live_RPM": record["live_RPM"],
+            "live_speed": record["live_speed"],
+            "interval_speed": record["interval_speed"],
+            "average_speed": record["average_speed"],
+            "total_distance": record["total_distance"],
+            "intervals": self.intervals.view(),
+            "live_speeds": self.live_speeds.view(),
+            "speed_history": self.speed_pyramid.view(),
+            "active_time": record["active_time"],
+        }
+        if record["t_rx"]:
+            metrics["t_rx"] = record["t_rx"]
+        if not math.isnan(record["tick_time"]):
+            metrics["tick_time"] = record["tick_time"]
+        return metrics
+
+    async def get(self):
+        while True:
+            try:
+                return self.get_nowait()
+            except asyncio.QueueEmpty:
+                await asyncio.sleep(POLL_INTERVAL)
+
+    async def wait_closed(self, shutdown_event):
+        """set shutdown_event once the writer has closed the ring and every record was read."""
+        while not (self.closed and self.empty()):
+            await asyncio.sleep(POLL_INTERVAL)
+        shutdown_event.set()
+
+    def close(self):
+        self.shm.close()
+
+
+async def run_reader(role, ring_name, capacity, config):
+    """run terminal_display or logger against the shared ring until the writer closes it."""
+    from data_logger import logger
+    from instrumentation import TRACER, trace_reporter
+    from terminal_display import terminal_display
+
+    rate = config.get("log_rate") if role == "logger" else None  # as main() subscribes the logger
+    reader = SharedRingReader(ring_name, capacity, config.get("history_size", config["terminal_width"]), rate)
+    shutdown_event = asyncio.Event()
+    TRACER.configure(config, role)
+    try:
+        if role == "display":
+            consumer = terminal_display(reader, config, shutdown_event)
+        elif role == "logger":
+            consumer = logger(reader, shutdown_event, config)
+        else:
+            raise ValueError(f"Unknown reader role: {role}")
+        await asyncio.gather(consumer, reader.wait_closed(shutdown_event), trace_reporter(shutdown_event, config))
+        if reader.dropped:
+            print(f"[INFO] Shared ring {role}: {reader.dropped} records dropped")
+    finally:
+        reader.close()
+
+
+def reader_process(role, ring_name, capacity, config):
+    """process entry point for a reader; Ctrl-C is left to the core, which closes the ring."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(run_reader(role, ring_name, capacity, config))
@@ -1,23 +1,35 @@
 import asyncio
+import shutil
 import sys
 
+from instrumentation import TRACER
+
 
 # handles all terminal UI
-def draw_plot(live_speed_history, speed_history, config):
-    """draws the speed plot on the terminal."""
+def build_plot_rows(live_speed_history, speed_history, config, live_speed_lows=None,
+                    x_axis_title="Time (red: 1s, white: 30s)"):
+    """build the speed plot as rows of single-width cells (one string per column).
+
+    With `live_speed_lows`, each red column spans from its low to its
+    live_speed_history value (a downsampled column's min and max).
+    """
     terminal_width = config["terminal_width"]
     max_speed = config["max_speed"]
     y_interval = config["speed_interval"]  # each Y-axis line represents speed_interval km/h
     terminal_height = max_speed // y_interval
 
     # create a blank grid
-    grid = [[" " for _ in range(terminal_width)] for _ in range(terminal_height)]
+    grid = [[" "] * terminal_width for _ in range(terminal_height)]
 
     # plot live speed stars over the bars
     for i, speed in enumerate(live_speed_history[-terminal_width:]):  # limit to terminal width
         x = i  # x-axis index
         y = terminal_height - 1 - min(terminal_height - 1, int(speed // y_interval))
         grid[y][x] = "\033[91m*\033[0m"  # red star for live speed
+        if live_speed_lows is not None:
+            y_low = terminal_height - 1 - min(terminal_height - 1, int(live_speed_lows[i] // y_interval))
+            for y_span in range(y + 1, y_low + 1):
+                grid[y_span][x] = "\033[91m*\033[0m"
 
     # plot semi-transparent bars for average speed
     for i, avg_speed in enumerate(speed_history[-terminal_width:]):  # limit to terminal width
@@ -26,26 +38,25 @@ def draw_plot(live_speed_history, speed_history, config):
         for y in range(terminal_height - 1, bar_top - 1, -1):  # fill bar down to the x-axis
             grid[y][x] = "\033[90m█\033[0m"  # semi-transparent bar
 
-    # y-axis labels (speed)
-    y_axis_labels = [f"{y_interval * i:2.0f}" for i in range(terminal_height)]
-
-    # draw the y-axis title
+    # y-axis title, then the plot with y-axis labels
     y_axis_title = "Speed (km/h)"
-    print(f"{y_axis_title:<6}")
-
-    # draw the plot with y-axis labels
+    rows = [[f"{y_axis_title:<6}"]]
     for row in range(terminal_height):
-        speed_label = y_axis_labels[terminal_height - 1 - row]
-        print(f"{speed_label:>4} |{''.join(grid[row])}")
+        speed_label = f"{y_interval * (terminal_height - 1 - row):2.0f}"
+        rows.append(list(f"{speed_label:>4} |") + grid[row])
 
     # x-axis line and labels
-    x_axis = "     +" + "-" * (terminal_width - 5)  # x-axis line
-    print(x_axis)  # draw the x-axis line
+    rows.append(["     +" + "-" * (terminal_width - 5)])
 
     # x-axis title (time)
-    x_axis_title = "Time (red: 1s, white: 30s)"
-    centered_title = f"{x_axis_title:^{terminal_width}}"
-    print(centered_title)
+    rows.append([f"{x_axis_title:^{terminal_width}}"])
+    return rows
+
+
+def draw_plot(live_speed_history, speed_history, config, live_speed_lows=None):
+    """draws the speed plot on the terminal."""
+    for row in build_plot_rows(live_speed_history, speed_history, config, live_speed_lows):
+        print("".join(row))
 
 def format_time(seconds):
     """Format time in seconds to HH:MM:SS."""
@@ -54,8 +65,8 @@ def format_time(seconds):
     seconds = int(seconds % 60)
     return f"{hours:02}:{minutes:02}:{seconds:02}"
 
-def draw_metrics(metrics):
-    """Display live metrics above the graph."""
+def build_metrics_lines(metrics):
+    """Format the live metrics shown above the graph."""
     BRIGHT_RED = "\033[91m"
     RESET = "\033[0m"
 
@@ -66,35 +77,144 @@ def draw_metrics(metrics):
     avg_speed = metrics.get("average_speed", 0)
     distance = metrics.get("total_distance", 0)
 
-    # Clear the terminal and print the metrics
-    # sys.stdout.write("\033[H\033[J")  # Clear terminal screen
-    print(f"Active Time:          {BRIGHT_RED}{formatted_time}{RESET}")
-    print(f"Cadence:       {BRIGHT_RED}{live_cadence:6.1f} RPM{RESET}")
-    print(f"Speed:         {BRIGHT_RED}{live_speed:6.1f} km/h{RESET}")
-    print(f"30s Avg Speed: {BRIGHT_RED}{interval_speed:6.1f} km/h{RESET}")
-    print(f"Total Avg Speed:{BRIGHT_RED}{avg_speed:6.1f} km/h{RESET}")
-    print(f"Distance:      {BRIGHT_RED}{distance:7.2f} km{RESET}")
-    print(" ")  # Blank line for spacing
+    return [
+        f"Active Time:          {BRIGHT_RED}{formatted_time}{RESET}",
+        f"Cadence:       {BRIGHT_RED}{live_cadence:6.1f} RPM{RESET}",
+        f"Speed:         {BRIGHT_RED}{live_speed:6.1f} km/h{RESET}",
+        f"30s Avg Speed: {BRIGHT_RED}{interval_speed:6.1f} km/h{RESET}",
+        f"Total Avg Speed:{BRIGHT_RED}{avg_speed:6.1f} km/h{RESET}",
+        f"Distance:      {BRIGHT_RED}{distance:7.2f} km{RESET}",
+        " ",  # Blank line for spacing
+    ]
+
 
+def draw_metrics(metrics):
+    """Display live metrics above the graph."""
+    for line in build_metrics_lines(metrics):
+        print(line)
+
+
+def build_frame(metrics, config):
+    """build a full frame (metrics lines, then the plot) as rows of cells.
+
+    With a whole-ride "speed_history" (plot_view: ride) every column covers
+    an equal slice of the ride, or of the last plot_span samples: red spans
+    the slice's range and the grey bar is its average.
+    """
+    rows = [[line] for line in build_metrics_lines(metrics)]
+    history = metrics.get("speed_history")
+    if history is not None and config.get("plot_view", "ride") == "ride":
+        span = config.get("plot_span")
+        start = max(0, len(history) - span) if span else 0
+        lows, highs, means = history.columns(config["terminal_width"], start)
+        title = "Time (last {span} samples; red: range, grey: average)" if span else "Time (whole ride; red: range, grey: average)"
+        rows.extend(build_plot_rows(highs, means, config, lows, title.format(span=span)))
+        return rows
+    live_speed_history = metrics["live_speeds"]
+    speed_history = metrics["intervals"].column("avg_speed")
+    rows.extend(build_plot_rows(live_speed_history, speed_history, config))
+    return rows
+
+
+def fit_to_terminal(config):
+    """config with terminal_width set to the plot columns the terminal has room for now."""
+    columns = shutil.get_terminal_size((config["terminal_width"] + 6, 24)).columns
+    return {**config, "terminal_width": max(10, columns - 6)}  # 6 columns for the y-axis labels
+
+
+class FrameRenderer:
+    """Redraws only what changed since the previous frame.
+
+    A frame is a list of rows, each row a list of cells. Cells are one column
+    wide, except that a row made of a single cell (a metrics or title line) may
+    hold a whole line of text. Each frame becomes one string of cursor moves
+    and changed spans, written with a single write call.
+    """
+
+    def __init__(self, out=None):
+        self.out = out
+        self.previous = None
+
+    def reset(self):
+        """forget the previous frame so the next one is drawn in full (e.g. after a resize)."""
+        self.previous = None
+
+    def diff(self, rows):
+        """return the escape sequences that turn the previous frame into `rows`."""
+        if self.previous is None:
+            parts = ["\033[H\033[J"]  # clear the screen once, on the first frame
+            previous = []
+        else:
+            parts = []
+            previous = self.previous
+
+        for r, row in enumerate(rows):
+            prev = previous[r] if r < len(previous) else None
+            if prev is None or len(prev) != len(row):
+                parts.append(f"\033[{r + 1};1H{''.join(row)}\033[K")
+                continue
+            first = 0
+            while first < len(row) and row[first] == prev[first]:
+                first += 1
+            if first == len(row):
+                continue  # unchanged row
+            last = len(row) - 1
+            while row[last] == prev[last]:
+                last -= 1
+            parts.append(f"\033[{r + 1};{first + 1}H{''.join(row[first:last + 1])}")
+            if last == len(row) - 1:
+                parts.append("\033[K")  # a shorter line must not leave old text behind
+
+        if len(rows) < len(previous):
+            parts.append(f"\033[{len(rows) + 1};1H\033[J")
+        if parts:
+            parts.append(f"\033[{len(rows) + 1};1H")  # park the cursor below the frame
+
+        self.previous = rows
+        return "".join(parts)
+
+    def render(self, rows):
+        """write the changes for a frame in one buffered write."""
+        out = self.out or sys.stdout
+        update = self.diff(rows)
+        if update:
+            out.write(update)
+            out.flush()
 
 
 async def terminal_display(metrics_queue, config, shutdown_event):
-    """Periodically updates the terminal display with metrics and graph."""
+    """Updates the terminal with metrics and graph, at most display_fps frames per second.
+
+    Updates arriving between frames are coalesced: only the newest is drawn.
+    """
+    renderer = FrameRenderer()
+    autosize = config.get("plot_autosize", False)
+    frame_interval = 1 / config.get("display_fps", 10)
+    loop = asyncio.get_running_loop()
+    last_frame_time = 0
+
     while not shutdown_event.is_set():
         try:
             # Get the latest metrics from the queue
             metrics = await asyncio.wait_for(metrics_queue.get(), timeout=1)
 
-            # Clear the terminal ONCE
-            sys.stdout.write("\033[H\033[J")  # Clear terminal and reset cursor position
-
-            # Draw the metrics
-            draw_metrics(metrics)
-
-            # Draw the speed graph
-            live_speed_history = metrics["live_speeds"]
-            speed_history = [interval["avg_speed"] for interval in metrics["intervals"]]
-            draw_plot(live_speed_history, speed_history, config)
+            # hold the frame until the rate cap allows it, keeping only the newest update
+            wait = last_frame_time + frame_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            while not metrics_queue.empty():
+                metrics = metrics_queue.get_nowait()
+
+            if autosize:
+                # a resize just reads a different pyramid level; the changed frame shape redraws in full
+                fitted = fit_to_terminal(config)
+                if fitted["terminal_width"] != config["terminal_width"]:
+                    config = fitted
+                    renderer.reset()
+            renderer.render(build_frame(metrics, config))
+            if TRACER.enabled and "t_rx" in metrics:
+                TRACER.record("display", metrics["t_rx"])
+            last_frame_time = loop.time()
 
         except asyncio.TimeoutError:
             pass
@@ -0,0 +1,23 @@
+import json
+from benchmark import compare_results, main, run_regression_suite
+
+
+def test_compare_results_flags_only_slowdowns_past_threshold():
+    rows = compare_results({"a": 1.3, "b": 1.2, "c": 0.5, "new": 1.0}, {"a": 1.0, "b": 1.0, "c": 1.0}, threshold=0.25)
+    assert {name: regressed for name, _, _, _, regressed in rows} == {"a": True, "b": False, "c": False}
+
+
+def test_regression_suite_covers_the_hot_paths():
+    results = run_regression_suite(scale=0.01)
+    for name in ("decode.handle_data", "metrics.update", "display.draw_plot", "display.draw_metrics",
+                 "logger.write", "logger.writer_csv", "logger.writer_binary", "sensor.fake_bleak"):
+        assert results[name] > 0
+
+
+def test_regress_saves_a_baseline_then_fails_on_regressions(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    assert main(["regress", "--quick", "--baseline", str(baseline)]) == 0
+    saved = json.loads(baseline.read_text())
+    saved["results"] = {name: seconds / 100 for name, seconds in saved["results"].items()}  # a much faster past
+    baseline.write_text(json.dumps(saved))
+    assert main(["regress", "--quick", "--baseline", str(baseline)]) == 1
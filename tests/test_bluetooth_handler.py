@@ -1,19 +1,146 @@
+import asyncio
 import pytest
 from bluetooth_handler import find_sensor, connect_to_sensor
+from bluetooth_handler import decode_csc, decode_batch, process_measurement, handle_batch
+from bluetooth_handler import load_cached_address, save_cached_address
+from fake_bleak import FakeBackend, make_room
 
 @pytest.mark.asyncio
-async def test_find_sensor_no_device_found(monkeypatch):
-    async def mock_discover(*args, **kwargs):
-        return []  # Simulate no devices found
-    monkeypatch.setattr("bleak.BleakScanner.discover", mock_discover)
+async def test_find_sensor_no_device_found(tmp_path):
+    backend = FakeBackend([], scan_delay=0.01)  # Simulate no devices found
+    config = {**reconnect_config(tmp_path), "scan_retry_duration": 0.05}
 
-    address = await find_sensor()
+    address = await find_sensor(config, backend.scanner)
     assert address is None, "Expected no devices to be found"
+    assert backend.scanner.scans > 1, "Expected scans to be retried"
 
 @pytest.mark.asyncio
-async def test_connect_to_sensor_no_device(monkeypatch):
-    async def mock_find_sensor():
-        return None  # Simulate no sensor found
-    monkeypatch.setattr("bluetooth_handler.find_sensor", mock_find_sensor)
+async def test_connect_to_sensor_no_device(tmp_path):
+    backend = FakeBackend([], scan_delay=0.01)  # Simulate no sensor found
+    config = {**reconnect_config(tmp_path), "scan_retry_duration": 0.05}
 
-    await connect_to_sensor()  # Should handle no sensor gracefully
+    # Should handle no sensor gracefully
+    await asyncio.wait_for(
+        connect_to_sensor(asyncio.Queue(), asyncio.Event(), {}, config, backend.scanner, backend.client), timeout=1)
+    assert backend.clients == []
+
+
+def crank_packet(revolutions, event_time):
+    return bytes([0x02]) + revolutions.to_bytes(2, "little") + event_time.to_bytes(2, "little")
+
+
+def csc_packet(wheel_revolutions, wheel_time, revolutions, event_time):
+    return bytes([0x03]) + wheel_revolutions.to_bytes(4, "little") + wheel_time.to_bytes(2, "little") + \
+        revolutions.to_bytes(2, "little") + event_time.to_bytes(2, "little")
+
+
+def test_decode_csc_flags():
+    assert decode_csc(crank_packet(10, 2048)) == (None, None, 10, 2048)
+    assert decode_csc(csc_packet(70000, 1024, 10, 2048)) == (70000, 1024, 10, 2048)
+    assert decode_csc(bytes([0x01]) + (5).to_bytes(4, "little") + (512).to_bytes(2, "little")) == (5, 512, None, None)
+
+
+def test_crank_rollover_keeps_cadence_and_unwraps_revolutions():
+    state = {}
+    process_measurement(decode_csc(crank_packet(65535, 65000)), state, 0)
+    # one revolution later both 16-bit fields have wrapped; 1024 ticks = 1 s
+    result = process_measurement(decode_csc(crank_packet(0, (65000 + 1024) & 0xFFFF)), state, 1)
+    assert result["cadence"] == pytest.approx(60)
+    assert result["revolutions"] == 65536
+
+
+def test_wheel_rollover_32_bit():
+    state = {}
+    process_measurement(decode_csc(csc_packet(0xFFFFFFFF, 0, 1, 0)), state, 0)
+    result = process_measurement(decode_csc(csc_packet(1, 512, 2, 1024)), state, 1)
+    assert result["wheel_revolutions"] == 0xFFFFFFFF + 2
+    assert result["wheel_rpm"] == pytest.approx(240)
+
+
+def test_cadence_drops_to_zero_after_timeout():
+    state = {}
+    process_measurement(decode_csc(crank_packet(0, 0)), state, 0)
+    assert process_measurement(decode_csc(crank_packet(1, 1024)), state, 1)["cadence"] == pytest.approx(60)
+    assert process_measurement(decode_csc(crank_packet(1, 1024)), state, 5)["cadence"] == pytest.approx(60)
+    assert process_measurement(decode_csc(crank_packet(1, 1024)), state, 12)["cadence"] == 0
+
+
+def test_batch_matches_single_packet_decode():
+    packets = [crank_packet(i, i * 700 & 0xFFFF) for i in range(100)]
+    assert decode_batch(packets) == [decode_csc(p) for p in packets]
+    mixed = packets[:3] + [csc_packet(1, 2, 3, 4)]
+    assert decode_batch(mixed) == [decode_csc(p) for p in mixed]
+
+
+@pytest.mark.asyncio
+async def test_handle_batch_enqueues_every_packet():
+    queue = asyncio.Queue()
+    handle_batch([crank_packet(i, i * 1024) for i in range(5)], queue, {})
+    assert queue.qsize() == 5
+
+
+def reconnect_config(tmp_path):
+    return {
+        "cadence_uuid": "00002a5b-0000-1000-8000-00805f9b34fb",
+        "scan_retry_duration": 1, "scan_interval": 0.1,
+        "device_cache": str(tmp_path / "last_sensor"),
+        "reconnect_delay": 0.01, "reconnect_max_delay": 0.05,
+    }
+
+
+async def stop_after(task, shutdown_event, seconds):
+    await asyncio.sleep(seconds)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_cached_address_skips_the_scan(tmp_path):
+    backend = FakeBackend(make_room(1, interval=0.01))
+    config = reconnect_config(tmp_path)
+    save_cached_address(config["device_cache"], "00:00:00:00:00:00")
+    queue, shutdown_event = asyncio.Queue(), asyncio.Event()
+    task = asyncio.create_task(connect_to_sensor(queue, shutdown_event, {}, config, backend.scanner, backend.client))
+    await stop_after(task, shutdown_event, 0.1)
+    assert backend.scanner.scans == 0
+    assert queue.qsize() > 0
+
+
+@pytest.mark.asyncio
+async def test_stale_cache_falls_back_to_scan_and_updates_cache(tmp_path):
+    backend = FakeBackend(make_room(1, interval=0.01))
+    config = reconnect_config(tmp_path)
+    save_cached_address(config["device_cache"], "AA:BB:CC:DD:EE:FF")
+    queue, shutdown_event = asyncio.Queue(), asyncio.Event()
+    task = asyncio.create_task(connect_to_sensor(queue, shutdown_event, {}, config, backend.scanner, backend.client))
+    await stop_after(task, shutdown_event, 0.1)
+    assert backend.scanner.scans == 1
+    assert load_cached_address(config["device_cache"]) == "00:00:00:00:00:00"
+
+
+@pytest.mark.asyncio
+async def test_reconnects_after_dropout_and_keeps_parser_state(tmp_path):
+    backend = FakeBackend(make_room(1, interval=0.01))
+    config = reconnect_config(tmp_path)
+    queue, shutdown_event, state = asyncio.Queue(), asyncio.Event(), {}
+    task = asyncio.create_task(connect_to_sensor(queue, shutdown_event, state, config, backend.scanner, backend.client))
+    await asyncio.sleep(0.1)
+    revolutions_before = state["total_crank_revolutions"]
+    backend.clients[0].drop()
+    await stop_after(task, shutdown_event, 0.1)
+    assert len(backend.clients) == 2, "Expected a direct reconnect"
+    assert backend.scanner.scans == 1, "Expected no rescan after the dropout"
+    # the sensor kept counting, so the unwrapped total just carries on
+    assert 0 < state["total_crank_revolutions"] - revolutions_before < 100
+
+
+def test_gap_longer_than_event_time_wrap_starts_a_new_baseline():
+    state = {}
+    process_measurement(decode_csc(crank_packet(0, 0)), state, 0)
+    process_measurement(decode_csc(crank_packet(1, 683)), state, 0.67)
+    # a 100 s outage at 90 RPM: the 16-bit event time wrapped in the meantime
+    result = process_measurement(decode_csc(crank_packet(151, (683 + 100 * 1024) & 0xFFFF)), state, 100.67)
+    assert result["cadence"] == 0
+    assert result["revolutions"] == 151, "Expected the revolutions to still count for distance"
+    result = process_measurement(decode_csc(crank_packet(152, (683 + 100 * 1024 + 683) & 0xFFFF)), state, 101.34)
+    assert result["cadence"] == pytest.approx(90, rel=0.01)
@@ -0,0 +1,139 @@
+import asyncio
+import base64
+import json
+import os
+import pytest
+from broadcast_server import BroadcastServer, DeltaEncoder, websocket_accept
+from ring_buffer import RingBuffer, RecordRing
+
+
+def make_metrics(speeds, intervals, **fields):
+    return {"live_speed": speeds.view()[-1] if len(speeds) else 0, **fields,
+            "live_speeds": speeds.view(), "intervals": intervals.view()}
+
+
+def test_delta_encoder_sends_changes_and_appended_points():
+    speeds, intervals = RingBuffer(8), RecordRing(8, ("avg_speed", "distance"))
+    speeds.append(20)
+    encoder = DeltaEncoder()
+    first = encoder.encode(make_metrics(speeds, intervals, total_distance=1.0))
+    assert first["fields"] == {"live_speed": 20, "total_distance": 1.0}
+    assert first["live_speeds"] == {"reset": [20]}
+
+    speeds.append(21)
+    intervals.append({"avg_speed": 20.5, "distance": 0.2})
+    second = encoder.encode(make_metrics(speeds, intervals, total_distance=1.0))
+    assert second["fields"] == {"live_speed": 21}, "Expected unchanged fields to be left out"
+    assert second["live_speeds"] == {"append": [21]}
+    assert second["intervals"] == {"append": [{"avg_speed": 20.5, "distance": 0.2}]}
+    assert encoder.encode(make_metrics(speeds, intervals, total_distance=1.0)) is None
+
+
+def test_delta_encoder_resets_when_history_was_overwritten():
+    speeds, intervals = RingBuffer(4), RecordRing(4, ("avg_speed", "distance"))
+    speeds.append(1)
+    encoder = DeltaEncoder()
+    encoder.encode(make_metrics(speeds, intervals))
+    for value in range(2, 10):
+        speeds.append(value)
+    assert encoder.encode(make_metrics(speeds, intervals))["live_speeds"] == {"reset": [6, 7, 8, 9]}
+
+
+def test_delta_encoder_recovers_from_a_view_gone_stale_before_encoding():
+    speeds, intervals = RingBuffer(4), RecordRing(4, ("avg_speed", "distance"))
+    for value in range(4):
+        speeds.append(value)
+        intervals.append({"avg_speed": value, "distance": value})
+    published = make_metrics(speeds, intervals)
+    speeds.append(4)  # the next tick lands before the client task gets to encode
+    intervals.append({"avg_speed": 4, "distance": 4})
+    message = DeltaEncoder().encode(published)
+    assert message["live_speeds"] == {"reset": [1, 2, 3, 4]}
+    assert [row["avg_speed"] for row in message["intervals"]["reset"]] == [1, 2, 3, 4]
+
+
+def test_delta_encoder_sends_only_changed_rollup_entries():
+    speeds, intervals = RingBuffer(8), RecordRing(8, ("avg_speed", "distance"))
+    encoder = DeltaEncoder()
+    rollups = {"1s": {"avg_speed": 20.0, "distance": 0.1}, "5min": {"avg_speed": 18.0, "distance": 1.0}}
+    first = encoder.encode(make_metrics(speeds, intervals, rollups=rollups))
+    assert first["fields"]["rollups"] == rollups
+
+    rollups = {"1s": {"avg_speed": 21.0, "distance": 0.1}, "5min": {"avg_speed": 18.0, "distance": 1.0}}
+    second = encoder.encode(make_metrics(speeds, intervals, rollups=rollups))
+    assert second["fields"] == {"rollups": {"1s": {"avg_speed": 21.0}}}
+    assert encoder.encode(make_metrics(speeds, intervals, rollups=dict(rollups))) is None
+
+
+async def read_message(reader):
+    return json.loads(await asyncio.wait_for(reader.readline(), timeout=2))
+
+
+@pytest.mark.asyncio
+async def test_tcp_clients_receive_deltas():
+    server = await BroadcastServer("127.0.0.1", 0).start()
+    speeds, intervals = RingBuffer(16), RecordRing(16, ("avg_speed", "distance"))
+    try:
+        clients = [await asyncio.open_connection("127.0.0.1", server.port) for _ in range(3)]
+        speeds.append(25)
+        server.publish(make_metrics(speeds, intervals, total_distance=0.5))
+        for reader, _ in clients:
+            message = await read_message(reader)
+            assert message["fields"]["total_distance"] == 0.5
+            assert message["live_speeds"] == {"reset": [25]}
+
+        speeds.append(26)
+        server.publish(make_metrics(speeds, intervals, total_distance=0.5))
+        for reader, _ in clients:
+            message = await read_message(reader)
+            assert message["fields"] == {"live_speed": 26}
+            assert message["live_speeds"] == {"append": [26]}
+        for _, writer in clients:
+            writer.close()
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_slow_client_gets_coalesced_latest_state():
+    server = await BroadcastServer("127.0.0.1", 0).start()
+    speeds, intervals = RingBuffer(64), RecordRing(64, ("avg_speed", "distance"))
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        await asyncio.sleep(0.6)  # past the handshake timeout, so the client is registered
+        for value in range(20):  # published without yielding: the client can't keep up
+            speeds.append(value)
+            server.publish(make_metrics(speeds, intervals, total_distance=value))
+        message = await read_message(reader)
+        assert message["fields"]["total_distance"] == 19, "Expected only the latest state"
+        assert message["live_speeds"] == {"reset": list(range(20))}
+        assert len(server.clients) == 1 and next(iter(server.clients)).sent == 1
+        writer.close()
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_websocket_client_handshake_and_frames():
+    server = await BroadcastServer("127.0.0.1", 0).start()
+    speeds, intervals = RingBuffer(16), RecordRing(16, ("avg_speed", "distance"))
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            f"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode()
+        )
+        response = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=2)
+        assert response.startswith(b"HTTP/1.1 101")
+        assert websocket_accept(key).encode() in response
+
+        speeds.append(30)
+        server.publish(make_metrics(speeds, intervals))
+        header = await asyncio.wait_for(reader.readexactly(2), timeout=2)
+        assert header[0] == 0x81, "Expected a final text frame"
+        payload = await reader.readexactly(header[1])
+        assert json.loads(payload)["live_speeds"] == {"reset": [30]}
+        writer.close()
+    finally:
+        await server.stop()
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from array import array
+import pytest
+from bluetooth_handler import handle_packet, load_cached_address, save_cached_address
+from checkpoint import build_checkpoint, save_checkpoint, load_checkpoint, resume_session, checkpointer, history_file
+from metrics_calculator import MetricsEngine
+from replay_source import build_crank_packet
+
+
+def ride(engine, crank_state, first, last, start_time):
+    """feed one crank revolution per second through handle_packet and the engine."""
+    queue = asyncio.Queue()
+    for second in range(first, last):
+        handle_packet(build_crank_packet(second, second * 1024), queue, crank_state)
+        engine.ingest(queue.get_nowait(), start_time + second)
+        engine.tick(start_time + second)
+
+
+@pytest.fixture
+def config(tmp_path):
+    return {
+        "wheel_circumference": 2.1, "chainring": 50, "cog": 15, "terminal_width": 90,
+        "device_cache": str(tmp_path / ".last_sensor"),
+        "checkpoint_file": str(tmp_path / "session.ckpt"),
+        "log_file": str(tmp_path / "workout.csv"),
+    }
+
+
+def save(engine, crank_state, config):
+    samples = engine.state["speed_pyramid"].values  # the checkpointer appends only the new ones
+    save_checkpoint(config["checkpoint_file"], build_checkpoint(engine, crank_state, config), samples, fsync=False)
+
+
+def test_resume_restores_totals_histories_and_crank_state(config, tmp_path):
+    engine, crank_state = MetricsEngine(config), {}
+    ride(engine, crank_state, 0, 40, time.time() - 100)
+    save_cached_address(config["device_cache"], "AA:BB:CC:DD:EE:FF")
+    save(engine, crank_state, config)
+
+    save_cached_address(config["device_cache"], "00:00:00:00:00:00")
+    resumed_config = {key: value for key, value in config.items() if key != "log_file"}
+    start = time.perf_counter()
+    restored_state = {}
+    restored = resume_session(load_checkpoint(config["checkpoint_file"]), restored_state, resumed_config)
+    assert time.perf_counter() - start < 0.1, "Expected resume to take milliseconds"
+
+    assert restored.state["total_distance"] == pytest.approx(engine.state["total_distance"])
+    assert restored.state["active_time"] == pytest.approx(engine.state["active_time"])
+    assert restored.state["live_speeds"].view()[:] == engine.state["live_speeds"].view()[:]
+    assert restored.state["speed_pyramid"].columns(10) == engine.state["speed_pyramid"].columns(10)
+    assert restored.state["intervals"] is restored.rollups["interval"].history
+    assert load_cached_address(config["device_cache"]) == "AA:BB:CC:DD:EE:FF"
+    assert resumed_config["log_file"] == config["log_file"]
+
+    # the counters carry on: the next revolutions add distance instead of resetting
+    distance = restored.state["total_distance"]
+    ride(restored, restored_state, 40, 45, time.time() - 5)
+    assert restored.state["total_distance"] == pytest.approx(distance + 5 * 50 / 15 * 2.1 / 1000)
+
+
+def test_unreadable_checkpoint_is_ignored(config, capsys):
+    assert load_checkpoint(config["checkpoint_file"]) is None
+    with open(config["checkpoint_file"], "wb") as file:
+        file.write(b"not a checkpoint")
+    assert load_checkpoint(config["checkpoint_file"]) is None
+    assert "[ERROR]" in capsys.readouterr().out
+
+
+@pytest.mark.asyncio
+async def test_checkpointer_writes_periodically(config):
+    engine, crank_state = MetricsEngine(config), {}
+    ride(engine, crank_state, 0, 5, time.time())
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(checkpointer(engine, crank_state, shutdown_event, {**config, "checkpoint_interval": 0.05}))
+    await asyncio.sleep(0.2)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=1)
+    checkpoint = load_checkpoint(config["checkpoint_file"])
+    assert checkpoint["engine"]["state"]["total_distance"] == pytest.approx(engine.state["total_distance"])
+
+
+def test_resume_after_a_long_outage_reports_no_spurious_cadence(config):
+    engine, crank_state = MetricsEngine(config), {}
+    ride(engine, crank_state, 0, 40, time.time() - 40)
+    # the session crashed and comes back 100 s after the last crank event
+    crank_state["last_movement_time"] -= 100
+    save(engine, crank_state, config)
+
+    restored_state, queue = {}, asyncio.Queue()
+    resume_session(load_checkpoint(config["checkpoint_file"]), restored_state, config)
+    # the sensor's 16-bit event time kept running and wrapped during the outage
+    handle_packet(build_crank_packet(140, 140 * 1024), queue, restored_state)
+    first = queue.get_nowait()
+    assert first["cadence"] == 0
+    assert first["revolutions"] == 140
+    handle_packet(build_crank_packet(141, 141 * 1024), queue, restored_state)
+    assert queue.get_nowait()["cadence"] == pytest.approx(60)
+
+
+def test_checkpoint_size_does_not_grow_with_the_ride(config):
+    engine, crank_state = MetricsEngine(config), {}
+    ride(engine, crank_state, 0, 100, time.time() - 20000)
+    short = len(build_checkpoint(engine, crank_state, config))
+    ride(engine, crank_state, 100, 20000, time.time() - 20000)
+    assert len(build_checkpoint(engine, crank_state, config)) < short * 1.1
+
+
+@pytest.mark.asyncio
+async def test_checkpointer_appends_only_new_history(config):
+    engine, crank_state = MetricsEngine(config), {}
+    ride(engine, crank_state, 0, 5, time.time())
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(checkpointer(engine, crank_state, shutdown_event, {**config, "checkpoint_interval": 0.05}))
+    await asyncio.sleep(0.08)
+    ride(engine, crank_state, 5, 9, time.time())
+    await asyncio.sleep(0.08)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=1)
+
+    with open(history_file(config["checkpoint_file"]), "rb") as file:
+        samples = array("d", file.read())
+    assert samples == engine.state["speed_pyramid"].values
+    assert load_checkpoint(config["checkpoint_file"])["engine"]["history_length"] == len(samples)
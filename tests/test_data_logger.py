@@ -0,0 +1,83 @@
+import asyncio
+import csv
+import pytest
+from data_logger import WorkoutWriter, read_binary_log, export_binary_to_csv, logger, CSV_FIELDNAMES
+
+RECORDS = [(1700000000.0 + i, 90.0, 30.0 + i, 0.01 * i, 29.5) for i in range(5)]
+
+
+def test_csv_writer_streams_records(tmp_path):
+    path = tmp_path / "workout.csv"
+    writer = WorkoutWriter(path, "csv").start()
+    for record in RECORDS:
+        writer.write(record)
+    writer.close()
+    with open(path, newline="") as csvfile:
+        rows = list(csv.reader(csvfile))
+    assert rows[0] == CSV_FIELDNAMES
+    assert len(rows) == len(RECORDS) + 1
+    assert float(rows[-1][2]) == 34.0
+
+
+def test_binary_round_trip_and_export(tmp_path):
+    path = tmp_path / "workout.rbl"
+    writer = WorkoutWriter(path, "binary").start()
+    for record in RECORDS:
+        writer.write(record)
+    writer.close()
+    assert read_binary_log(path) == RECORDS
+
+    csv_path = export_binary_to_csv(str(path))
+    with open(csv_path, newline="") as csvfile:
+        assert len(list(csv.DictReader(csvfile))) == len(RECORDS)
+
+
+def test_binary_reader_ignores_torn_record(tmp_path):
+    path = tmp_path / "workout.rbl"
+    writer = WorkoutWriter(path, "binary").start()
+    writer.write(RECORDS[0])
+    writer.close()
+    with open(path, "ab") as logfile:
+        logfile.write(b"\x00" * 7)  # partial record from a crash
+    assert read_binary_log(path) == RECORDS[:1]
+
+
+@pytest.mark.asyncio
+async def test_logger_flushes_on_shutdown(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    queue = asyncio.Queue()
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(logger(queue, shutdown_event, {"log_format": "binary", "log_flush_interval": 60}))
+    for _ in range(3):
+        queue.put_nowait({"live_RPM": 90, "live_speed": 30, "total_distance": 1, "average_speed": 29})
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    [path] = (tmp_path / "workouts").iterdir()
+    assert len(read_binary_log(path)) == 3
+
+
+def test_binary_writer_drops_a_torn_record_when_resuming(tmp_path):
+    path = tmp_path / "workout.rbl"
+    writer = WorkoutWriter(str(path), "binary", flush_interval=0.01).start()
+    writer.write((1.0, 90, 30, 0.1, 30))
+    writer.close()
+    with open(path, "ab") as file:
+        file.write(b"\x00" * 10)  # a record cut short by a crash
+    writer = WorkoutWriter(str(path), "binary", flush_interval=0.01).start()
+    writer.write((2.0, 91, 31, 0.2, 30))
+    writer.close()
+    assert [record[0] for record in read_binary_log(str(path))] == [1.0, 2.0]
+
+
+def test_writer_failures_surface_in_the_caller(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        WorkoutWriter(tmp_path / "gone" / "workout.csv").start()
+
+    writer = WorkoutWriter(tmp_path / "workout.csv").start()
+    writer.write(("not", "a", "record"))  # the thread fails on it
+    writer._thread.join(timeout=2)
+    with pytest.raises(ValueError):
+        writer.write((1700000000, 90, 30, 0.1, 30))
+    with pytest.raises(ValueError):
+        writer.close()
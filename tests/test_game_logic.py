@@ -0,0 +1,66 @@
+import asyncio
+import csv
+import pytest
+from game_logic import GateScorer, generate_gate_sequence, game
+
+
+def test_same_seed_same_sequence():
+    a = generate_gate_sequence(7, {"game_duration": 600})
+    b = generate_gate_sequence(7, {"game_duration": 600})
+    c = generate_gate_sequence(8, {"game_duration": 600})
+    assert list(a.speed_min) == list(b.speed_min)
+    assert list(a.speed_min) != list(c.speed_min)
+    assert a.duration == 600
+
+
+def test_gate_at_matches_gate_boundaries():
+    sequence = generate_gate_sequence(3, {"game_duration": 300})
+    for gate in range(len(sequence)):
+        start = sequence.starts[gate]
+        assert sequence.gate_at(start) == gate
+        assert sequence.gate_at(start + sequence.lengths[gate] - 0.01) == gate
+    assert sequence.gate_at(300) is None
+
+
+def in_window(sequence, gate):
+    return {
+        "live_speed": (sequence.speed_min[gate] + sequence.speed_max[gate]) / 2,
+        "live_RPM": (sequence.cadence_min[gate] + sequence.cadence_max[gate]) / 2,
+    }
+
+
+def test_perfect_ride_scores_every_gate():
+    sequence = generate_gate_sequence(5, {"game_duration": 120})
+    scorer = GateScorer(sequence)
+    t = 0.0
+    while not scorer.finished:
+        gate = sequence.gate_at(t)
+        scorer.update(in_window(sequence, gate) if gate is not None else {}, t)
+        t += 0.5
+    result = scorer.result()
+    assert result["gates_hit"] == result["gates_total"] == len(sequence)
+    assert result["score"] == pytest.approx(100 * len(sequence), abs=len(sequence))
+
+
+def test_missed_gates_score_nothing():
+    sequence = generate_gate_sequence(5, {"game_duration": 120})
+    scorer = GateScorer(sequence)
+    for i in range(0, 121):
+        scorer.update({"live_speed": 0, "live_RPM": 0}, i)
+    assert scorer.result()["score"] == 0
+
+
+@pytest.mark.asyncio
+async def test_game_writes_score_row(tmp_path):
+    scores_file = tmp_path / "scores.csv"
+    scores_file.touch()
+    queue, shutdown_event = asyncio.Queue(), asyncio.Event()
+    config = {"game_duration": 60, "scores_file": str(scores_file), "rider_name": "alice"}
+    task = asyncio.create_task(game(queue, shutdown_event, config))
+    queue.put_nowait({"live_speed": 30, "live_RPM": 90})
+    await asyncio.sleep(0.01)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=2)
+    with open(scores_file, newline="") as csvfile:
+        [row] = list(csv.DictReader(csvfile))
+    assert row["rider"] == "alice" and row["mode"] == "gates"
@@ -0,0 +1,58 @@
+import random
+import pytest
+from history_pyramid import HistoryPyramid
+
+
+def test_short_history_is_one_column_per_sample():
+    pyramid = HistoryPyramid()
+    for value in (3, 1, 2):
+        pyramid.append(value)
+    assert pyramid.columns(10) == ([3, 1, 2], [3, 1, 2], [3, 1, 2])
+
+
+def test_columns_keep_peaks_and_averages():
+    rng = random.Random(1)
+    values = [rng.uniform(0, 50) for _ in range(10000)]
+    pyramid = HistoryPyramid()
+    for value in values:
+        pyramid.append(value)
+    lows, highs, means = pyramid.columns(80)
+    assert len(highs) == 80
+    assert max(highs) == max(values) and min(lows) == min(values), "Expected no peak to be averaged away"
+    assert sum(means) / 80 == pytest.approx(sum(values) / len(values), rel=0.02)
+    assert all(low <= mean <= high for low, mean, high in zip(lows, means, highs))
+
+
+def test_levels_grow_logarithmically_and_match_raw_buckets():
+    pyramid = HistoryPyramid(factor=4)
+    values = list(range(1000))
+    for value in values:
+        pyramid.append(value)
+    assert len(pyramid.levels) == 4  # buckets of 4, 16, 64 and 256 samples
+    mins, maxs, sums = pyramid.levels[1]
+    assert (mins[3], maxs[3], sums[3]) == (48, 63, sum(range(48, 64)))
+    assert maxs[-1] == 999, "Expected the partial last bucket to be current"
+
+
+def test_zoomed_range_and_view_snapshot():
+    pyramid = HistoryPyramid()
+    for value in range(100):
+        pyramid.append(value)
+    view = pyramid.view()
+    pyramid.append(1000)
+    lows, highs, _ = view.columns(10, start=90)
+    assert lows == list(range(90, 100)), "Expected the last 10 samples, one per column"
+    assert max(view.columns(5)[1]) == 99
+
+
+def test_any_range_matches_the_raw_samples():
+    rng = random.Random(2)
+    values = [rng.uniform(0, 50) for _ in range(3000)]
+    pyramid = HistoryPyramid(factor=3)
+    for value in values:
+        pyramid.append(value)
+    for _ in range(50):
+        start = rng.randrange(0, 2900)
+        end = rng.randrange(start + 1, 3001)
+        lows, highs, means = pyramid.columns(rng.randrange(1, 120), start, end)
+        assert min(lows) == min(values[start:end]) and max(highs) == max(values[start:end])
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import time
+import pytest
+from bluetooth_handler import handle_packet
+from instrumentation import LatencyHistogram, Tracer, TRACER
+
+
+def test_histogram_percentiles_are_close():
+    histogram = LatencyHistogram()
+    for microseconds in range(1, 1001):
+        histogram.record(microseconds / 1e6)
+    assert histogram.percentile(50) == pytest.approx(500e-6, rel=0.25)
+    assert histogram.percentile(99) == pytest.approx(990e-6, rel=0.25)
+    assert histogram.percentile(100) == pytest.approx(1000e-6)
+
+
+def test_report_and_dump(tmp_path):
+    tracer = Tracer()
+    tracer.enabled = True
+    queue = asyncio.Queue()
+    tracer.gauge("queue", queue.qsize)
+    queue.put_nowait(1)
+    tracer.record("decode", tracer.now())
+    tracer.dump(tmp_path / "trace.jsonl")
+    report = json.loads((tmp_path / "trace.jsonl").read_text())
+    assert report["stages"]["decode"]["count"] == 1
+    assert report["gauges"]["queue"] == {"depth": 1, "max": 1}
+    assert report["role"] == "main"
+
+
+def test_reports_name_the_process_that_wrote_them(tmp_path):
+    tracer = Tracer().configure({"trace_enabled": True}, "logger")
+    tracer.dump(tmp_path / "trace.jsonl")
+    report = json.loads((tmp_path / "trace.jsonl").read_text())
+    assert report["role"] == "logger"
+    assert report["pid"] > 0
+
+
+def test_disabled_tracer_leaves_samples_untouched(monkeypatch):
+    monkeypatch.setattr(TRACER, "enabled", False)
+    queue = asyncio.Queue()
+    handle_packet(bytes([0x02, 1, 0, 0, 4]), queue, {})
+    assert "t_rx" not in queue.get_nowait()
+
+
+def test_enabled_tracer_stamps_and_records(monkeypatch):
+    monkeypatch.setattr(TRACER, "enabled", True)
+    monkeypatch.setattr(TRACER, "histograms", {})
+    queue = asyncio.Queue()
+    handle_packet(bytes([0x02, 1, 0, 0, 4]), queue, {})
+    assert "t_rx" in queue.get_nowait()
+    assert TRACER.histograms["decode"].count == 1
+
+
+def test_decode_stage_includes_decoding(monkeypatch):
+    import bluetooth_handler
+    monkeypatch.setattr(TRACER, "enabled", True)
+    monkeypatch.setattr(TRACER, "histograms", {})
+    decode_csc = bluetooth_handler.decode_csc
+
+    def slow_decode(data):
+        time.sleep(0.002)
+        return decode_csc(data)
+
+    monkeypatch.setattr(bluetooth_handler, "decode_csc", slow_decode)
+    handle_packet(bytes([0x02, 1, 0, 0, 4]), asyncio.Queue(), {})
+    assert TRACER.histograms["decode"].max >= 0.002
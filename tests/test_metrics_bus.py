@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from metrics_bus import MetricsBus, LATEST, LOSSLESS, DROP_OLDEST
+
+
+@pytest.mark.asyncio
+async def test_every_subscriber_sees_every_update():
+    bus = MetricsBus()
+    display = bus.subscribe("display", policy=DROP_OLDEST, maxsize=10)
+    logger = bus.subscribe("logger", policy=LOSSLESS, maxsize=10)
+    for i in range(3):
+        await bus.publish({"n": i})
+    assert [display.get_nowait()["n"] for _ in range(3)] == [0, 1, 2]
+    assert [(await logger.get())["n"] for _ in range(3)] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_latest_policy_keeps_newest_only():
+    bus = MetricsBus()
+    display = bus.subscribe("display", policy=LATEST)
+    for i in range(5):
+        await bus.publish({"n": i})
+    assert display.qsize() == 1
+    assert (await display.get())["n"] == 4
+    assert display.stats()["dropped"] == 4
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_policy_is_bounded():
+    bus = MetricsBus()
+    exporter = bus.subscribe("exporter", policy=DROP_OLDEST, maxsize=3)
+    for i in range(10):
+        await bus.publish({"n": i})
+    assert [exporter.get_nowait()["n"] for _ in range(3)] == [7, 8, 9]
+    assert exporter.stats()["max_depth"] == 3
+
+
+@pytest.mark.asyncio
+async def test_lossless_policy_applies_backpressure():
+    bus = MetricsBus()
+    logger = bus.subscribe("logger", policy=LOSSLESS, maxsize=2)
+    await bus.publish({"n": 0})
+    await bus.publish({"n": 1})
+    publish = asyncio.create_task(bus.publish({"n": 2}))
+    await asyncio.sleep(0)
+    assert not publish.done(), "Expected publish to wait for the full lossless buffer"
+    assert (await logger.get())["n"] == 0
+    await asyncio.wait_for(publish, timeout=1)
+    assert logger.stats()["dropped"] == 0
+    assert [logger.get_nowait()["n"] for _ in range(2)] == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_subscriber_takes_every_nth_tick():
+    bus = MetricsBus()
+    display = bus.subscribe("display", policy=DROP_OLDEST, maxsize=100)
+    logger = bus.subscribe("logger", policy=LOSSLESS, maxsize=100, rate=1)
+    for tick in range(12):
+        await bus.publish({"tick_time": tick * 0.25})
+    assert display.qsize() == 12
+    assert [logger.get_nowait()["tick_time"] for _ in range(logger.qsize())] == [0, 1, 2]
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from metrics_calculator import MetricsEngine, calculate_metrics
+
+CONFIG = {"wheel_circumference": 2.1, "chainring": 50, "cog": 15, "terminal_width": 90, "idle_timeout": 5}
+
+
+def test_ingest_coalesces_a_burst_into_one_tick():
+    engine = MetricsEngine(CONFIG)
+    assert engine.tick(0) is None, "Expected no metrics before the first packet"
+    assert not engine.ingest({"cadence": 0, "revolutions": 100}, 0)
+    for revolutions in range(101, 105):
+        engine.ingest({"cadence": 90, "revolutions": revolutions}, 0.5)
+    metrics = engine.tick(1)
+    assert metrics["total_distance"] == pytest.approx(4 * 50 / 15 * 2.1 / 1000)
+    assert metrics["live_RPM"] == 90
+    assert len(metrics["live_speeds"]) == 1
+
+
+def test_idle_ticks_hold_then_zero_cadence():
+    engine = MetricsEngine(CONFIG)
+    engine.ingest({"cadence": 0, "revolutions": 0}, 0)
+    engine.ingest({"cadence": 80, "revolutions": 1}, 1)
+    assert engine.tick(3)["live_RPM"] == 80, "Expected the last cadence to be held"
+    metrics = engine.tick(7)
+    assert metrics["live_RPM"] == 0 and metrics["live_speed"] == 0
+    assert metrics["active_time"] == pytest.approx(3)
+
+
+def test_lap_distance_closes_the_lap_window():
+    engine = MetricsEngine({**CONFIG, "lap_distance": 0.05})
+    engine.ingest({"cadence": 0, "revolutions": 0}, 0)
+    for second in range(1, 21):  # 20 revolutions of 7 m
+        engine.ingest({"cadence": 60, "revolutions": second}, second)
+        engine.tick(second)
+    laps = engine.rollups["lap"].history.view()
+    assert len(laps) == 2
+    assert all(lap["distance"] == pytest.approx(0.05, abs=0.007) for lap in laps)
+    assert engine.rollups["lap"].averages()["distance"] < 0.05
+
+
+@pytest.mark.asyncio
+async def test_fixed_rate_publishes_without_packets():
+    queue, metrics_queue, shutdown_event = asyncio.Queue(), asyncio.Queue(), asyncio.Event()
+    queue.put_nowait({"cadence": 0, "revolutions": 0})
+    task = asyncio.create_task(calculate_metrics(queue, metrics_queue, shutdown_event, {**CONFIG, "metrics_rate": 20}))
+    await asyncio.sleep(0.5)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=1)
+    ticks = [metrics_queue.get_nowait()["tick_time"] for _ in range(metrics_queue.qsize())]
+    assert 7 <= len(ticks) <= 11
+    assert ticks == sorted(ticks) and ticks[1] - ticks[0] == pytest.approx(0.05)
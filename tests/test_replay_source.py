@@ -0,0 +1,48 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from replay_source import synthetic_packets, save_capture, load_capture, replay_sensor
+
+
+def test_rollover_profile_wraps_counters():
+    packets = synthetic_packets("rollover", duration=10)
+    revolutions = [int.from_bytes(p[1:3], "little") for _, p in packets]
+    event_times = [int.from_bytes(p[3:5], "little") for _, p in packets]
+    assert revolutions[0] > revolutions[-1], "Expected the revolution counter to wrap past 65535"
+    assert event_times[0] > event_times[-1], "Expected the event time to wrap past 65535"
+
+
+def test_coasting_profile_freezes_counters():
+    packets = synthetic_packets("coasting", duration=39)
+    coasting = [p for t, p in packets if t >= 26]
+    assert len(set(coasting)) == 1, "Expected identical packets while coasting"
+
+
+def test_capture_round_trip(tmp_path):
+    packets = synthetic_packets("sprints", duration=5)
+    path = tmp_path / "capture.csv"
+    save_capture(path, packets)
+    assert load_capture(path) == packets
+
+
+@pytest.mark.asyncio
+async def test_replay_sensor_feeds_handle_packet():
+    queue = asyncio.Queue()
+    await replay_sensor(queue, asyncio.Event(), {}, {}, source="steady", speed=0, duration=10)
+    assert queue.qsize() == 11
+    results = [queue.get_nowait() for _ in range(11)]
+    assert results[-1]["cadence"] == pytest.approx(90, rel=0.05)
+
+
+def test_replay_and_benchmark_import_without_bleak():
+    # bleak is only needed for live sensors; block it the way a missing install would
+    script = (
+        "import sys; sys.modules['bleak'] = None\n"
+        "import replay_source, benchmark, session_manager\n"
+        "assert 'bleak' not in [name for name, module in sys.modules.items() if module is not None]\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,60 @@
+import pytest
+from ring_buffer import RingBuffer, RecordRing
+
+
+def test_view_reads_in_order_across_wraparound():
+    buffer = RingBuffer(4)
+    for value in range(6):
+        buffer.append(value)
+    view = buffer.view()
+    assert len(view) == 4
+    assert view[:] == [2, 3, 4, 5]
+    assert view[-2:] == [4, 5]
+    assert view[0] == 2 and view[-1] == 5
+
+
+def test_view_is_a_snapshot_until_overwritten():
+    buffer = RingBuffer(4)
+    for value in range(3):
+        buffer.append(value)
+    view = buffer.view()
+    buffer.append(3)
+    assert view[:] == [0, 1, 2], "Expected the view to keep its own length"
+    buffer.append(4)
+    assert view.stale
+    with pytest.raises(ValueError):
+        view[:]
+
+
+def test_since_returns_appended_values():
+    buffer = RingBuffer(8)
+    for value in range(5):
+        buffer.append(value)
+    seen = buffer.view().version
+    buffer.append(5)
+    buffer.append(6)
+    assert buffer.view().since(seen) == [5, 6]
+    for value in range(10):
+        buffer.append(value)
+    assert buffer.view().since(seen) is None
+
+
+def test_record_ring_columns_and_rows():
+    intervals = RecordRing(3, ("avg_speed", "distance"))
+    for i in range(4):
+        intervals.append({"avg_speed": 20.0 + i, "distance": 0.1 * i})
+    view = intervals.view()
+    assert view.column("avg_speed")[:] == [21.0, 22.0, 23.0]
+    assert view[-1] == {"avg_speed": 23.0, "distance": pytest.approx(0.3)}
+    assert len(list(view)) == 3
+
+
+def test_record_view_since_returns_appended_rows():
+    ring = RecordRing(4, ("avg_speed", "distance"))
+    ring.append({"avg_speed": 20, "distance": 1})
+    seen = ring.view().version
+    ring.append({"avg_speed": 22, "distance": 2})
+    assert ring.view().since(seen) == [{"avg_speed": 22, "distance": 2}]
+    for _ in range(4):
+        ring.append({"avg_speed": 0, "distance": 0})
+    assert ring.view().since(seen) is None
@@ -0,0 +1,45 @@
+import pytest
+from rollup import RollingWindow, TumblingWindow, RollupEngine
+
+
+def test_rolling_window_expires_old_samples():
+    window = RollingWindow("10s", 10)
+    for second in range(1, 21):
+        speed_distance = 0.01 if second <= 10 else 0.005  # 36 km/h, then 18 km/h
+        window.update(second, 1, speed_distance, 90)
+    assert len(window) == 10
+    assert window.averages()["avg_speed"] == pytest.approx(18)
+    assert window.averages()["avg_cadence"] == pytest.approx(90)
+
+
+def test_rolling_window_evicts_early_when_full():
+    window = RollingWindow("1s", 1, max_rate=4)
+    for step in range(100):
+        window.update(step * 0.001, 0.001, 0, 60)
+    assert len(window) == window.capacity
+    assert window.averages()["duration"] == pytest.approx(window.capacity * 0.001)
+
+
+def test_tumbling_window_records_each_bin():
+    window = TumblingWindow("interval", 30, history_size=8)
+    for second in range(1, 91):
+        window.update(second, 1, 0.01, 80)
+    history = window.history.view()
+    assert len(history) == 3
+    assert history[0]["avg_speed"] == pytest.approx(36)
+    assert history[0]["distance"] == pytest.approx(0.3)
+    assert window.averages()["duration"] == 0
+
+
+def test_engine_from_config_and_lap():
+    config = {"rollup_windows": {"5s": {"seconds": 5}, "lap": {"tumbling": True}}}
+    engine = RollupEngine.from_config(config)
+    for second in range(1, 11):
+        engine.update(second, 1, 0.01, 90)
+    snapshot = engine.snapshot()
+    assert snapshot["5s"]["duration"] == pytest.approx(5)
+    assert snapshot["lap"]["distance"] == pytest.approx(0.1)
+    lap = engine.lap()["lap"]
+    assert lap["avg_speed"] == pytest.approx(36)
+    assert engine["lap"].averages()["distance"] == 0
+    assert len(engine["lap"].history) == 1
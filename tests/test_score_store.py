@@ -0,0 +1,126 @@
+import csv
+from data_logger import WorkoutWriter
+from game_logic import SCORE_FIELDNAMES
+from score_store import ScoreStore, format_summary, index_workout, record_score
+
+
+def score(rider, value, date="2025-01-01 10:00:00", mode="gates"):
+    return {"date": date, "rider": rider, "mode": mode, "seed": 1, "score": value,
+            "gates_hit": 1, "gates_total": 2, "duration": 60}
+
+
+def test_wal_mode_and_indexes(tmp_path):
+    with ScoreStore(tmp_path / "scores.db") as store:
+        assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = " ".join(row[3] for row in store.connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM scores WHERE rider = ? AND mode = ? ORDER BY score DESC LIMIT 1",
+            ("alice", "gates")))
+        assert "scores_rider_mode_score" in plan
+
+
+def test_leaderboard_queries(tmp_path):
+    with ScoreStore(tmp_path / "scores.db") as store:
+        store.add_scores([
+            score("alice", 300, "2025-01-01 10:00:00"),
+            score("bob", 500, "2025-02-01 10:00:00"),
+            score("alice", 450, "2025-03-01 10:00:00"),
+            score("carol", 900, "2025-03-02 10:00:00", mode="sprint"),
+        ])
+        assert [row["score"] for row in store.top_scores(2)] == [500, 450]
+        assert store.personal_best("alice")["score"] == 450
+        assert store.personal_best("dave") is None
+        assert [row["rider"] for row in store.scores_between("2025-01-15", "2025-03-31")] == ["bob", "alice", "carol"]
+        assert [row["score"] for row in store.top_scores(10, start="2025-02-15")] == [450]
+
+
+def test_import_scores_csv_and_workouts(tmp_path):
+    scores_file = tmp_path / "scores.csv"
+    with open(scores_file, "w", newline="") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=SCORE_FIELDNAMES)
+        writer.writeheader()
+        writer.writerow(score("alice", 123))
+    workouts = tmp_path / "workouts"
+    workouts.mkdir()
+    writer = WorkoutWriter(workouts / "workout_2025-01-01_10-00-00.csv").start()
+    for i in range(60):
+        writer.write((1735725600 + i, 90, 30, i * 30 / 3600, 30))
+    writer.close()
+
+    with ScoreStore(tmp_path / "scores.db") as store:
+        assert store.import_scores_csv(scores_file) == 1
+        assert store.import_workouts(str(workouts), rider="alice") == 1
+        assert store.personal_best("alice")["score"] == 123
+        [session] = store.sessions_between("2000-01-01", "2100-01-01", rider="alice")
+        assert session["duration"] == 60
+        assert session["distance"] > 0
+
+
+def test_record_score_from_another_connection(tmp_path):
+    db_path = tmp_path / "scores.db"
+    record_score(db_path, score("erin", 77))
+    with ScoreStore(db_path) as store:
+        assert store.personal_best("erin")["score"] == 77
+
+
+def write_workout(path, start, seconds, speed=30):
+    writer = WorkoutWriter(path).start()
+    for i in range(seconds):
+        writer.write((start + i, 90, speed, i * speed / 3600, speed))
+    writer.close()
+
+
+def test_sync_workouts_reindexes_only_changed_files(tmp_path, monkeypatch):
+    import workout_analysis
+    workouts = tmp_path / "workouts"
+    workouts.mkdir()
+    for day in range(3):
+        write_workout(workouts / f"workout_2025-01-0{day + 1}_10-00-00.csv", 1735725600 + day * 86400, 90)
+
+    with ScoreStore(tmp_path / "scores.db") as store:
+        assert store.sync_workouts(str(workouts), "alice") == (3, 0)
+        [session, *_] = store.sessions_between("2000-01-01", "2100-01-01")
+        assert session["duration"] == 90 and session["best_1min"] == 30 and session["best_5min"] is None
+
+        loaded = []
+        load_session = workout_analysis.load_session
+        monkeypatch.setattr(workout_analysis, "load_session", lambda path: loaded.append(path) or load_session(path))
+        assert store.sync_workouts(str(workouts), "alice") == (0, 0)
+        assert loaded == []
+
+        changed = workouts / "workout_2025-01-02_10-00-00.csv"
+        write_workout(changed, 1735725600 + 86400, 400, speed=40)
+        (workouts / "workout_2025-01-03_10-00-00.csv").unlink()
+        assert store.sync_workouts(str(workouts), "alice") == (1, 1)
+        assert loaded == [str(changed)]
+
+        summary = store.summary("alice", now=1735725600 + 7 * 86400 + 3600)
+        assert summary["lifetime"]["sessions"] == 2
+        assert summary["lifetime"]["duration"] == 490
+        assert summary["lifetime"]["best_5min"] == 40
+        assert summary["recent"]["sessions"] == 1
+        assert "Bests (km/h)" in format_summary(summary)[-1]
+
+
+def test_older_database_is_migrated(tmp_path):
+    import sqlite3
+    db_path = tmp_path / "scores.db"
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE sessions (id INTEGER PRIMARY KEY, path TEXT UNIQUE, date TEXT NOT NULL, "
+                       "rider TEXT NOT NULL, duration REAL, distance REAL, average_speed REAL, max_speed REAL)")
+    connection.execute("INSERT INTO sessions (path, date, rider, duration) VALUES ('old.csv', '2024-01-01', 'bob', 60)")
+    connection.commit()
+    connection.close()
+    with ScoreStore(db_path) as store:
+        assert store.summary("bob")["lifetime"]["duration"] == 60
+        assert store.summary("bob")["lifetime"]["best_1min"] is None
+
+
+def test_logger_close_indexes_the_session(tmp_path):
+    path = tmp_path / "workouts" / "workout.csv"
+    path.parent.mkdir()
+    write_workout(path, 1735725600, 70)
+    index_workout(tmp_path / "scores.db", str(path), "erin")
+    with ScoreStore(tmp_path / "scores.db") as store:
+        # the closed log is already indexed: startup has nothing to load
+        assert store.sync_workouts(str(path.parent), "erin") == (0, 0)
+        assert store.summary("erin")["lifetime"]["best_1min"] == 30
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from fake_bleak import FakeBackend, make_room
+from metrics_bus import LOSSLESS
+from session_manager import SessionManager, classify_device, parse_heart_rate, CSC_SERVICE_UUID
+
+CONFIG = {"wheel_circumference": 2.1, "chainring": 50, "cog": 15, "terminal_width": 90, "scan_interval": 1}
+
+
+def test_classify_device():
+    assert classify_device("Wahoo", [CSC_SERVICE_UUID]) == "csc"
+    assert classify_device("CAD-1") == "csc"
+    assert classify_device("HRM-Pro") == "heart_rate"
+    assert classify_device("Headphones") is None
+
+
+def test_parse_heart_rate():
+    assert parse_heart_rate(bytes([0x00, 142])) == 142
+    assert parse_heart_rate(bytes([0x01, 0x2C, 0x01])) == 300
+
+
+async def run_manager(manager, seconds):
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(manager.run(shutdown_event))
+    await asyncio.sleep(seconds)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=5)
+
+
+@pytest.mark.asyncio
+async def test_fifty_simulated_sensors_each_get_a_pipeline():
+    backend = FakeBackend(make_room(50, interval=0.01))
+    manager = SessionManager(CONFIG, scanner=backend.scanner, client_factory=backend.client)
+    await manager.discover()
+    riders = manager.assign_riders()
+    subscriptions = [rider.bus.subscribe("test") for rider in riders]
+    await run_manager(manager, 0.3)
+
+    assert len(riders) == 50
+    assert all(subscription.received > 0 for subscription in subscriptions)
+    assert len({id(sensor.state) for sensor in manager.sensors.values()}) == 50
+    assert not any(client.is_connected for client in backend.clients)
+
+
+@pytest.mark.asyncio
+async def test_configured_rider_combines_cadence_and_heart_rate():
+    backend = FakeBackend(make_room(2, 1, interval=0.01))
+    [cadence, _, heart_rate] = backend.devices
+    config = dict(CONFIG, riders={"alice": [cadence, heart_rate]})
+    manager = SessionManager(config, scanner=backend.scanner, client_factory=backend.client)
+    await run_manager(manager, 0.2)
+
+    assert set(manager.riders) == {"alice", "CAD-1"}
+    latest = manager.riders["alice"].latest
+    assert latest["rider"] == "alice"
+    assert latest["heart_rate"] == 140
+    assert manager.riders["CAD-1"].latest["heart_rate"] is None
+
+
+@pytest.mark.asyncio
+async def test_rider_with_two_csc_sensors_uses_one_for_cadence():
+    backend = FakeBackend(make_room(2, interval=0.005))
+    [first, second] = backend.devices
+    config = dict(CONFIG, riders={"alice": [first, second]})
+    manager = SessionManager(config, scanner=backend.scanner, client_factory=backend.client)
+    await manager.discover()
+    [rider] = manager.assign_riders()
+    subscription = rider.bus.subscribe("test", policy=LOSSLESS, maxsize=10000)
+    await run_manager(manager, 0.3)
+
+    assert rider.crank_sensor is manager.sensors[first]
+    assert [sensor.address for sensor in rider.sensors] == [first]
+    distances = []
+    while not subscription.empty():
+        distances.append(subscription.get_nowait()["total_distance"])
+    assert len(distances) > 10
+    assert distances == sorted(distances), "total_distance must never go backwards"
+
+
+@pytest.mark.asyncio
+async def test_sensor_reconnects_after_dropping_out():
+    backend = FakeBackend(make_room(1, interval=0.01))
+    manager = SessionManager(CONFIG, scanner=backend.scanner, client_factory=backend.client)
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(manager.run(shutdown_event))
+    await asyncio.sleep(0.1)
+    [sensor] = manager.sensors.values()
+    [client] = backend.clients
+    client.drop()
+    await asyncio.sleep(0.1)
+    packets = sensor.packets
+    await asyncio.sleep(0.1)
+    shutdown_event.set()
+    await asyncio.wait_for(task, timeout=5)
+
+    assert sensor.reconnects == 1
+    assert len(backend.clients) == 2
+    assert sensor.packets > packets, "Expected packets to keep flowing after the reconnect"
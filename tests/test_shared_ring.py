@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+import pytest
+from ring_buffer import RingBuffer, RecordRing
+from shared_ring import SharedRingWriter, SharedRingReader
+
+
+def make_metrics(speeds, intervals, value):
+    speeds.append(value)
+    return {
+        "live_RPM": 90, "live_speed": value, "interval_speed": 0, "average_speed": value,
+        "total_distance": value / 10, "active_time": value,
+        "live_speeds": speeds.view(), "intervals": intervals.view(),
+    }
+
+
+@pytest.fixture
+def ring():
+    writer = SharedRingWriter(capacity=8)
+    yield writer
+    writer.unlink()
+
+
+def test_reader_rebuilds_metrics_and_history(ring):
+    speeds, intervals = RingBuffer(16), RecordRing(16, ("avg_speed", "distance"))
+    reader = SharedRingReader(ring.name, ring.capacity, history_size=16)
+    for value in range(3):
+        ring.publish(make_metrics(speeds, intervals, value))
+    intervals.append({"avg_speed": 1.5, "distance": 0.1})
+    ring.publish(make_metrics(speeds, intervals, 3))
+
+    results = [reader.get_nowait() for _ in range(4)]
+    assert reader.empty()
+    assert [m["total_distance"] for m in results] == [0, 0.1, 0.2, 0.3]
+    assert results[-1]["live_speeds"][:] == [0, 1, 2, 3]
+    assert results[-1]["intervals"][:] == [{"avg_speed": 1.5, "distance": 0.1}]
+    with pytest.raises(asyncio.QueueEmpty):
+        reader.get_nowait()
+    reader.close()
+
+
+def test_lapped_reader_skips_ahead_without_blocking_the_writer(ring):
+    speeds, intervals = RingBuffer(32), RecordRing(32, ("avg_speed", "distance"))
+    reader = SharedRingReader(ring.name, ring.capacity)
+    for value in range(20):
+        ring.publish(make_metrics(speeds, intervals, value))
+    first = reader.get_nowait()
+    assert first["live_speed"] == 12, "Expected the oldest record still in the ring"
+    assert reader.dropped == 12
+    assert reader.qsize() == 7
+    reader.close()
+
+
+def test_reader_rate_passes_every_nth_tick_but_keeps_full_history(ring):
+    speeds, intervals = RingBuffer(16), RecordRing(16, ("avg_speed", "distance"))
+    reader = SharedRingReader(ring.name, ring.capacity, history_size=16, rate=1)
+    for tick in range(8):  # two seconds of a 4 Hz metrics clock
+        ring.publish({**make_metrics(speeds, intervals, tick), "tick_time": tick * 0.25})
+    results = []
+    while not reader.empty():
+        try:
+            results.append(reader.get_nowait())
+        except asyncio.QueueEmpty:
+            break
+    assert [m["tick_time"] for m in results] == [0.0, 1.0]
+    assert results[-1]["live_speeds"][:] == [0, 1, 2, 3, 4]
+    assert reader.empty()
+    reader.close()
+
+
+def count_records(ring_name, capacity, results):
+    async def consume():
+        reader = SharedRingReader(ring_name, capacity)
+        shutdown_event = asyncio.Event()
+        watcher = asyncio.create_task(reader.wait_closed(shutdown_event))
+        speeds = []
+        while not shutdown_event.is_set():
+            try:
+                speeds.append((await asyncio.wait_for(reader.get(), timeout=0.1))["live_speed"])
+            except asyncio.TimeoutError:
+                pass
+        await watcher
+        results.put((speeds, reader.dropped))
+        reader.close()
+
+    asyncio.run(consume())
+
+
+def test_reader_process_drains_and_exits_on_close():
+    writer = SharedRingWriter(capacity=256)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    process = context.Process(target=count_records, args=(writer.name, writer.capacity, results))
+    process.start()
+    try:
+        speeds, intervals = RingBuffer(128), RecordRing(128, ("avg_speed", "distance"))
+        for value in range(100):
+            writer.publish(make_metrics(speeds, intervals, value))
+        writer.close()
+        received, dropped = results.get(timeout=10)
+        process.join(timeout=10)
+        assert not process.is_alive()
+        assert received == list(range(100)) and dropped == 0
+    finally:
+        writer.unlink()
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from ring_buffer import RingBuffer, RecordRing
+from history_pyramid import HistoryPyramid
+from terminal_display import FrameRenderer, build_frame, terminal_display
+
+CONFIG = {"terminal_width": 20, "max_speed": 30, "speed_interval": 3, "display_fps": 5}
+
+
+def make_metrics(speeds, cadence=90.0):
+    live_speeds = RingBuffer(CONFIG["terminal_width"])
+    for speed in speeds:
+        live_speeds.append(speed)
+    return {
+        "live_RPM": cadence,
+        "live_speed": speeds[-1] if speeds else 0,
+        "interval_speed": 0,
+        "average_speed": 0,
+        "total_distance": 0,
+        "active_time": 0,
+        "live_speeds": live_speeds.view(),
+        "intervals": RecordRing(CONFIG["terminal_width"], ("avg_speed", "distance")).view(),
+    }
+
+
+def test_first_frame_clears_and_draws_everything():
+    renderer = FrameRenderer()
+    update = renderer.diff(build_frame(make_metrics([10, 20]), CONFIG))
+    assert update.startswith("\033[H\033[J")
+    assert "Speed (km/h)" in update
+
+
+def test_unchanged_frame_writes_nothing():
+    renderer = FrameRenderer()
+    renderer.diff(build_frame(make_metrics([10, 20]), CONFIG))
+    assert renderer.diff(build_frame(make_metrics([10, 20]), CONFIG)) == ""
+
+
+def test_only_changed_cells_are_written():
+    renderer = FrameRenderer()
+    renderer.diff(build_frame(make_metrics([10, 20]), CONFIG))
+    update = renderer.diff(build_frame(make_metrics([10, 20, 20]), CONFIG))
+    # the new star lands in plot column 3, after the 6-character y-axis label
+    assert "\033[91m*\033[0m" in update
+    assert ";9H" in update
+    assert "Speed (km/h)" not in update
+    assert "Cadence" not in update
+
+
+@pytest.mark.asyncio
+async def test_terminal_display_coalesces_updates(monkeypatch):
+    frames = []
+    monkeypatch.setattr(FrameRenderer, "render", lambda self, rows: frames.append(rows))
+    queue = asyncio.Queue()
+    shutdown_event = asyncio.Event()
+    task = asyncio.create_task(terminal_display(queue, CONFIG, shutdown_event))
+    for cadence in range(50):
+        queue.put_nowait(make_metrics([10], cadence=cadence))
+    await asyncio.sleep(0.05)
+    shutdown_event.set()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert len(frames) == 1
+    assert "49.0 RPM" in frames[0][1][0]
+
+
+def test_whole_ride_plot_fits_the_width():
+    pyramid = HistoryPyramid()
+    for second in range(5000):
+        pyramid.append(25 if second % 600 < 60 else 10)  # a sprint every 10 minutes
+    metrics = {**make_metrics([10]), "speed_history": pyramid.view()}
+    rows = build_frame(metrics, CONFIG)
+    assert "whole ride" in "".join(rows[-1])
+    plot = ["".join(row) for row in rows if "|" in "".join(row)]
+    assert all(row.count("\033[") // 2 <= CONFIG["terminal_width"] for row in plot)
+    assert any("*" in row for row in plot[:3]), "Expected the sprints to show up as peaks"
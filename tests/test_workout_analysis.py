@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from data_logger import WorkoutWriter
+from workout_analysis import SessionSet, load_session, rolling_mean
+
+
+def write_session(path, speeds, log_format="csv", start=1700000000):
+    writer = WorkoutWriter(path, log_format).start()
+    distance = 0.0
+    for i, speed in enumerate(speeds):
+        distance += speed / 3600
+        writer.write((start + i, 90.0 if speed else 0.0, speed, distance, 0.0))
+    writer.close()
+    return str(path)
+
+
+def test_rolling_mean_matches_python():
+    values = np.arange(10, dtype=float)
+    assert rolling_mean(values, 3)[2:].tolist() == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert rolling_mean(values, 3)[0] == 0
+
+
+def test_csv_and_binary_logs_load_the_same(tmp_path):
+    speeds = [20.0, 25.0, 30.0]
+    csv_session = load_session(write_session(tmp_path / "a.csv", speeds))
+    binary_session = load_session(write_session(tmp_path / "a.rbl", speeds, "binary"))
+    assert csv_session["speed"].tolist() == binary_session["speed"].tolist()
+    assert np.diff(csv_session["time"]).tolist() == [1, 1]
+
+
+def test_binary_log_with_a_torn_last_record_loads(tmp_path):
+    path = write_session(tmp_path / "crashed.rbl", [20.0, 25.0, 30.0], "binary")
+    with open(path, "ab") as logfile:
+        logfile.write(b"\x00" * 13)  # part of a record, cut off by a crash
+    assert load_session(path)["speed"].tolist() == [20.0, 25.0, 30.0]
+    empty = tmp_path / "empty.rbl"
+    WorkoutWriter(empty, "binary").start().close()
+    assert len(load_session(str(empty))) == 0
+
+
+def test_gaps_in_a_resumed_log_are_not_interpolated(tmp_path):
+    writer = WorkoutWriter(tmp_path / "resumed.csv").start()
+    for t in (0, 1, 1801, 1802):  # a 30 min outage before --resume
+        writer.write((1700000000 + t, 90.0, 30.0, t * 30 / 3600, 30.0))
+    writer.close()
+    [summary] = SessionSet([load_session(str(tmp_path / "resumed.csv"))]).summaries()
+    assert summary["duration"] == 1803
+    assert summary["moving_time"] == 4
+    assert summary["best_efforts"][1200] < 1
+
+
+def test_best_efforts_do_not_straddle_sessions(tmp_path):
+    slow = load_session(write_session(tmp_path / "slow.csv", [10.0] * 10 + [40.0] * 2))
+    fast = load_session(write_session(tmp_path / "fast.csv", [40.0] * 3 + [20.0] * 10))
+    best = SessionSet([slow, fast]).best_efforts(durations=(5,))[5]
+    assert best[0] == pytest.approx((10 * 3 + 40 * 2) / 5)
+    assert best[1] == pytest.approx((40 * 3 + 20 * 2) / 5)
+
+
+def test_short_sessions_have_no_best_effort(tmp_path):
+    short = load_session(write_session(tmp_path / "short.csv", [30.0] * 3))
+    long = load_session(write_session(tmp_path / "long.csv", [30.0] * 70))
+    best = SessionSet([short, long]).best_efforts(durations=(60,))[60]
+    assert np.isnan(best[0])
+    assert best[1] == pytest.approx(30.0)
+
+
+def test_summaries_and_zones(tmp_path):
+    session = load_session(write_session(tmp_path / "ride.csv", [0.0] * 5 + [25.0] * 10 + [45.0] * 5))
+    sessions = SessionSet([session])
+    [summary] = sessions.summaries()
+    assert summary["duration"] == 20
+    assert summary["moving_time"] == 15
+    assert summary["max_speed"] == 45.0
+    assert summary["average_speed"] == pytest.approx((25 * 10 + 45 * 5) / 15)
+    zones = sessions.zone_seconds(sessions.speed, (0, 20, 40, np.inf))
+    assert zones.tolist() == [[5, 10, 5]]
@@ -0,0 +1,225 @@
+# offline analysis of the workout logs written by data_logger
+import argparse
+import glob
+import json
+import os
+import warnings
+
+import numpy as np
+
+from data_logger import BINARY_MAGIC, CSV_FIELDNAMES
+
+CSV_DTYPE = np.dtype([
+    ("time", "datetime64[s]"),
+    ("cadence", "f8"),
+    ("speed", "f8"),
+    ("distance", "f8"),
+    ("average_speed", "f8"),
+])
+BINARY_DTYPE = np.dtype([(field, "<f8") for field in CSV_FIELDNAMES])
+
+BEST_EFFORT_DURATIONS = (5, 60, 300, 1200)  # seconds
+MAX_GAP = 5  # seconds between records beyond which the log has a hole, not a slow stretch
+SPEED_ZONES = (0, 10, 20, 30, 40, 50, np.inf)  # km/h
+CADENCE_ZONES = (0, 60, 80, 90, 100, 110, np.inf)  # RPM
+
+
+def load_session(file_path):
+    """load a csv or binary workout log into a structured array with time in seconds."""
+    with open(file_path, "rb") as logfile:
+        binary = logfile.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if binary:
+        # whole records only: a crash can leave a torn last record, as read_binary_log expects
+        count = (os.path.getsize(file_path) - len(BINARY_MAGIC)) // BINARY_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=BINARY_DTYPE)
+        records = np.memmap(file_path, dtype=BINARY_DTYPE, mode="r", offset=len(BINARY_MAGIC), shape=(count,))
+        session = np.array(records)
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # header-only log from a session with no data
+            records = np.loadtxt(file_path, delimiter=",", skiprows=1, dtype=CSV_DTYPE, ndmin=1)
+        session = np.empty(len(records), dtype=BINARY_DTYPE)
+        for field in CSV_FIELDNAMES[1:]:
+            session[field] = records[field]
+        session["time"] = records["time"].astype("int64")
+    return session
+
+
+def find_sessions(paths):
+    """expand files and directories (e.g. workouts/) into a sorted list of log files."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.csv")) + glob.glob(os.path.join(path, "*.rbl")))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def resample(session, hz=1):
+    """interpolate speed and cadence onto a fixed-rate time grid; returns (speed, cadence).
+
+    Gaps longer than MAX_GAP seconds (an outage before a --resume) are not
+    interpolated across: the rider counts as stopped until logging resumes.
+    """
+    if len(session) == 0:
+        return np.empty(0), np.empty(0)
+    t = session["time"] - session["time"][0]
+    grid = np.arange(0, t[-1] + 1 / hz, 1 / hz)
+    speed, cadence = np.interp(grid, t, session["speed"]), np.interp(grid, t, session["cadence"])
+    if len(t) > 1:
+        after = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+        before = after - 1
+        in_gap = (t[after] - t[before] > MAX_GAP) & (grid > t[before]) & (grid < t[after])
+        speed[in_gap] = 0.0
+        cadence[in_gap] = 0.0
+    return speed, cadence
+
+
+def rolling_mean(values, window):
+    """trailing mean over `window` samples; the first window-1 entries average what is available."""
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    ends = np.arange(1, len(values) + 1)
+    return (sums[ends] - sums[ends - counts]) / counts
+
+
+class SessionSet:
+    """many sessions resampled to 1 Hz and concatenated so every statistic is one vectorized pass."""
+
+    def __init__(self, sessions, names=None):
+        self.names = list(names) if names is not None else [str(i) for i in range(len(sessions))]
+        resampled = [resample(session) for session in sessions]
+        lengths = np.array([len(speed) for speed, _ in resampled], dtype=np.int64)
+        self.lengths = lengths
+        self.offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        self.speed = np.concatenate([speed for speed, _ in resampled]) if resampled else np.empty(0)
+        self.cadence = np.concatenate([cadence for _, cadence in resampled]) if resampled else np.empty(0)
+        self.session_ids = np.repeat(np.arange(len(sessions)), lengths)
+        self.distance = np.array([
+            session["distance"][-1] - session["distance"][0] if len(session) else 0.0 for session in sessions
+        ])
+
+    def __len__(self):
+        return len(self.names)
+
+    def _per_session_sum(self, values):
+        return np.bincount(self.session_ids, weights=values, minlength=len(self))
+
+    def best_efforts(self, durations=BEST_EFFORT_DURATIONS):
+        """{duration: array of each session's best average speed over that many seconds (nan if too short)}."""
+        results = {}
+        sums = np.cumsum(np.concatenate(([0.0], self.speed)))
+        for duration in durations:
+            if len(self.speed) < duration:
+                results[duration] = np.full(len(self), np.nan)
+                continue
+            means = (sums[duration:] - sums[:-duration]) / duration
+            # a window must not straddle two sessions
+            starts = np.arange(len(means))
+            means[self.session_ids[starts] != self.session_ids[starts + duration - 1]] = -np.inf
+            means = np.append(means, -np.inf)  # sentinel so every session has a segment
+            best = np.maximum.reduceat(means, np.minimum(self.offsets, len(means) - 1))
+            best[self.lengths < duration] = np.nan
+            results[duration] = best
+        return results
+
+    def zone_seconds(self, values, edges):
+        """(sessions x zones) seconds spent in each zone, one bincount over all samples."""
+        zones = len(edges) - 1
+        zone_index = np.clip(np.digitize(values, edges) - 1, 0, zones - 1)
+        counts = np.bincount(self.session_ids * zones + zone_index, minlength=len(self) * zones)
+        return counts.reshape(len(self), zones)
+
+    def summaries(self):
+        """per-session totals as a list of dicts."""
+        moving = self.cadence > 0
+        moving_seconds = self._per_session_sum(moving.astype(float))
+        moving_speed = self._per_session_sum(np.where(moving, self.speed, 0.0))
+        moving_cadence = self._per_session_sum(np.where(moving, self.cadence, 0.0))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average_speed = np.where(moving_seconds > 0, moving_speed / moving_seconds, 0.0)
+            average_cadence = np.where(moving_seconds > 0, moving_cadence / moving_seconds, 0.0)
+        max_speed = np.full(len(self), np.nan)
+        nonempty = self.lengths > 0
+        if nonempty.any():
+            max_speed[nonempty] = np.maximum.reduceat(self.speed, self.offsets[nonempty])
+        best = self.best_efforts()
+
+        return [
+            {
+                "session": self.names[i],
+                "duration": int(self.lengths[i]),
+                "moving_time": int(moving_seconds[i]),
+                "distance": float(self.distance[i]),
+                "average_speed": float(average_speed[i]),
+                "max_speed": float(max_speed[i]),
+                "average_cadence": float(average_cadence[i]),
+                "best_efforts": {duration: float(values[i]) for duration, values in best.items()},
+            }
+            for i in range(len(self))
+        ]
+
+
+def rolling_averages(session, window=30):
+    """speed and cadence rolling averages of one session over `window` seconds at 1 Hz."""
+    speed, cadence = resample(session)
+    return rolling_mean(speed, window), rolling_mean(cadence, window)
+
+
+def format_duration(seconds):
+    return f"{int(seconds // 3600):02}:{int(seconds % 3600 // 60):02}:{int(seconds % 60):02}"
+
+
+def print_report(sessions, summaries):
+    print(f"{'session':<36}{'time':>10}{'km':>8}{'avg':>7}{'max':>7}{'rpm':>6}"
+          + "".join(f"{'best ' + format_duration(d)[3:]:>11}" for d in BEST_EFFORT_DURATIONS))
+    for summary in summaries:
+        print(f"{os.path.basename(summary['session']):<36}{format_duration(summary['duration']):>10}"
+              f"{summary['distance']:8.2f}{summary['average_speed']:7.1f}{summary['max_speed']:7.1f}"
+              f"{summary['average_cadence']:6.0f}"
+              + "".join(f"{summary['best_efforts'][d]:11.1f}" for d in BEST_EFFORT_DURATIONS))
+
+    print()
+    total_time = sum(s["duration"] for s in summaries)
+    total_distance = sum(s["distance"] for s in summaries)
+    print(f"Sessions: {len(summaries)}, total time {format_duration(total_time)}, total distance {total_distance:.2f} km")
+    best = sessions.best_efforts()
+    for duration in BEST_EFFORT_DURATIONS:
+        values = best[duration]
+        if np.isfinite(values).any():
+            i = int(np.nanargmax(values))
+            print(f"Best {format_duration(duration)}: {values[i]:.1f} km/h ({os.path.basename(sessions.names[i])})")
+
+    for title, values, edges, unit in (
+        ("Speed zones", sessions.speed, SPEED_ZONES, "km/h"),
+        ("Cadence zones", sessions.cadence, CADENCE_ZONES, "RPM"),
+    ):
+        totals = sessions.zone_seconds(values, edges).sum(axis=0)
+        print(f"\n{title}:")
+        for low, high, seconds in zip(edges[:-1], edges[1:], totals):
+            label = f"{low:g}+ {unit}" if np.isinf(high) else f"{low:g}-{high:g} {unit}"
+            print(f"  {label:<16}{format_duration(seconds)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize workout logs (csv or binary).")
+    parser.add_argument("paths", nargs="*", default=["workouts"], help="log files or directories (default: workouts/)")
+    parser.add_argument("--json", action="store_true", help="print per-session summaries as json")
+    args = parser.parse_args(argv)
+
+    files = find_sessions(args.paths)
+    if not files:
+        print("[ERROR] No workout logs found.")
+        return
+    sessions = SessionSet([load_session(path) for path in files], names=files)
+    summaries = sessions.summaries()
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print_report(sessions, summaries)
+
+
+if __name__ == "__main__":
+    main()